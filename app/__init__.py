@@ -5,11 +5,12 @@ import os
 from flask import Flask, request
 from flask_sqlalchemy import SQLAlchemy
 from .config import config
+from .utils.db_routing import RoutingSession
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-def create_app(config_name=None):
+def create_app(config_name=None, test_config=None):
     """Create and configure the Flask application."""
     # Create Flask app
     app = Flask(__name__)
@@ -18,26 +19,83 @@ def create_app(config_name=None):
     if config_name is None:
         config_name = os.environ.get('FLASK_CONFIG', 'default')
     app.config.from_object(config[config_name])
+    if test_config is not None:
+        app.config.update(test_config)
+    
+    # Encode JSON responses with orjson when available
+    from .utils import json_provider
+    json_provider.init_app(app)
     
     # Initialize extensions with app
     db.init_app(app)
     
     with app.app_context():
+        # Tune SQLite connections before anything touches the database
+        from .utils.sqlite import apply_sqlite_pragmas
+        for engine in db.engines.values():
+            apply_sqlite_pragmas(engine, app.config.get('SQLITE_PRAGMAS'))
+        
+        # Count queries per request
+        from .utils import query_counter
+        query_counter.init_app(app, db.engines.values())
+        
+        # Request, query and service metrics served on /metrics
+        from .utils import metrics
+        metrics.init_app(app)
+        
         # Register blueprints
         from .routes.main import main
         from .routes.api import api
         from .routes.prometheus import prometheus
+        from .routes.metrics import metrics as metrics_routes
         
         app.register_blueprint(main)
+        app.register_blueprint(metrics_routes)
         app.register_blueprint(api, url_prefix='/api')
         app.register_blueprint(prometheus, url_prefix='/api/sd')
         
-        # Create database tables
-        db.create_all()
+        # Bring the database schema up to date and seed default probes, or,
+        # in production, only compare the stored schema version with one
+        # query and leave both to `flask db upgrade`
+        from .migrations import run_migrations, check_schema
+        if app.config.get('DB_AUTO_MIGRATE', True):
+            from .models.probe import init_default_probes
+            run_migrations()
+            init_default_probes()
+        else:
+            check_schema(app)
+            # Close the connection used for the check, so workers forked from
+            # a preloaded app (gunicorn --preload) each open their own
+            for engine in db.engines.values():
+                engine.dispose()
+        
+        # Configure the ORM mappers now instead of in the first request
+        from sqlalchemy.orm import configure_mappers
+        configure_mappers()
+        
+        # Invalidate in-memory caches when another worker changed their data
+        from .services import data_version
+        data_version.init_app(app)
+        
+        # Coalesce concurrent identical SD and statistics requests
+        from .utils import single_flight
+        single_flight.init_app(app)
+        
+        # Reuse the encoded JSON of unchanged targets across listings
+        from .utils import fragment_cache
+        fragment_cache.init_app(app)
+        
+        # Serve probe lookups from memory
+        from .services import probe_registry
+        probe_registry.init_app(app)
+        
+        # Buffer pushed check results
+        from .services import status_ingest
+        status_ingest.init_app(app)
         
-        # Initialize default data
-        from .models.probe import init_default_probes
-        init_default_probes()
+        # Register CLI commands
+        from .cli import register_commands
+        register_commands(app)
         
         @app.after_request
         def add_header(response):
@@ -52,4 +110,4 @@ def create_app(config_name=None):
     return app
 
 # Import models to ensure they are registered with SQLAlchemy
-from .models import probe, target
\ No newline at end of file
+from .models import probe, target, status_history
\ No newline at end of file
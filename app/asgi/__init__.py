@@ -0,0 +1,26 @@
+"""
+ASGI serving mode.
+
+`asgi.py` at the repository root exposes create_asgi_app(create_app()) to
+ASGI servers such as Uvicorn. See app/asgi/application.py for what is
+served on the event loop and what is passed to the Flask application.
+"""
+from .application import AsgiApplication
+from .database import AsyncDatabase, async_url
+
+def create_asgi_app(app=None):
+    """
+    Wrap a Flask application in the ASGI application
+    
+    Args:
+        app: The Flask application, created with create_app() if omitted
+    
+    Returns:
+        AsgiApplication
+    """
+    if app is None:
+        from app import create_app
+        app = create_app()
+    return AsgiApplication(app)
+
+__all__ = ['AsgiApplication', 'AsyncDatabase', 'async_url', 'create_asgi_app']
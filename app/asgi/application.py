@@ -0,0 +1,356 @@
+"""
+ASGI application serving the read paths that hold connections open.
+
+The SD endpoints, the target listing and the event stream run as
+coroutines on the event loop. Their queries go through AsyncDatabase, and
+their JSON serialization runs on a small worker thread pool. A
+long-polling SD request (?index=<version>&wait=<seconds>) or an open
+event stream is a suspended coroutine until the data version moves, so
+it costs a few kilobytes, not a thread. Every other request, including
+SD requests with query parameters this module does not know, goes to the
+Flask application on a bounded thread pool, so the blueprints keep
+working unchanged.
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+from flask import jsonify
+from app.asgi.database import open_database
+from app.asgi.watcher import VersionWatcher
+from app.asgi.wsgi import WsgiFallback
+from app.routes.prometheus import (sd_statement, sd_groups, record_sd_build, sd_key_statement,
+                                   sd_fragment_statement, sd_entries, sd_shape, sd_fragments, sd_module)
+from app.models.target import Target, DICT_FIELDS, FRAGMENT_KEY
+from app.services.target_service import TargetService
+from app.utils.fragment_cache import join_fragments, missing_statement
+from app.utils.json_provider import pretty_json
+from app.utils.metrics import RequestMetrics
+from app.utils.row_serializer import get_row_serializer
+
+logger = logging.getLogger(__name__)
+
+# Methods that cannot change data; any other request may have written
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Query parameters understood by the native SD and listing handlers
+SD_PARAMETERS = {'assignee', 'index', 'wait'}
+LISTING_PARAMETERS = {'q'}
+
+def query_parameters(scope):
+    """Get the query parameters of a request as a dictionary of last values"""
+    parsed = parse_qs(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+    return {name: values[-1] for name, values in parsed.items()}
+
+async def wait_for_disconnect(receive):
+    """Return once the client has closed the connection"""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def wait_for_change(changed, disconnect, timeout):
+    """
+    Wait until a data version changes, the timeout expires or the client leaves
+    
+    Args:
+        changed: VersionWatcher.changed event taken before reading the versions
+        disconnect: Task running wait_for_disconnect()
+        timeout: Seconds to wait at most
+    
+    Returns:
+        False if the client disconnected, True otherwise
+    """
+    waiter = asyncio.ensure_future(changed.wait())
+    try:
+        await asyncio.wait((waiter, disconnect), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+    return not disconnect.done()
+
+async def respond(send, status, body, content_type=b'application/json', headers=()):
+    """Send a complete HTTP response"""
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode()),
+                    *headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+class AsgiApplication:
+    """ASGI front of a Flask application"""
+    
+    def __init__(self, app):
+        self.app = app
+        config = app.config
+        self.workers = ThreadPoolExecutor(config.get('ASGI_WORKER_THREADS', 4),
+                                          thread_name_prefix='asgi-worker')
+        self.wsgi = WsgiFallback(app, ThreadPoolExecutor(config.get('ASGI_WSGI_THREADS', 8),
+                                                         thread_name_prefix='asgi-wsgi'))
+        self.database = open_database(app, self.workers)
+        self.watcher = VersionWatcher(app.extensions['data_versions'], self.database,
+                                      config.get('DATA_VERSION_CHECK_INTERVAL', 1.0))
+        self.flight = app.extensions['single_flight']
+        self.fragments = app.extensions['fragment_cache']
+        self.long_poll_max = config.get('ASGI_LONG_POLL_MAX', 300)
+        self.keepalive = config.get('ASGI_EVENTS_KEEPALIVE', 15)
+        self.routes = {
+            '/api/targets': self.list_targets,
+            '/api/events': self.events,
+        }
+        
+        registry = app.extensions['metrics']
+        self.request_metrics = RequestMetrics(registry) if config.get('METRICS_ENABLED', True) else None
+        self.streams = registry.gauge('asgi_open_streams', 'Long-polling SD requests and event streams open',
+                                      ('route',))
+        self._started = False
+        self._start_lock = asyncio.Lock()
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        
+        await self.start()
+        route, handler = self._route(scope)
+        if handler is None:
+            await self.wsgi(scope, receive, send)
+            if scope['method'] not in SAFE_METHODS:
+                # Wake the waiting connections right after a local write
+                self.watcher.kick()
+            return
+        
+        state = self.request_metrics.start(route) if self.request_metrics else None
+        status = 500
+        try:
+            status = await handler(scope, receive, send)
+        finally:
+            if state is not None:
+                self.request_metrics.finish(state, scope['method'], status)
+    
+    def _route(self, scope):
+        """
+        Find the native handler of a request
+        
+        Returns:
+            Tuple of (route label, handler), with a None handler for requests
+            served by Flask
+        """
+        # Until the data versions could be read (e.g. the schema is not
+        # migrated yet), Flask answers, with its 503 schema check
+        if scope['method'] != 'GET' or not self.watcher.snapshot:
+            return None, None
+        path = scope['path']
+        parameters = query_parameters(scope)
+        
+        if path.startswith('/api/sd/'):
+            protocol = path[len('/api/sd/'):]
+            if protocol and '/' not in protocol and protocol != 'test' and set(parameters) <= SD_PARAMETERS:
+                return '/api/sd/<protocol>', lambda *args: self.service_discovery(*args, protocol)
+            return None, None
+        
+        if path == '/api/targets' and not set(parameters) <= LISTING_PARAMETERS:
+            return None, None
+        handler = self.routes.get(path)
+        return (path, handler) if handler is not None else (None, None)
+    
+    async def service_discovery(self, scope, receive, send, protocol):
+        """GET /api/sd/<protocol>, optionally long-polling on the targets version"""
+        parameters = query_parameters(scope)
+        protocol_lower = protocol.lower()
+        index = parameters.get('index')
+        if index is not None:
+            try:
+                wait = float(parameters.get('wait', 60))
+            except ValueError:
+                wait = None
+            # min() would keep nan
+            if wait is None or not math.isfinite(wait) or wait < 0:
+                await respond(send, 400, b'{"error": "wait must be a number of seconds"}')
+                return 400
+            wait = min(wait, self.long_poll_max)
+            if not await self._wait_for_version('targets', index, wait, receive):
+                return 499
+        
+        # Concurrent refreshes of the same SD URL share one build of the body
+        version = self.watcher.current('targets')
+        assignee = parameters.get('assignee')
+        key = ('sd', protocol_lower, assignee, version)
+        body = await self.flight.do_async(key, lambda: self._build_sd_body(protocol_lower, assignee))
+        await respond(send, 200, body, headers=[(b'x-data-version', str(version).encode())])
+        return 200
+    
+    async def _wait_for_version(self, name, index, wait, receive):
+        """
+        Hold a long-polling request while the version of `name` equals `index`
+        
+        Returns:
+            False if the client disconnected while waiting
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        self.streams.labels('/api/sd/<protocol>').inc()
+        try:
+            while True:
+                changed = self.watcher.changed
+                remaining = deadline - loop.time()
+                if str(self.watcher.current(name)) != index or remaining <= 0:
+                    return True
+                if not await wait_for_change(changed, disconnect, remaining):
+                    return False
+        finally:
+            disconnect.cancel()
+            self.streams.labels('/api/sd/<protocol>').dec()
+    
+    async def _build_sd_body(self, protocol_lower, assignee):
+        started = time.perf_counter()
+        module = sd_module(self.app, protocol_lower)
+        if not self.fragments.enabled:
+            with self.app.app_context():
+                statement = sd_statement(assignee)
+            targets = await self.database.scalars(statement)
+            return await self._in_worker(self._serialize_sd, targets, protocol_lower, module, started)
+        
+        with self.app.app_context():
+            key_statement = sd_key_statement(assignee)
+            statement = sd_fragment_statement(assignee)
+            shape = sd_shape(protocol_lower)
+            pretty = pretty_json(self.app)
+        entries = sd_entries(await self.database.rows(key_statement), protocol_lower)
+        fragments = await self._fragments(shape, entries, statement,
+                                          lambda rows: sd_fragments(rows, protocol_lower, module))
+        with self.app.app_context():
+            record_sd_build(protocol_lower, started, len(fragments))
+        return await self._in_worker(lambda: join_fragments(fragments, pretty) + b'\n')
+    
+    def _serialize_sd(self, targets, protocol_lower, module, started):
+        with self.app.app_context():
+            result = sd_groups(targets, protocol_lower, module)
+            body = jsonify(result).get_data()
+            record_sd_build(protocol_lower, started, len(result))
+        return body
+    
+    async def list_targets(self, scope, receive, send):
+        """GET /api/targets, optionally searched with q="""
+        search_query = query_parameters(scope).get('q', '')
+        with self.app.app_context():
+            serializer = get_row_serializer('target', DICT_FIELDS)
+            statement = TargetService.search_statement(search_query)
+        if not self.fragments.enabled:
+            rows = await self.database.rows(statement.with_only_columns(*serializer.columns))
+            body = await self._in_worker(lambda: serializer.dumps_rows(rows) + b'\n')
+        else:
+            keys = await self.database.rows(statement.with_only_columns(*FRAGMENT_KEY).order_by(Target.id))
+            fragments = await self._fragments(
+                serializer, keys, statement.with_only_columns(*FRAGMENT_KEY, *serializer.columns),
+                lambda rows: serializer.dumps_fragments([row[2:] for row in rows])
+            )
+            body = await self._in_worker(lambda: join_fragments(fragments, serializer.pretty) + b'\n')
+        await respond(send, 200, body)
+        return 200
+    
+    async def _fragments(self, shape, keys, statement, encode):
+        """
+        Get the fragments of a listing from the cache, selecting and
+        encoding only the targets missing from it
+        
+        Args:
+            shape: Fragment cache shape
+            keys: Rows starting with FRAGMENT_KEY or CONFIG_FRAGMENT_KEY, in
+                listing order
+            statement: Unrestricted SELECT of the rows `encode` takes
+            encode: Function encoding a list of rows
+        
+        Returns:
+            List of fragments in listing order
+        """
+        fragments, missing = await self._in_worker(self.fragments.lookup, shape, keys)
+        if missing:
+            with self.app.app_context():
+                statement = missing_statement(statement, missing)
+            rows = await self.database.rows(statement)
+            
+            def complete():
+                with self.app.app_context():
+                    return self.fragments.complete(shape, keys, fragments, rows, encode)
+            fragments = await self._in_worker(complete)
+        return fragments
+    
+    async def events(self, scope, receive, send):
+        """
+        GET /api/events: server-sent events of data version changes
+        
+        Sends the current version of every kind of data on connect, then an
+        event named after the data ('targets', 'target_status', 'probes')
+        whenever its version moves, and a comment every ASGI_EVENTS_KEEPALIVE
+        seconds.
+        """
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        self.streams.labels('/api/events').inc()
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+                            (b'x-accel-buffering', b'no')],
+            })
+            sent = {}
+            while True:
+                changed = self.watcher.changed
+                messages = []
+                for name, version in sorted(self.watcher.snapshot.items()):
+                    if sent.get(name) != version:
+                        sent[name] = version
+                        data = json.dumps({'name': name, 'version': version})
+                        messages.append(f'event: {name}\ndata: {data}\n\n')
+                if messages:
+                    await send({'type': 'http.response.body', 'body': ''.join(messages).encode(),
+                                'more_body': True})
+                if not await wait_for_change(changed, disconnect, self.keepalive):
+                    return 200
+                if not changed.is_set():
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+        finally:
+            disconnect.cancel()
+            self.streams.labels('/api/events').dec()
+    
+    async def _in_worker(self, function, *args):
+        """Run CPU-bound work (serialization) on the worker thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.workers, function, *args)
+    
+    async def start(self):
+        """Read the data versions and start watching them, once"""
+        if self._started:
+            return
+        async with self._start_lock:
+            if self._started:
+                return
+            try:
+                await self.watcher.check()
+            except Exception as e:
+                logger.warning('Reading the data versions failed (%s), requests go to Flask until it works', e)
+            self.watcher.start()
+            self._started = True
+    
+    async def close(self):
+        """Stop watching and release connections and threads"""
+        await self.watcher.stop()
+        await self.database.close()
+        self.workers.shutdown(wait=False)
+        self.wsgi.executor.shutdown(wait=False)
+    
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
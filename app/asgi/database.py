@@ -0,0 +1,111 @@
+"""
+Database access for the ASGI handlers.
+
+With an async driver installed (aiosqlite for SQLite, asyncpg for
+PostgreSQL) queries run on an SQLAlchemy AsyncEngine, and a request
+waiting for the database holds no thread. Without one they run on the
+application's synchronous engine in the worker thread pool, so only the
+requests querying at that moment use a thread. Reads go to the replica
+when one is configured, as for the read-only Flask routes.
+"""
+import asyncio
+import logging
+from sqlalchemy.orm import Session
+from app import db
+from app.utils.db_routing import REPLICA_BIND
+from app.utils.sqlite import apply_sqlite_pragmas
+
+logger = logging.getLogger(__name__)
+
+# Async driver of each synchronous database URL scheme
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+}
+
+def async_url(url):
+    """
+    Get the async driver URL of a database URL
+    
+    Args:
+        url: SQLAlchemy URL string, e.g. 'sqlite:///blackbox_monitoring.db'
+    
+    Returns:
+        The URL with its async driver, or None when there is none
+    """
+    scheme, separator, rest = url.partition('://')
+    driver = ASYNC_DRIVERS.get(scheme)
+    if not separator or driver is None:
+        return None
+    return f'{driver}://{rest}'
+
+class AsyncDatabase:
+    """Runs read queries for the ASGI handlers without blocking the event loop"""
+    
+    def __init__(self, engine, async_engine, executor):
+        self.engine = engine
+        self.async_engine = async_engine
+        self.executor = executor
+    
+    @property
+    def driver(self):
+        """'async' when queries run on the async engine, 'threads' otherwise"""
+        return 'async' if self.async_engine is not None else 'threads'
+    
+    async def scalars(self, statement):
+        """Run an ORM SELECT; returns the list of loaded entities"""
+        if self.async_engine is not None:
+            from sqlalchemy.ext.asyncio import AsyncSession
+            async with AsyncSession(self.async_engine) as session:
+                return (await session.scalars(statement)).all()
+        return await self._in_thread(lambda session: session.scalars(statement).all())
+    
+    async def rows(self, statement):
+        """Run a Core SELECT; returns the list of rows"""
+        if self.async_engine is not None:
+            async with self.async_engine.connect() as connection:
+                return (await connection.execute(statement)).all()
+        return await self._in_thread(lambda session: session.execute(statement).all())
+    
+    async def close(self):
+        """Close the connections of the async engine"""
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+    
+    async def _in_thread(self, function):
+        def run():
+            with Session(self.engine) as session:
+                return function(session)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, run)
+
+def open_database(app, executor):
+    """
+    Set up the database access of the ASGI handlers
+    
+    Uses ASGI_DATABASE_URL, or the async driver URL of the replica (if
+    configured) or primary database, when its driver can be loaded.
+    
+    Args:
+        app: The Flask application
+        executor: Thread pool for queries when no async driver is available
+    
+    Returns:
+        AsyncDatabase
+    """
+    with app.app_context():
+        engine = db.engines.get(REPLICA_BIND) or db.engine
+    
+    url = app.config.get('ASGI_DATABASE_URL') or async_url(engine.url.render_as_string(hide_password=False))
+    async_engine = None
+    if url:
+        try:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            async_engine = create_async_engine(url)
+        except ImportError as e:
+            logger.info('No async database driver (%s), ASGI queries run in threads', e)
+    
+    if async_engine is not None:
+        apply_sqlite_pragmas(async_engine.sync_engine, app.config.get('SQLITE_PRAGMAS'))
+    return AsyncDatabase(engine, async_engine, executor)
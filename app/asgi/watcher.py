@@ -0,0 +1,88 @@
+"""
+Data version watcher of the ASGI app.
+
+One task per process reads the data_versions table every
+DATA_VERSION_CHECK_INTERVAL seconds, or right after a write served by
+this process, and wakes every connection waiting for a change: long-
+polling SD requests and event streams. A waiting connection is a
+suspended coroutine holding an asyncio.Event reference, not a thread.
+"""
+import asyncio
+import logging
+from sqlalchemy import select
+from app.models.data_version import DataVersion
+
+logger = logging.getLogger(__name__)
+
+class VersionWatcher:
+    """Reads the data versions for the event loop and broadcasts changes"""
+    
+    def __init__(self, versions, database, interval=1.0):
+        self.versions = versions
+        self.database = database
+        self.interval = interval
+        self.snapshot = {}
+        self._changed = asyncio.Event()
+        self._kick = asyncio.Event()
+        self._task = None
+        self._failing = False
+    
+    @property
+    def changed(self):
+        """
+        Event set at the next version change
+        
+        Take it before reading `snapshot`, so a change between the read and
+        the wait still wakes the waiter.
+        """
+        return self._changed
+    
+    def current(self, name):
+        """Last version of `name` read by the watcher, None before the first read"""
+        return self.snapshot.get(name)
+    
+    async def check(self):
+        """Read the versions now and wake the waiters if any moved"""
+        rows = await self.database.rows(select(DataVersion.name, DataVersion.version))
+        # Also invalidates the process's in-memory caches (probe registry)
+        self.versions.update(rows)
+        snapshot = dict(rows)
+        if snapshot != self.snapshot:
+            self.snapshot = snapshot
+            event, self._changed = self._changed, asyncio.Event()
+            event.set()
+    
+    def kick(self):
+        """Check again without waiting for the interval, e.g. after a write"""
+        self._kick.set()
+    
+    def start(self):
+        """Keep watching the versions in a background task"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        """Stop the background task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._kick.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._kick.clear()
+            try:
+                await self.check()
+                self._failing = False
+            except Exception:
+                # Logged once per outage, not at every interval
+                if not self._failing:
+                    logger.exception('Reading the data versions failed')
+                self._failing = True
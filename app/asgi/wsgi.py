@@ -0,0 +1,108 @@
+"""
+Serve ASGI HTTP requests with a WSGI application.
+
+The Flask blueprints keep running unchanged on a bounded thread pool: the
+request body is read on the event loop, the WSGI call and the iteration of
+its response run on a pool thread, and the buffered response is sent back
+from the event loop. A thread is only used while Flask is working on a
+request, never while a client is slow to send or read.
+"""
+import asyncio
+import io
+import sys
+
+async def read_body(receive):
+    """Read the whole body of an ASGI HTTP request"""
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    return b''.join(chunks)
+
+def build_environ(scope, body):
+    """
+    Build the WSGI environ of an ASGI HTTP request
+    
+    Args:
+        scope: ASGI HTTP connection scope
+        body: Request body bytes
+    
+    Returns:
+        PEP 3333 environ dictionary
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    
+    if body and 'CONTENT_LENGTH' not in environ:
+        environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+class WsgiFallback:
+    """ASGI application that runs a WSGI application on a thread pool"""
+    
+    def __init__(self, wsgi_app, executor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+    
+    async def __call__(self, scope, receive, send):
+        body = await read_body(receive)
+        environ = build_environ(scope, body)
+        status, headers, content = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self._call, environ
+        )
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+    
+    def _call(self, environ):
+        """Run the WSGI application; returns (status, headers, body)"""
+        response = {}
+        chunks = []
+        
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+            return chunks.append
+        
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                chunks.append(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], b''.join(chunks)
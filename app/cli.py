@@ -0,0 +1,109 @@
+"""
+Command line interface (flask <command>).
+"""
+import click
+from flask.cli import AppGroup
+from app import db
+
+history_cli = AppGroup('history', help='Status history maintenance.')
+prober_cli = AppGroup('prober', help='Built-in target checker.')
+exporter_cli = AppGroup('exporter', help='Blackbox exporter integration.')
+prometheus_cli = AppGroup('prometheus', help='Prometheus integration.')
+statistics_cli = AppGroup('statistics', help='Target statistics counters.')
+db_cli = AppGroup('db', help='Database schema and default data.')
+
+@db_cli.command('upgrade')
+def upgrade_database():
+    """Apply pending schema migrations and seed the default probes."""
+    from app.migrations import run_migrations
+    from app.models.probe import init_default_probes
+    
+    applied = run_migrations()
+    init_default_probes()
+    if applied:
+        click.echo(f"Applied migrations {', '.join(str(version) for version in applied)}")
+    else:
+        click.echo('Schema is up to date')
+
+@db_cli.command('version')
+def database_version():
+    """Show the stored schema version and the latest one known to the code."""
+    from app.migrations import stored_version, latest_version
+    
+    click.echo(f'Schema version {stored_version()} (latest {latest_version()})')
+
+@history_cli.command('compact')
+def compact_history():
+    """Downsample raw status history and expire old rollups."""
+    from app.services.status_history import StatusHistoryService
+    
+    result = StatusHistoryService.compact()
+    db.session.commit()
+    click.echo(
+        f"Folded {result['raw_folded']} raw runs and {result['five_minute_folded']} "
+        f"5m rollups, expired {result['hourly_expired']} 1h rollups"
+    )
+
+@statistics_cli.command('rebuild')
+def rebuild_statistics():
+    """Recompute the target statistics counters from the targets table."""
+    from app.services.target_statistics import StatisticsService
+    
+    written = StatisticsService.rebuild_counters()
+    db.session.commit()
+    click.echo(f"Rebuilt {written} statistics counters")
+
+@prober_cli.command('run')
+@click.option('--once', is_flag=True, help='Check every target once and exit.')
+@click.option('--workers', type=int, default=None,
+              help='Check processes, default PROBER_WORKERS; more than one shards the targets.')
+def run_prober(once, workers):
+    """Check enabled targets, each every check_interval (default PROBER_INTERVAL) seconds."""
+    import asyncio
+    from flask import current_app
+    from app.services.prober import run_rounds, run_scheduled
+    
+    app = current_app._get_current_object()
+    workers = workers or app.config.get('PROBER_WORKERS', 1)
+    if workers > 1:
+        from app.services.check_workers import CheckWorkers
+        
+        if once:
+            stats = CheckWorkers(app, workers).run_once()
+            click.echo(f"Checked {stats['checks']} targets in {stats['duration_s']}s with "
+                       f"{workers} workers ({stats['checks_per_second']}/s): {stats['by_status']}")
+        else:
+            CheckWorkers(app, workers).run(log=click.echo)
+    elif once:
+        asyncio.run(run_rounds(app, once=True, log=click.echo))
+    else:
+        asyncio.run(run_scheduled(app, log=click.echo))
+
+@exporter_cli.command('sync')
+@click.option('--once', is_flag=True, help='Sync every target once and exit.')
+def sync_exporter(once):
+    """Store blackbox_exporter probe results every EXPORTER_SYNC_INTERVAL seconds."""
+    import asyncio
+    from flask import current_app
+    from app.services.exporter_sync import run_sync
+    
+    asyncio.run(run_sync(current_app._get_current_object(), once=once, log=click.echo))
+
+@prometheus_cli.command('sync')
+@click.option('--once', is_flag=True, help='Import once and exit.')
+def sync_prometheus(once):
+    """Import probe_success of the blackbox jobs every PROMETHEUS_SYNC_INTERVAL seconds."""
+    import asyncio
+    from flask import current_app
+    from app.services.prometheus_sync import run_sync
+    
+    asyncio.run(run_sync(current_app._get_current_object(), once=once, log=click.echo))
+
+def register_commands(app):
+    """Register the CLI command groups on the application"""
+    app.cli.add_command(history_cli)
+    app.cli.add_command(prober_cli)
+    app.cli.add_command(exporter_cli)
+    app.cli.add_command(prometheus_cli)
+    app.cli.add_command(statistics_cli)
+    app.cli.add_command(db_cli)
@@ -3,31 +3,224 @@ Configuration settings for the Flask application.
 """
 import os
 
+def database_url(url):
+    """
+    Normalize a database URL taken from the environment
+    
+    Accepts the legacy 'postgres://' scheme that some hosting providers
+    still hand out and which SQLAlchemy no longer recognizes.
+    """
+    if url and url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def engine_options(url):
+    """
+    Build pool settings for a database URL, overridable from the environment
+    
+    Args:
+        url: The database URL the engine will connect to
+        
+    Returns:
+        Dictionary of SQLAlchemy create_engine() options
+    """
+    is_sqlite = url.startswith('sqlite')
+    options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 3600 if is_sqlite else 1800)),
+        # A server can drop idle connections; a local file cannot
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'false' if is_sqlite else 'true').lower() == 'true',
+    }
+    if url.split('://', 1)[0] in ('postgresql', 'postgresql+psycopg2'):
+        # Send executemany() UPDATE/DELETE batches in pages instead of one round trip per row
+        options['executemany_mode'] = 'values_plus_batch'
+    return options
+
+def replica_binds(url):
+    """Build SQLALCHEMY_BINDS for an optional read replica URL"""
+    url = database_url(url)
+    if not url:
+        return {}
+    return {'replica': dict(engine_options(url), url=url)}
+
+def exporter_modules(value):
+    """Parse 'protocol=module,...' overrides of the blackbox exporter modules"""
+    modules = {}
+    for pair in (value or '').split(','):
+        if '=' in pair:
+            protocol, module = pair.split('=', 1)
+            modules[protocol.strip().lower()] = module.strip()
+    return modules
+
 class Config:
     """Base configuration class"""
     # SQLAlchemy settings
     SQLALCHEMY_DATABASE_URI = 'sqlite:///blackbox_monitoring.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Optional read replica used by read-only endpoints (see app/utils/db_routing.py)
+    SQLALCHEMY_BINDS = replica_binds(os.environ.get('DATABASE_REPLICA_URL'))
+    
+    # PRAGMAs applied to every new SQLite connection (see app/utils/sqlite.py)
+    SQLITE_PRAGMAS = {}
+    
+    # Apply pending migrations and seed default probes when the app starts.
+    # With it off, startup only checks the schema version (see
+    # app/migrations/runner.py) and `flask db upgrade` does the rest
+    DB_AUTO_MIGRATE = os.environ.get('DB_AUTO_MIGRATE', 'true').lower() == 'true'
+    
     # Application settings
     DEBUG = True
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-key-please-change-in-production'
     
+    # Search diagnostics (GET /api/targets/explain), disabled unless explicitly enabled
+    SEARCH_EXPLAIN_ENABLED = os.environ.get('SEARCH_EXPLAIN_ENABLED', 'false').lower() == 'true'
+    
+    # Seconds before a worker reloads its in-memory probe list
+    PROBE_REGISTRY_TTL = int(os.environ.get('PROBE_REGISTRY_TTL', 60))
+    
+    # Seconds between a worker's checks of the data versions; a write in one
+    # worker reaches the caches of the others within this window
+    # (see app/services/data_version.py)
+    DATA_VERSION_CHECK_INTERVAL = float(os.environ.get('DATA_VERSION_CHECK_INTERVAL', 1.0))
+    
+    # Share one in-flight SD or statistics computation between concurrent
+    # identical requests (see app/utils/single_flight.py)
+    SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+    
+    # Memory budget in bytes of each worker's cache of encoded targets for
+    # GET /api/targets and SD responses; 0 disables it (see app/utils/fragment_cache.py)
+    FRAGMENT_CACHE_MAX_BYTES = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    
+    # JSON encoder of jsonify(): 'auto' uses orjson when installed, else
+    # the json module; 'orjson' or 'stdlib' force one (see app/utils/json_provider.py)
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto').lower()
+    
+    # ASGI serving (see app/asgi). Queries run on ASGI_DATABASE_URL, by
+    # default the database URL with an async driver (aiosqlite, asyncpg)
+    # when one is installed, else on ASGI_WORKER_THREADS threads, which also
+    # serialize responses. The Flask routes the ASGI app does not serve
+    # itself run on ASGI_WSGI_THREADS threads
+    ASGI_DATABASE_URL = database_url(os.environ.get('ASGI_DATABASE_URL'))
+    ASGI_WORKER_THREADS = int(os.environ.get('ASGI_WORKER_THREADS', 4))
+    ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 8))
+    # Longest wait of a long-polling SD request, and seconds between
+    # keepalive comments on idle event streams
+    ASGI_LONG_POLL_MAX = int(os.environ.get('ASGI_LONG_POLL_MAX', 300))
+    ASGI_EVENTS_KEEPALIVE = int(os.environ.get('ASGI_EVENTS_KEEPALIVE', 15))
+    
+    # Status history retention in seconds (see app/services/status_history.py)
+    STATUS_HISTORY_RAW_RETENTION = int(os.environ.get('STATUS_HISTORY_RAW_RETENTION', 2 * 86400))
+    STATUS_HISTORY_5M_RETENTION = int(os.environ.get('STATUS_HISTORY_5M_RETENTION', 14 * 86400))
+    STATUS_HISTORY_1H_RETENTION = int(os.environ.get('STATUS_HISTORY_1H_RETENTION', 400 * 86400))
+    
+    STATUS_HISTORY_ENABLED = os.environ.get('STATUS_HISTORY_ENABLED', 'true').lower() == 'true'
+    
+    # Status ingestion (POST /api/status/ingest, see app/services/status_ingest.py)
+    STATUS_INGEST_FLUSH_INTERVAL = float(os.environ.get('STATUS_INGEST_FLUSH_INTERVAL', 1.0))
+    STATUS_INGEST_MAX_PENDING = int(os.environ.get('STATUS_INGEST_MAX_PENDING', 50000))
+    STATUS_INGEST_TOUCH_INTERVAL = int(os.environ.get('STATUS_INGEST_TOUCH_INTERVAL', 60))
+    STATUS_INGEST_BACKGROUND_FLUSH = True
+    
+    # Built-in checker (flask prober run, see app/services/prober.py)
+    PROBER_INTERVAL = int(os.environ.get('PROBER_INTERVAL', 60))
+    PROBER_CONCURRENCY = int(os.environ.get('PROBER_CONCURRENCY', 1000))
+    PROBER_PER_HOST_CONCURRENCY = int(os.environ.get('PROBER_PER_HOST_CONCURRENCY', 4))
+    PROBER_ICMP_MODE = os.environ.get('PROBER_ICMP_MODE', 'tcp')  # 'tcp' or 'ping'
+    PROBER_ICMP_TCP_PORT = int(os.environ.get('PROBER_ICMP_TCP_PORT', 80))
+    PROBER_TLS_VERIFY = os.environ.get('PROBER_TLS_VERIFY', 'true').lower() == 'true'
+    PROBER_DEFAULT_TIMEOUT = int(os.environ.get('PROBER_DEFAULT_TIMEOUT', 10))
+    PROBER_MAX_IDLE_CONNECTIONS = int(os.environ.get('PROBER_MAX_IDLE_CONNECTIONS', 1000))
+    PROBER_DNS_TTL = int(os.environ.get('PROBER_DNS_TTL', 300))  # Seconds a resolved address is reused
+    PROBER_WRITE_BATCH = int(os.environ.get('PROBER_WRITE_BATCH', 5000))
+    PROBER_WORKERS = int(os.environ.get('PROBER_WORKERS', 1))  # Check processes; >1 shards targets
+    PROBER_SYNC_INTERVAL = int(os.environ.get('PROBER_SYNC_INTERVAL', 10))  # Seconds between target syncs
+    PROBER_MIN_CHECK_INTERVAL = int(os.environ.get('PROBER_MIN_CHECK_INTERVAL', 1))  # Smallest check_interval accepted
+    
+    # Serve /api/statistics from the target_counters table instead of a scan
+    # of targets (see app/services/target_statistics.py)
+    STATISTICS_COUNTERS = os.environ.get('STATISTICS_COUNTERS', 'false').lower() == 'true'
+    
+    # Application metrics on /metrics (see app/utils/metrics.py)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    
+    # Result sync from a running blackbox_exporter (flask exporter sync)
+    BLACKBOX_EXPORTER_URL = os.environ.get('BLACKBOX_EXPORTER_URL', 'http://127.0.0.1:9115')
+    BLACKBOX_EXPORTER_MODULES = exporter_modules(os.environ.get('BLACKBOX_EXPORTER_MODULES'))
+    EXPORTER_SYNC_INTERVAL = int(os.environ.get('EXPORTER_SYNC_INTERVAL', 30))
+    EXPORTER_SYNC_CONCURRENCY = int(os.environ.get('EXPORTER_SYNC_CONCURRENCY', 50))
+    
+    # Bulk status import from Prometheus (flask prometheus sync)
+    PROMETHEUS_URL = os.environ.get('PROMETHEUS_URL', 'http://127.0.0.1:9090')
+    PROMETHEUS_SYNC_JOBS = [job.strip() for job in os.environ.get('PROMETHEUS_SYNC_JOBS', '').split(',')
+                            if job.strip()]  # Default: blackbox_<protocol> for each protocol
+    PROMETHEUS_SYNC_INTERVAL = int(os.environ.get('PROMETHEUS_SYNC_INTERVAL', 30))
+    PROMETHEUS_SYNC_TIMEOUT = int(os.environ.get('PROMETHEUS_SYNC_TIMEOUT', 30))
+    
+    # Check scheduling: targets are spread over their interval, DOWN targets back off
+    SCHEDULER_TICK = float(os.environ.get('SCHEDULER_TICK', 1.0))
+    SCHEDULER_DOWN_BACKOFF = float(os.environ.get('SCHEDULER_DOWN_BACKOFF', 2.0))
+    SCHEDULER_MAX_BACKOFF = int(os.environ.get('SCHEDULER_MAX_BACKOFF', 600))
+    
+    # Query counting (see app/utils/query_counter.py)
+    QUERY_STATS_HEADERS = False
+    QUERY_N_PLUS_ONE_THRESHOLD = 10
+    
+    # Slow query log; statements at or above the threshold are logged to the
+    # 'app.slow_queries' logger, and to SLOW_QUERY_LOG_FILE when set
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE')
+    
+    # Per-request query budget (None = unlimited); views override it with
+    # query_budget(). Overruns are logged, or raise QueryBudgetExceeded when
+    # QUERY_BUDGET_ENFORCE is set
+    QUERY_BUDGET_COUNT = int(os.environ['QUERY_BUDGET_COUNT']) if os.environ.get('QUERY_BUDGET_COUNT') else None
+    QUERY_BUDGET_MS = float(os.environ['QUERY_BUDGET_MS']) if os.environ.get('QUERY_BUDGET_MS') else None
+    QUERY_BUDGET_ENFORCE = os.environ.get('QUERY_BUDGET_ENFORCE', 'false').lower() == 'true'
+    
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
+    SEARCH_EXPLAIN_ENABLED = True
+    QUERY_STATS_HEADERS = True
     
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
+    STATUS_INGEST_BACKGROUND_FLUSH = False
+    QUERY_STATS_HEADERS = True
+    QUERY_N_PLUS_ONE_THRESHOLD = 5
+    QUERY_BUDGET_COUNT = 20
+    QUERY_BUDGET_ENFORCE = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///test_blackbox_monitoring.db'
     
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     # Use environment variables for sensitive information in production
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///blackbox_monitoring.db'
+    SQLALCHEMY_DATABASE_URI = database_url(os.environ.get('DATABASE_URL')) or 'sqlite:///blackbox_monitoring.db'
     SECRET_KEY = os.environ.get('SECRET_KEY')
+    
+    # Workers only check the schema version; deploys run `flask db upgrade` once
+    DB_AUTO_MIGRATE = os.environ.get('DB_AUTO_MIGRATE', 'false').lower() == 'true'
+    
+    # WAL lets SD readers run while a writer commits; NORMAL sync is durable
+    # against application crashes in WAL mode and avoids an fsync per commit.
+    # busy_timeout makes writers wait for the lock instead of failing with
+    # "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),  # negative = KiB
+        'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+    }
+    
+    # Connection pool per worker process
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,4 @@
+"""
+Database schema migrations package.
+"""
+from .runner import run_migrations, current_version, latest_version, stored_version, check_schema
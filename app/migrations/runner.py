@@ -0,0 +1,134 @@
+"""
+Versioned schema migration runner.
+"""
+from datetime import datetime
+from flask import jsonify
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from app import db
+from .versions import MIGRATIONS
+
+# Applied migrations, one row per version
+schema_version = db.Table('schema_version',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False)
+)
+
+def latest_version():
+    """Return the newest migration version known to the code"""
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+def current_version(connection=None):
+    """
+    Get the schema version stored in the database
+    
+    Args:
+        connection: Optional connection to use instead of the session engine
+        
+    Returns:
+        The highest applied migration version, 0 for an unversioned database
+    """
+    if connection is None:
+        with db.engine.connect() as connection:
+            return current_version(connection)
+    
+    schema_version.create(connection, checkfirst=True)
+    connection.commit()
+    return connection.execute(select(func.coalesce(func.max(schema_version.c.version), 0))).scalar()
+
+def stored_version(connection=None):
+    """
+    Read the schema version with a single query
+    
+    Unlike current_version() this never creates the schema_version table,
+    so it is cheap enough to run in every worker at startup.
+    
+    Args:
+        connection: Optional connection to use instead of the session engine
+    
+    Returns:
+        The highest applied migration version, 0 when the table is missing
+    """
+    if connection is None:
+        with db.engine.connect() as connection:
+            return stored_version(connection)
+    
+    try:
+        return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return 0
+
+def check_schema(app):
+    """
+    Check the stored schema version against the code at startup
+    
+    A database that is behind gets a warning, and requests are answered
+    with 503 until `flask db upgrade` has run. While behind, the version is
+    read again on every request, so workers started before the upgrade
+    recover without a restart. A newer schema (code rolled back, or an
+    upgrade run ahead of a rolling restart) is only logged.
+    
+    Returns:
+        The stored schema version
+    """
+    latest = latest_version()
+    state = {'version': stored_version()}
+    if state['version'] > latest:
+        app.logger.warning('Database schema version %d is newer than this code (%d)',
+                           state['version'], latest)
+    if state['version'] >= latest:
+        return state['version']
+    
+    app.logger.warning('Database schema version %d is behind this code (%d), run `flask db upgrade`',
+                       state['version'], latest)
+    
+    @app.before_request
+    def require_current_schema():
+        """Refuse requests until the schema has been upgraded"""
+        if state['version'] < latest:
+            state['version'] = stored_version()
+        if state['version'] < latest:
+            return jsonify({
+                'error': f"Database schema version {state['version']} is behind {latest}, "
+                         f"run `flask db upgrade`"
+            }), 503
+    
+    return state['version']
+
+def run_migrations():
+    """
+    Apply all pending migrations in version order
+    
+    Each migration runs in its own transaction together with the insert of
+    its version row, so a failed migration leaves the previous version in
+    place. When several processes start at once, the one that loses the race
+    for a version row rolls back and continues from the next version.
+    
+    Returns:
+        List of versions applied by this call
+    """
+    applied = []
+    
+    with db.engine.connect() as connection:
+        version = current_version(connection)
+    
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        
+        try:
+            with db.engine.begin() as connection:
+                migration.upgrade(connection)
+                connection.execute(schema_version.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            # Another process applied this version first
+            continue
+        
+        applied.append(migration.version)
+    
+    return applied
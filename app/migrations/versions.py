@@ -0,0 +1,250 @@
+"""
+Schema migrations, in version order.
+
+Migrations describe the schema as it was at their version and must not
+import the models, which always reflect the latest schema.
+"""
+from collections import namedtuple
+from sqlalchemy import (MetaData, Table, Column, Integer, String, Boolean,
+                        DateTime, ForeignKey, inspect, select, text)
+
+Migration = namedtuple('Migration', ['version', 'description', 'upgrade'])
+
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a migration function under a version number"""
+    def decorator(upgrade):
+        MIGRATIONS.append(Migration(version, description, upgrade))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return upgrade
+    return decorator
+
+def create_index(connection, name, table, *columns):
+    """Create an index unless it already exists"""
+    connection.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    ))
+
+def analyze(connection):
+    """Refresh planner statistics after index changes"""
+    connection.execute(text('ANALYZE'))
+
+@migration(1, 'Create base tables')
+def create_base_tables(connection):
+    """Create the probes, targets and target_probes tables"""
+    metadata = MetaData()
+    
+    Table('probes', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String(100), nullable=False),
+        Column('location', String(100), nullable=False),
+        Column('provider', String(100), nullable=False),
+        Column('ip_address', String(50), nullable=False),
+        Column('enabled', Boolean),
+        Column('last_updated', DateTime)
+    )
+    
+    Table('targets', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('hostname', String(255), nullable=False),
+        Column('address', String(255), nullable=False),
+        Column('region', String(100), nullable=False),
+        Column('zone', String(100), nullable=False),
+        Column('probe_type', String(50), nullable=False),
+        Column('assignees', String(200), nullable=False),
+        Column('enabled', Boolean),
+        Column('port', Integer),
+        Column('protocol', String(10)),
+        Column('path', String(255)),
+        Column('expect_status_code', String(20)),
+        Column('timeout', Integer),
+        Column('last_status', String(20)),
+        Column('last_status_code', String(20)),
+        Column('last_check', DateTime),
+        Column('last_updated', DateTime)
+    )
+    
+    Table('target_probes', metadata,
+        Column('target_id', Integer, ForeignKey('targets.id'), primary_key=True),
+        Column('probe_id', Integer, ForeignKey('probes.id'), primary_key=True)
+    )
+    
+    # Databases created by db.create_all() before migrations existed
+    # already have these tables
+    metadata.create_all(connection, checkfirst=True)
+
+# Indexes added by migration 2, chosen from the query shapes the app issues:
+# - SD filters on enabled and then matches on probe_type
+# - search filters on equality of region/zone/probe_type/hostname/last_status
+# - statistics group by last_status, probe_type and region
+# - probe -> targets lookups need probe_id as the leading column
+FILTER_INDEXES = [
+    ('ix_targets_enabled_probe_type', 'targets', ('enabled', 'probe_type')),
+    ('ix_targets_probe_type', 'targets', ('probe_type',)),
+    ('ix_targets_region_zone', 'targets', ('region', 'zone')),
+    ('ix_targets_zone', 'targets', ('zone',)),
+    ('ix_targets_hostname', 'targets', ('hostname',)),
+    ('ix_targets_last_status', 'targets', ('last_status',)),
+    ('ix_target_probes_probe_id_target_id', 'target_probes', ('probe_id', 'target_id')),
+]
+
+@migration(2, 'Add indexes for SD, search and statistics filters')
+def add_filter_indexes(connection):
+    """Create the indexes backing the hot filter columns"""
+    for name, table, columns in FILTER_INDEXES:
+        create_index(connection, name, table, *columns)
+    analyze(connection)
+
+@migration(3, 'Move assignees to the target_assignees association table')
+def add_target_assignees(connection):
+    """Create target_assignees and backfill it from targets.assignees"""
+    metadata = MetaData()
+    targets = Table('targets', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('assignees', String(200))
+    )
+    target_assignees = Table('target_assignees', metadata,
+        Column('target_id', Integer, ForeignKey('targets.id'), primary_key=True),
+        Column('assignee', String(100), primary_key=True)
+    )
+    target_assignees.create(connection, checkfirst=True)
+    create_index(connection, 'ix_target_assignees_assignee_target_id',
+                 'target_assignees', 'assignee', 'target_id')
+    
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(targets.c.id, targets.c.assignees)
+            .where(targets.c.id > last_id)
+            .order_by(targets.c.id)
+            .limit(5000)
+        ).all()
+        if not rows:
+            break
+        
+        links = []
+        for target_id, assignees in rows:
+            seen = set()
+            for name in (assignees or '').split(','):
+                name = name.strip()
+                if name and name not in seen:
+                    seen.add(name)
+                    links.append({'target_id': target_id, 'assignee': name})
+        if links:
+            connection.execute(target_assignees.insert(), links)
+        last_id = rows[-1][0]
+    
+    analyze(connection)
+
+@migration(4, 'Add status history tables')
+def add_status_history(connection):
+    """Create status_runs (raw, run-length encoded) and status_rollups (5m/1h)"""
+    metadata = MetaData()
+    Table('targets', metadata, Column('id', Integer, primary_key=True))
+    
+    Table('status_runs', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('target_id', Integer, ForeignKey('targets.id'), nullable=False),
+        Column('status', String(20)),
+        Column('status_code', String(20)),
+        Column('started_at', Integer, nullable=False),
+        Column('ended_at', Integer, nullable=False),
+        Column('checks', Integer, nullable=False)
+    )
+    
+    Table('status_rollups', metadata,
+        Column('target_id', Integer, ForeignKey('targets.id'), primary_key=True),
+        Column('resolution', Integer, primary_key=True),
+        Column('bucket_start', Integer, primary_key=True),
+        Column('up', Integer, nullable=False),
+        Column('down', Integer, nullable=False),
+        Column('other', Integer, nullable=False)
+    )
+    
+    metadata.tables['status_runs'].create(connection, checkfirst=True)
+    metadata.tables['status_rollups'].create(connection, checkfirst=True)
+    create_index(connection, 'ix_status_runs_target_id_started_at',
+                 'status_runs', 'target_id', 'started_at')
+    create_index(connection, 'ix_status_runs_ended_at', 'status_runs', 'ended_at')
+    create_index(connection, 'ix_status_rollups_resolution_bucket_start',
+                 'status_rollups', 'resolution', 'bucket_start')
+
+@migration(5, 'Add per-target check intervals')
+def add_check_interval(connection):
+    """Add targets.check_interval and index last_updated for incremental scheduler syncs"""
+    columns = {column['name'] for column in inspect(connection).get_columns('targets')}
+    if 'check_interval' not in columns:
+        connection.execute(text('ALTER TABLE targets ADD COLUMN check_interval INTEGER'))
+    create_index(connection, 'ix_targets_last_updated', 'targets', 'last_updated')
+
+@migration(6, 'Add target statistics counters')
+def add_target_counters(connection):
+    """Create target_counters, fill it from the current targets and index the statistics scan"""
+    metadata = MetaData()
+    target_counters = Table('target_counters', metadata,
+        Column('dimension', String(20), primary_key=True),
+        Column('value', String(255), primary_key=True),
+        Column('count', Integer, nullable=False)
+    )
+    target_counters.create(connection, checkfirst=True)
+    
+    connection.execute(text('DELETE FROM target_counters'))
+    for dimension, value, source, condition in (
+        ('total', "''", 'targets', None),
+        ('enabled', "CASE WHEN enabled THEN 'true' ELSE 'false' END", 'targets', 'enabled IS NOT NULL'),
+        ('status', 'last_status', 'targets', 'last_status IS NOT NULL'),
+        ('type', 'probe_type', 'targets', None),
+        ('region', 'region', 'targets', None),
+        ('assignee', 'assignee', 'target_assignees', None),
+        ('probe', 'CAST(probe_id AS VARCHAR(20))', 'target_probes', None),
+    ):
+        where = f' WHERE {condition}' if condition else ''
+        group = '' if dimension == 'total' else f' GROUP BY {value}'
+        connection.execute(text(
+            f"INSERT INTO target_counters (dimension, value, count) "
+            f"SELECT '{dimension}', {value}, COUNT(*) FROM {source}{where}{group}"
+        ))
+    # Covering index for the single GROUP BY of StatisticsService.single_pass()
+    create_index(connection, 'ix_targets_statistics', 'targets',
+                 'enabled', 'probe_type', 'last_status', 'region')
+    analyze(connection)
+
+@migration(7, 'Add data versions for cross-worker cache invalidation')
+def add_data_versions(connection):
+    """Create data_versions with a row for targets and one for probes"""
+    metadata = MetaData()
+    data_versions = Table('data_versions', metadata,
+        Column('name', String(50), primary_key=True),
+        Column('version', Integer, nullable=False)
+    )
+    data_versions.create(connection, checkfirst=True)
+    
+    existing = set(connection.execute(select(data_versions.c.name)).scalars())
+    for name in ('targets', 'probes'):
+        if name not in existing:
+            connection.execute(data_versions.insert().values(name=name, version=0))
+
+@migration(8, 'Add target configuration revisions')
+def add_config_revision(connection):
+    """Add targets.config_revision for incremental scheduler syncs, stamped with the current targets version"""
+    columns = {column['name'] for column in inspect(connection).get_columns('targets')}
+    if 'config_revision' not in columns:
+        connection.execute(text('ALTER TABLE targets ADD COLUMN config_revision INTEGER'))
+    connection.execute(text(
+        "UPDATE targets SET config_revision = "
+        "COALESCE((SELECT version FROM data_versions WHERE name = 'targets'), 0) "
+        "WHERE config_revision IS NULL"
+    ))
+    create_index(connection, 'ix_targets_config_revision', 'targets', 'config_revision')
+
+@migration(9, 'Add a data version for target status')
+def add_target_status_version(connection):
+    """Add the target_status row of data_versions, bumped by status-only writes"""
+    data_versions = Table('data_versions', MetaData(),
+        Column('name', String(50), primary_key=True),
+        Column('version', Integer, nullable=False)
+    )
+    existing = set(connection.execute(select(data_versions.c.name)).scalars())
+    if 'target_status' not in existing:
+        connection.execute(data_versions.insert().values(name='target_status', version=0))
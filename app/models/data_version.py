@@ -0,0 +1,19 @@
+"""
+Data version model definitions.
+"""
+from app import db
+
+class DataVersion(db.Model):
+    """
+    Change counter of one kind of data
+    
+    Bumped in the same transaction as every write to the tables it covers
+    (see app/services/data_version.py), so each worker can tell with one
+    small query whether its in-memory caches are still current. Names are
+    'targets' (targets' configuration and their assignee and probe links),
+    'target_status' (writes to targets' status columns only) and 'probes'.
+    """
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
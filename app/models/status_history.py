@@ -0,0 +1,76 @@
+"""
+Status history model definitions.
+"""
+from datetime import datetime
+from app import db
+
+def to_epoch(value):
+    """Convert a naive UTC datetime to integer epoch seconds"""
+    return int((value - datetime(1970, 1, 1)).total_seconds())
+
+def from_epoch(value):
+    """Convert integer epoch seconds to a naive UTC datetime"""
+    return datetime.utcfromtimestamp(value)
+
+# Last second a datetime can hold (end of year 9999)
+MAX_EPOCH = to_epoch(datetime.max.replace(microsecond=0))
+
+def clamp_epoch(value):
+    """Limit epoch seconds to the range from_epoch() converts, from 1970 on"""
+    return min(max(value, 0), MAX_EPOCH)
+
+class StatusRun(db.Model):
+    """
+    Run-length encoded raw check results
+    
+    One row covers consecutive checks of a target that returned the same
+    status and status code; a new row starts only when the result changes.
+    Times are stored as epoch seconds.
+    """
+    __tablename__ = 'status_runs'
+    __table_args__ = (
+        db.Index('ix_status_runs_target_id_started_at', 'target_id', 'started_at'),
+        db.Index('ix_status_runs_ended_at', 'ended_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    target_id = db.Column(db.Integer, db.ForeignKey('targets.id'), nullable=False)
+    status = db.Column(db.String(20))
+    status_code = db.Column(db.String(20))
+    started_at = db.Column(db.Integer, nullable=False)  # First check in the run
+    ended_at = db.Column(db.Integer, nullable=False)  # Last check in the run
+    checks = db.Column(db.Integer, nullable=False, default=1)
+    
+    def to_dict(self):
+        """Convert run object to dictionary"""
+        return {
+            'status': self.status,
+            'status_code': self.status_code,
+            'start': from_epoch(self.started_at).isoformat(),
+            'end': from_epoch(self.ended_at).isoformat(),
+            'checks': self.checks
+        }
+
+class StatusRollup(db.Model):
+    """Downsampled check counts per target and time bucket"""
+    __tablename__ = 'status_rollups'
+    __table_args__ = (
+        db.Index('ix_status_rollups_resolution_bucket_start', 'resolution', 'bucket_start'),
+    )
+    
+    target_id = db.Column(db.Integer, db.ForeignKey('targets.id'), primary_key=True)
+    resolution = db.Column(db.Integer, primary_key=True)  # Bucket width in seconds (300, 3600)
+    bucket_start = db.Column(db.Integer, primary_key=True)  # Epoch seconds
+    up = db.Column(db.Integer, nullable=False, default=0)
+    down = db.Column(db.Integer, nullable=False, default=0)
+    other = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        """Convert rollup object to dictionary"""
+        return {
+            'resolution': self.resolution,
+            'start': from_epoch(self.bucket_start).isoformat(),
+            'up': self.up,
+            'down': self.down,
+            'other': self.other
+        }
@@ -2,18 +2,67 @@
 Target model definition.
 """
 from datetime import datetime
+from sqlalchemy import String, type_coerce
 from app import db
 from .probe import Probe
 
 # Association table for targets and probes (many-to-many relationship)
 target_probes = db.Table('target_probes',
     db.Column('target_id', db.Integer, db.ForeignKey('targets.id'), primary_key=True),
-    db.Column('probe_id', db.Integer, db.ForeignKey('probes.id'), primary_key=True)
+    db.Column('probe_id', db.Integer, db.ForeignKey('probes.id'), primary_key=True),
+    # Reverse lookups (targets of a probe)
+    db.Index('ix_target_probes_probe_id_target_id', 'probe_id', 'target_id')
 )
 
+# Normalized assignees, one row per (target, assignee). Target.assignees keeps
+# the comma-separated form for display and SD labels.
+target_assignees = db.Table('target_assignees',
+    db.Column('target_id', db.Integer, db.ForeignKey('targets.id'), primary_key=True),
+    db.Column('assignee', db.String(100), primary_key=True),
+    # Per-team lookups and facets
+    db.Index('ix_target_assignees_assignee_target_id', 'assignee', 'target_id')
+)
+
+def parse_assignees(value):
+    """
+    Normalize assignees given as a comma-separated string or a list
+    
+    Args:
+        value: String like "team-a, team-b" or list of names
+        
+    Returns:
+        List of unique, stripped assignee names in their original order
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    
+    names = []
+    for name in value:
+        name = str(name).strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def format_assignees(names):
+    """Join assignee names into the comma-separated column form"""
+    return ','.join(names)
+
 class Target(db.Model):
     """Model for target endpoints to be monitored"""
     __tablename__ = 'targets'
+    __table_args__ = (
+        db.Index('ix_targets_enabled_probe_type', 'enabled', 'probe_type'),
+        db.Index('ix_targets_probe_type', 'probe_type'),
+        db.Index('ix_targets_region_zone', 'region', 'zone'),
+        db.Index('ix_targets_zone', 'zone'),
+        db.Index('ix_targets_hostname', 'hostname'),
+        db.Index('ix_targets_last_status', 'last_status'),
+        db.Index('ix_targets_last_updated', 'last_updated'),
+        db.Index('ix_targets_config_revision', 'config_revision'),
+        db.Index('ix_targets_statistics', 'enabled', 'probe_type', 'last_status', 'region'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     hostname = db.Column(db.String(255), nullable=False)
@@ -28,13 +77,21 @@ class Target(db.Model):
     path = db.Column(db.String(255))  # URL path for HTTP
     expect_status_code = db.Column(db.String(20))  # Expected status code(s) for HTTP
     timeout = db.Column(db.Integer, default=10)  # Timeout in seconds
+    check_interval = db.Column(db.Integer)  # Seconds between checks, None for PROBER_INTERVAL
     last_status = db.Column(db.String(20))  # UP, DOWN, UNKNOWN
     last_status_code = db.Column(db.String(20))  # HTTP status code or error code
     last_check = db.Column(db.DateTime)  # Time of last check
     last_updated = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # 'targets' data version of the last configuration change, stamped at
+    # commit (see app/services/data_version.py); status writes keep it
+    config_revision = db.Column(db.Integer)
     
-    # Many-to-many relationship with probes
-    probes = db.relationship('Probe', secondary=target_probes, lazy='subquery',
+    # Many-to-many relationship with probes, loaded only when asked for
+    # (see TargetService._with_probes). Association rows are written and
+    # removed with set-based statements (see TargetService._set_probes),
+    # so deleting a target does not load its collection.
+    probes = db.relationship('Probe', secondary=target_probes, lazy='select',
+                           passive_deletes=True,
                            backref=db.backref('targets', lazy=True))
     
     def to_dict(self, include_probes=False):
@@ -53,6 +110,7 @@ class Target(db.Model):
             'path': self.path,
             'expect_status_code': self.expect_status_code,
             'timeout': self.timeout,
+            'check_interval': self.check_interval,
             'last_status': self.last_status,
             'last_status_code': self.last_status_code,
             'last_check': self.last_check.isoformat() if self.last_check else None,
@@ -62,4 +120,27 @@ class Target(db.Model):
         if include_probes:
             result['probes'] = [probe.to_dict() for probe in self.probes]
             
-        return result
\ No newline at end of file
+        return result
+
+# Keys of Target.to_dict() without probes, in order, each the name of its
+# column; used to serialize rows without loading Target objects
+# (see app/utils/row_serializer.py)
+DICT_FIELDS = tuple((name, getattr(Target, name)) for name in (
+    'id', 'hostname', 'address', 'region', 'zone', 'probe_type', 'assignees', 'enabled', 'port',
+    'protocol', 'path', 'expect_status_code', 'timeout', 'check_interval', 'last_status',
+    'last_status_code', 'last_check', 'last_updated'
+))
+
+# Leading columns of rows whose JSON fragments are cached: the target and
+# its version (see app/utils/fragment_cache.py). last_updated is read as
+# the driver returns it, without parsing it into a datetime
+FRAGMENT_KEY = (Target.id, type_coerce(Target.last_updated, String).label('stamp'))
+
+# Columns written by status checks. Writes changing only these move the
+# 'target_status' data version; a change to anything else is a
+# configuration change, which moves 'targets' and config_revision
+STATUS_FIELDS = frozenset(('last_status', 'last_status_code', 'last_check', 'last_updated', 'config_revision'))
+
+# Leading columns of SD target group rows whose fragments are cached:
+# SD groups hold configuration only, so status writes keep them
+CONFIG_FRAGMENT_KEY = (Target.id, Target.config_revision)
@@ -0,0 +1,20 @@
+"""
+Target statistics counter model definitions.
+"""
+from app import db
+
+class TargetCounter(db.Model):
+    """
+    Number of targets per statistics dimension and value
+    
+    Maintained in the same transaction as every target write (see
+    app/services/target_statistics.py), so /api/statistics can be served
+    from this small table instead of scanning targets. Dimensions are
+    'total' (value ''), 'enabled' ('true'/'false'), 'status', 'type',
+    'region', 'assignee' and 'probe' (the probe ID).
+    """
+    __tablename__ = 'target_counters'
+    
+    dimension = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(255), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
@@ -1,21 +1,45 @@
 """
 API routes for target management.
 """
-from flask import Blueprint, request, jsonify
+from datetime import datetime, timezone
+from flask import Blueprint, request, jsonify, current_app
 from app.services.target_service import TargetService
-from app.models.probe import Probe
+from app.services.probe_registry import get_probe_registry
+from app.services.data_version import get_data_versions
+from app.services.status_history import StatusHistoryService
+from app.services.status_ingest import get_status_ingestor, parse_results
+from app.models.status_history import clamp_epoch, to_epoch
+from app.utils.db_routing import read_only
+from app.utils.metrics import get_metrics
+from app.utils.single_flight import get_single_flight
 
 # Create a Blueprint
 api = Blueprint('api', __name__)
 
 @api.route('/targets', methods=['GET'])
+@read_only
 def get_targets():
     """Get all targets or search targets"""
     # Handle search query
     search_query = request.args.get('q', '')
     include_probes = request.args.get('include_probes', 'false').lower() == 'true'
+    if include_probes:
+        return jsonify(TargetService.search_targets(search_query, include_probes))
     
-    return jsonify(TargetService.search_targets(search_query, include_probes))
+    # Plain rows and a compiled serializer; same bytes as jsonify(), faster
+    body = TargetService.search_targets_json(search_query)
+    return current_app.response_class(body + b'\n', mimetype='application/json')
+
+@api.route('/targets/explain', methods=['GET'])
+def explain_targets():
+    """Explain how a target search is executed"""
+    if not current_app.config.get('SEARCH_EXPLAIN_ENABLED'):
+        return jsonify({'error': 'Not found'}), 404
+    
+    search_query = request.args.get('q', '')
+    include_probes = request.args.get('include_probes', 'false').lower() == 'true'
+    
+    return jsonify(TargetService.explain_search(search_query, include_probes))
 
 @api.route('/targets/<int:target_id>', methods=['GET'])
 def get_target(target_id):
@@ -28,6 +52,50 @@ def get_target(target_id):
         
     return jsonify(target)
 
+def _parse_time(value, default):
+    """
+    Parse epoch seconds or an ISO 8601 timestamp (naive means UTC) into epoch seconds
+    
+    Moments before 1970 or after year 9999 are clamped to those bounds.
+    
+    Raises:
+        ValueError: When the value is neither, or not finite
+    """
+    if not value:
+        return default
+    try:
+        return clamp_epoch(int(float(value)))
+    except OverflowError:
+        raise ValueError(f'{value} is not a finite number of seconds')
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    except OverflowError:
+        # e.g. 0001-01-01T00:00+01:00, before datetime.min in UTC
+        raise ValueError(f'{value} is out of range')
+    return clamp_epoch(to_epoch(moment))
+
+@api.route('/targets/<int:target_id>/history', methods=['GET'])
+@read_only
+def get_target_history(target_id):
+    """Get the status history of a target (defaults to the last 24 hours)"""
+    if not TargetService.get_target_by_id(target_id):
+        return jsonify({'error': 'Target not found'}), 404
+    
+    try:
+        end = _parse_time(request.args.get('to'), to_epoch(datetime.utcnow()))
+        start = _parse_time(request.args.get('from'), end - 86400)
+    except ValueError:
+        return jsonify({'error': 'from/to must be epoch seconds or ISO 8601 timestamps'}), 400
+    
+    if start > end:
+        return jsonify({'error': 'from must not be after to'}), 400
+    
+    return jsonify(StatusHistoryService.get_history(target_id, start, end))
+
 @api.route('/targets', methods=['POST'])
 def create_target():
     """Create a new target"""
@@ -39,7 +107,10 @@ def create_target():
         if field not in data:
             return jsonify({'error': f'Missing required field: {field}'}), 400
     
-    result = TargetService.create_target(data)
+    try:
+        result = TargetService.create_target(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     return jsonify(result), 201
 
 @api.route('/targets/<int:target_id>', methods=['PUT'])
@@ -47,7 +118,10 @@ def update_target(target_id):
     """Update a target"""
     data = request.json
     
-    result = TargetService.update_target(target_id, data)
+    try:
+        result = TargetService.update_target(target_id, data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     if not result:
         return jsonify({'error': 'Target not found'}), 404
         
@@ -78,15 +152,48 @@ def batch_operation():
         return jsonify({'error': 'target_ids must be a non-empty array'}), 400
     
     result, status_code = TargetService.batch_operation(operation, target_ids, fields)
+    if status_code == 200:
+        registry = get_metrics()
+        registry.counter('target_batch_operations_total', 'Successful batch operations',
+                         ('operation',)).labels(operation).inc()
+        registry.counter('target_batch_targets_total', 'Targets changed by batch operations',
+                         ('operation',)).labels(operation).inc(result['affected_count'])
     return jsonify(result), status_code
 
+@api.route('/status/ingest', methods=['POST'])
+def ingest_status():
+    """Accept a batch of check results; writes are coalesced per flush window"""
+    try:
+        results = parse_results(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    ingestor = get_status_ingestor()
+    flushed = ingestor.submit(results)
+    if request.args.get('flush', 'false').lower() == 'true':
+        flushed = ingestor.flush() or flushed
+    
+    # A failed flush leaves the results buffered (flushed is null), so the
+    # client must not send them again
+    return jsonify({'accepted': len(results), 'flushed': flushed, 'pending': ingestor.pending()}), 202
+
 @api.route('/probes', methods=['GET'])
 def get_probes():
     """Get all probes"""
-    probes = Probe.query.all()
-    return jsonify([probe.to_dict() for probe in probes])
+    return jsonify(get_probe_registry().all())
+
+@api.route('/assignees', methods=['GET'])
+def get_assignees():
+    """Get target counts per assignee"""
+    return jsonify(TargetService.get_assignee_facets())
 
 @api.route('/statistics', methods=['GET'])
+@read_only
 def get_statistics():
     """Get system statistics"""
-    return jsonify(TargetService.get_statistics())
\ No newline at end of file
+    # Concurrent dashboard refreshes share one aggregation; probe names
+    # come from the probe registry, so the probes version is part of the key
+    versions = get_data_versions()
+    key = ('statistics', versions.current('targets'), versions.current('target_status'),
+           versions.current('probes'))
+    return jsonify(get_single_flight().do(key, TargetService.get_statistics))
\ No newline at end of file
@@ -0,0 +1,13 @@
+"""
+Prometheus scrape endpoint for the application's own metrics.
+"""
+from flask import Blueprint, Response
+from app.utils.metrics import get_metrics
+
+# Create a Blueprint
+metrics = Blueprint('metrics', __name__)
+
+@metrics.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose request, query, SD, cache and ingestion metrics"""
+    return Response(get_metrics().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
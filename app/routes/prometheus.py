@@ -1,8 +1,20 @@
 """
 Prometheus service discovery routes.
 """
-from flask import Blueprint, jsonify, request
-from app.models.target import Target
+import time
+from flask import Blueprint, current_app, jsonify, request
+from sqlalchemy import select
+from app import db
+from app.models.target import Target, CONFIG_FRAGMENT_KEY
+from app.services.data_version import get_data_versions
+from app.utils.fragment_cache import encode_items, get_fragment_cache, join_fragments, missing_statement
+from app.utils.json_provider import pretty_json
+from app.utils.query_parser import assignee_condition
+from app.utils.db_routing import read_only
+from app.utils.metrics import get_metrics
+from app.utils.query_counter import query_budget
+from app.utils.single_flight import get_single_flight
+from app.utils.protocols import PROTOCOL_KEYWORDS, exporter_module, matches_protocol, sd_target_address
 
 # Create a Blueprint
 prometheus = Blueprint('prometheus', __name__)
@@ -32,67 +44,157 @@ def prometheus_sd_test():
     return response
 
 @prometheus.route('/<protocol>', methods=['GET'])
+@read_only
+@query_budget(max_queries=2)
 def prometheus_sd(protocol):
     """Endpoint specifically for Prometheus service discovery"""
-    # Log the request
-    print(f"Prometheus SD endpoint called for protocol: {protocol}")
+    protocol_lower = protocol.lower()
+    
+    # Concurrent refreshes of the same SD URL share one build of the body
+    version = get_data_versions().current('targets')
+    key = ('sd', protocol_lower, request.query_string, version)
+    body = get_single_flight().do(key, lambda: _build_sd_body(protocol_lower))
+    response = current_app.response_class(body, mimetype='application/json')
+    response.headers['X-Data-Version'] = str(version)
+    return response
+
+def _build_sd_body(protocol_lower):
+    """Query the enabled targets of a protocol and serialize the SD response"""
+    started = time.perf_counter()
+    assignee = request.args.get('assignee')
+    module = sd_module(current_app, protocol_lower)
+    cache = get_fragment_cache()
+    if not cache.enabled:
+        enabled_targets = db.session.scalars(sd_statement(assignee)).all()
+        result = sd_groups(enabled_targets, protocol_lower, module)
+        body = jsonify(result).get_data()
+        record_sd_build(protocol_lower, started, len(result))
+        return body
     
-    # Get all targets first to check if any exist
-    all_targets = Target.query.all()
-    print(f"Total targets in database: {len(all_targets)}")
-    for t in all_targets:
-        print(f"Target: {t.hostname}, probe_type: {t.probe_type}, enabled: {t.enabled}")
+    # Only targets changed since they were last served are encoded again
+    connection = db.session.connection()
+    shape = sd_shape(protocol_lower)
+    entries = sd_entries(connection.execute(sd_key_statement(assignee)).all(), protocol_lower)
+    fragments, missing = cache.lookup(shape, entries)
+    if missing:
+        rows = connection.execute(missing_statement(sd_fragment_statement(assignee), missing)).all()
+        fragments = cache.complete(shape, entries, fragments, rows,
+                                   lambda rows: sd_fragments(rows, protocol_lower, module))
+    record_sd_build(protocol_lower, started, len(fragments))
+    return join_fragments(fragments, pretty_json(current_app)) + b'\n'
     
-    # Get enabled targets first
-    enabled_targets = Target.query.filter_by(enabled=True).all()
-    print(f"Enabled targets: {len(enabled_targets)}")
+def sd_statement(assignee=None):
+    """
+    Build the query of the targets served by service discovery
     
-    # More flexible filtering approach
-    entries = []
-    protocol_lower = protocol.lower()
-    for target in enabled_targets:
-        # Try multiple fields that might contain protocol information
-        probe_type = target.probe_type.lower() if target.probe_type else ""
+    Args:
+        assignee: Optional team name (with '*' wildcards) to limit the targets to
         
-        # Check for match in probe_type field
-        if (protocol_lower in probe_type or 
-            (protocol_lower == 'icmp' and any(x in probe_type for x in ['icmp', 'ping'])) or
-            (protocol_lower == 'http' and any(x in probe_type for x in ['http', 'web', 'url'])) or
-            (protocol_lower == 'tcp' and any(x in probe_type for x in ['tcp', 'socket']))):
-            entries.append(target)
+    Returns:
+        SELECT of the enabled Target entities
+    """
+    # Enabled targets, optionally limited to one team
+    statement = select(Target).where(Target.enabled == True)
+    if assignee:
+        statement = statement.where(assignee_condition(assignee))
+    return statement
     
-    print(f"Matching targets for protocol {protocol}: {len(entries)}")
+def sd_module(app, protocol_lower):
+    """Module label of the SD target groups of a protocol, as the exporter sync probes it"""
+    return exporter_module(protocol_lower, app.config.get('BLACKBOX_EXPORTER_MODULES'))
+    
+def sd_groups(enabled_targets, protocol_lower, module):
+    """
+    Build the SD target groups of a protocol
+    
+    Args:
+        enabled_targets: Target entities returned by sd_statement()
+        protocol_lower: Lowercase protocol name
+        module: Blackbox exporter module, see sd_module()
+        
+    Returns:
+        List of target group dictionaries in the Prometheus HTTP SD format
+    """
+    # More flexible filtering approach
+    entries = [target for target in enabled_targets if matches_protocol(target.probe_type, protocol_lower)]
     
     # If still no targets, add all enabled targets as a fallback for testing
     if not entries and protocol_lower == 'icmp' and enabled_targets:
-        print(f"No targets found for {protocol}, using all enabled targets as fallback")
         entries = enabled_targets
     
-    result = []
-    for entry in entries:
-        target_address = entry.address
-        if protocol_lower == 'tcp' and entry.port:
-            target_address = f"{entry.address}:{entry.port}"
-            
-        item = {
-            "targets": [target_address],
-            "labels": {
-                "id": str(entry.id),
-                "hostname": entry.hostname,
-                "module": protocol_lower,  # Use the protocol as the module
-                "region": entry.region,
-                "assignees": entry.assignees,
-                "job": f"blackbox_{protocol_lower}"
-            }
+    return [sd_group(entry, protocol_lower, module) for entry in entries]
+    
+def sd_group(entry, protocol_lower, module):
+    """
+    Build the SD target group of one target
+    
+    Args:
+        entry: Target entity, or row with its id, address, port, hostname,
+            region and assignees
+        protocol_lower: Lowercase protocol name
+        module: Blackbox exporter module, see sd_module()
+        
+    Returns:
+        Target group dictionary in the Prometheus HTTP SD format
+    """
+    return {
+        "targets": [sd_target_address(entry.address, entry.port, protocol_lower)],
+        "labels": {
+            "id": str(entry.id),
+            "hostname": entry.hostname,
+            "module": module,
+            "region": entry.region,
+            "assignees": entry.assignees,
+            "job": f"blackbox_{protocol_lower}"
         }
-        result.append(item)
-        print(f"Added target to result: {target_address}")
+    }
     
-    # Log the result to help with debugging
-    print(f"Prometheus SD endpoint for {protocol} returned {len(result)} targets")
-    if result:
-        print(f"Sample result item: {result[0]}")
+def sd_key_statement(assignee=None):
+    """SELECT of CONFIG_FRAGMENT_KEY and probe_type of the targets served by service discovery, by ID"""
+    return (sd_statement(assignee).with_only_columns(*CONFIG_FRAGMENT_KEY, Target.probe_type)
+            .order_by(Target.id))
     
-    response = jsonify(result)
-    response.headers['Content-Type'] = 'application/json'
-    return response
\ No newline at end of file
+def sd_fragment_statement(assignee=None):
+    """SELECT of the rows sd_fragments() encodes, to restrict with missing_statement()"""
+    return sd_statement(assignee).with_only_columns(
+        *CONFIG_FRAGMENT_KEY, Target.address, Target.port, Target.hostname, Target.region, Target.assignees
+    )
+    
+def sd_entries(keys, protocol_lower):
+    """
+    Select the rows of sd_key_statement() served for a protocol
+    
+    The same selection as sd_groups(), with the protocol matched once per
+    distinct probe type.
+    
+    Args:
+        keys: Rows of sd_key_statement()
+        protocol_lower: Lowercase protocol name
+        
+    Returns:
+        List of the selected rows
+    """
+    probe_types = {key[2] for key in keys}
+    served = {probe_type for probe_type in probe_types if matches_protocol(probe_type, protocol_lower)}
+    entries = [key for key in keys if key[2] in served]
+    if not entries and protocol_lower == 'icmp':
+        entries = list(keys)
+    return entries
+    
+def sd_shape(protocol_lower):
+    """Fragment cache shape of the SD target groups of a protocol"""
+    return ('sd', protocol_lower, pretty_json(current_app))
+    
+def sd_fragments(rows, protocol_lower, module):
+    """Encode rows of sd_fragment_statement() as SD target group fragments"""
+    return encode_items(sd_group(row, protocol_lower, module) for row in rows)
+    
+def record_sd_build(protocol_lower, started, count):
+    """Record the build time and size of an SD response"""
+    # Unknown protocols share one label value to keep the series count bounded
+    label = protocol_lower if protocol_lower in PROTOCOL_KEYWORDS else 'other'
+    registry = get_metrics()
+    registry.histogram('sd_build_duration_seconds', 'Time to build a service discovery response',
+                       ('protocol',)).labels(label).observe(time.perf_counter() - started)
+    registry.gauge('sd_targets', 'Targets in the last service discovery response',
+                   ('protocol',)).labels(label).set(count)
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+Multi-process checking: one event loop per CPU core.
+
+A single event loop saturates one core (TLS handshakes, response parsing)
+long before the network is the limit. In worker mode the enabled targets
+are partitioned across PROBER_WORKERS processes with shard_of(), and each
+worker runs its own event loop, scheduler and connection pools.
+
+The parent process is the only one talking to the database: it polls
+target changes with TargetSync, routes the updates to the worker owning
+each target, and writes the results the workers send back in batches, so
+SQLite sees a single writer.
+"""
+import asyncio
+import multiprocessing
+import queue
+import time
+from collections import Counter
+from app.services.prober import Prober, TargetSync, check_loop, load_specs, write_results
+from app.services.scheduler import CheckScheduler, shard_of
+
+def worker_config(config):
+    """Pick the picklable prober and scheduler settings passed to workers"""
+    return {key: value for key, value in config.items()
+            if key.startswith(('PROBER_', 'SCHEDULER_'))}
+
+def _worker_main(config, inbox, outbox, once):
+    """Process entry point of a check worker"""
+    try:
+        asyncio.run(_worker(config, inbox, outbox, once))
+    except KeyboardInterrupt:
+        pass
+
+async def _worker(config, inbox, outbox, once):
+    """
+    Check the targets of one shard
+    
+    Messages on inbox are (upserts, removes) tuples for apply_updates(), or
+    None to stop. In once mode the single message is a list of CheckSpec to
+    check once. Results go to outbox as ('results', batch) and a final
+    ('done', stats).
+    """
+    prober = Prober.from_config(config)
+    batch_size = config.get('PROBER_WRITE_BATCH', 5000)
+    stats = None
+    try:
+        if once:
+            specs = inbox.get()
+            stats = await prober.run(specs, lambda batch: outbox.put(('results', batch)), batch_size)
+            return
+        
+        stop = asyncio.Event()
+        
+        async def poll():
+            upserts, removes = [], []
+            while True:
+                try:
+                    message = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    stop.set()
+                    break
+                upserts.extend(message[0])
+                removes.extend(message[1])
+            return upserts, removes
+        
+        await check_loop(
+            prober, CheckScheduler.from_config(config), poll,
+            lambda batch: outbox.put(('results', batch)), stop=stop,
+            sync_interval=0, batch_size=batch_size
+        )
+    finally:
+        await prober.close()
+        outbox.put(('done', stats))
+
+class CheckWorkers:
+    """Parent side of worker mode: target sync, routing and the result writer"""
+    
+    def __init__(self, app, workers):
+        self.app = app
+        self.workers = workers
+        self.batch_size = app.config.get('PROBER_WRITE_BATCH', 5000)
+        self.statuses = Counter()
+        self._context = multiprocessing.get_context('spawn')
+        self._outbox = self._context.Queue()
+        self._inboxes = []
+        self._processes = []
+    
+    def start(self, once=False):
+        """Start the worker processes"""
+        config = worker_config(self.app.config)
+        for _ in range(self.workers):
+            inbox = self._context.Queue()
+            process = self._context.Process(
+                target=_worker_main, args=(config, inbox, self._outbox, once), daemon=True
+            )
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+    
+    def route(self, upserts, removes):
+        """Send schedule updates to the workers owning the targets"""
+        shards = [([], []) for _ in range(self.workers)]
+        for update in upserts:
+            shards[shard_of(update[0].target_id, self.workers)][0].append(update)
+        for target_id in removes:
+            shards[shard_of(target_id, self.workers)][1].append(target_id)
+        for inbox, (shard_upserts, shard_removes) in zip(self._inboxes, shards):
+            if shard_upserts or shard_removes:
+                inbox.put((shard_upserts, shard_removes))
+    
+    def collect(self, timeout):
+        """
+        Write results arriving within timeout seconds
+        
+        Returns:
+            List of stats dictionaries of workers that finished
+        """
+        deadline = time.monotonic() + timeout
+        pending = []
+        finished = []
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                kind, payload = self._outbox.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if kind == 'done':
+                finished.append(payload)
+                continue
+            pending.extend(payload)
+            if len(pending) >= self.batch_size:
+                self._write(pending)
+                pending = []
+        self._write(pending)
+        return finished
+    
+    def _write(self, results):
+        """Write one batch of results back to the targets"""
+        if results:
+            write_results(self.app, results)
+            self.statuses.update(result[1] for result in results)
+    
+    def _drain(self, timeout=None):
+        """
+        Write results until every worker reported done, or timeout passes
+        
+        Workers that exited without reporting (killed, crashed) end the wait
+        once their last queued messages are written.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = 0
+        while done < len(self._processes):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            done += len(self.collect(0.5))
+            if done < len(self._processes) and not any(p.is_alive() for p in self._processes):
+                self.collect(0.5)
+                break
+        for process in self._processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+    
+    def stop(self):
+        """Stop the workers and write their remaining results"""
+        for inbox in self._inboxes:
+            inbox.put(None)
+        self._drain(timeout=30)
+    
+    def run_once(self):
+        """
+        Check every enabled target once across the workers
+        
+        Returns:
+            Dictionary with counts per status, duration and checks per second
+        """
+        started = time.perf_counter()
+        self.start(once=True)
+        shards = [[] for _ in range(self.workers)]
+        for spec in load_specs(self.app):
+            shards[shard_of(spec.target_id, self.workers)].append(spec)
+        for inbox, specs in zip(self._inboxes, shards):
+            inbox.put(specs)
+        
+        self._drain()
+        
+        duration = time.perf_counter() - started
+        checks = sum(self.statuses.values())
+        return {
+            'checks': checks,
+            'by_status': dict(self.statuses),
+            'workers': self.workers,
+            'duration_s': round(duration, 3),
+            'checks_per_second': round(checks / duration) if duration else 0
+        }
+    
+    def run(self, log=print, stop=None):
+        """
+        Check targets continuously until interrupted or stop is set
+        
+        Args:
+            log: Callable receiving one status line per minute
+            stop: Optional threading.Event ending the loop when set
+        """
+        sync = TargetSync(self.app)
+        sync_interval = self.app.config.get('PROBER_SYNC_INTERVAL', 10)
+        last_log = time.monotonic()
+        self.start()
+        try:
+            while stop is None or not stop.is_set():
+                self.route(*sync.poll())
+                until = time.monotonic() + sync_interval
+                while time.monotonic() < until and (stop is None or not stop.is_set()):
+                    self.collect(min(1.0, until - time.monotonic()))
+                if time.monotonic() - last_log >= 60:
+                    log(f"{self.workers} workers checking {len(sync.enabled_ids)} targets, "
+                        f"results so far: {dict(self.statuses)}")
+                    last_log = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
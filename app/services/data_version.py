@@ -0,0 +1,285 @@
+"""
+Cross-worker cache coherence through per-data version counters.
+
+Each Gunicorn worker keeps its own in-memory caches, so a write served
+by one worker is invisible to the caches of the others. Every commit
+that writes targets (or their assignee and probe links) or probes also
+bumps the matching row of data_versions, in the same transaction. Each
+worker re-reads that small table at most every
+DATA_VERSION_CHECK_INTERVAL seconds, before a request, and calls the
+invalidation callbacks of every name whose version moved. The worker
+that committed the write invalidates at once.
+
+Other workers therefore serve data that is at most
+DATA_VERSION_CHECK_INTERVAL seconds old. Writes made outside the
+application (e.g. bulk SQL) do not bump versions, which is why caches
+keep their own TTLs as well.
+
+Writes to targets that change status columns only (STATUS_FIELDS, as
+written by every check result) bump 'target_status' rather than
+'targets', so the data derived from configuration only (SD responses,
+their single-flight keys and long-poll waits) is not invalidated by
+every check. Flushed ORM objects are told apart by their attribute
+history; INSERT, UPDATE and DELETE statements count as configuration
+writes unless marked with status_write().
+
+Targets inserted, or whose configuration (any column but the status
+ones) changed, are stamped in targets.config_revision with the targets
+version their transaction committed. The bump locks the data_versions
+row until the commit (writers are serialized on SQLite anyway), so
+revisions grow in commit order, and the scheduler can pick up changes
+with config_revision > the last one it saw (see TargetSync).
+"""
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+from app import db
+from app.models.data_version import DataVersion
+from app.models.target import STATUS_FIELDS, Target
+from app.utils.query_counter import uncounted
+
+# Tables whose writes change each kind of data. Writes to targets that
+# change status columns only (STATUS_FIELDS) are 'target_status' instead
+TRACKED_TABLES = {
+    'targets': 'targets',
+    'target_assignees': 'targets',
+    'target_probes': 'targets',
+    'probes': 'probes',
+}
+
+# Execution option of statements marked by status_write()
+STATUS_WRITE_OPTION = 'status_write'
+
+class DataVersions:
+    """This worker's view of the data versions, and its invalidation callbacks"""
+    
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.versions = {}
+        self.checks = 0
+        self._callbacks = {}
+        self._checked_at = None
+        self._lock = threading.Lock()
+    
+    def subscribe(self, name, callback):
+        """Call `callback()` whenever the version of `name` changes"""
+        self._callbacks.setdefault(name, []).append(callback)
+    
+    def current(self, name):
+        """Last version of `name` seen by this worker, None before the first check"""
+        return self.versions.get(name)
+    
+    def changed(self, names):
+        """
+        Invalidate after a commit in this worker wrote `names`
+        
+        The callbacks run right away, and the next refresh() re-reads the
+        versions regardless of the interval.
+        """
+        self._checked_at = None
+        for name in names:
+            self._notify(name)
+    
+    def refresh(self, engine):
+        """
+        Re-read the versions if the check interval has passed
+        
+        The read uses its own short-lived connection, so it does not open a
+        transaction in the request's session. Concurrent requests in the
+        same worker do not wait for a periodic check: while one thread
+        reads the versions, the others keep the current view. After a
+        commit in this worker they do wait, so that every request that
+        follows the write sees its version.
+        
+        Returns:
+            List of names whose version changed
+        """
+        checked_at = self._checked_at
+        if checked_at is not None and time.monotonic() - checked_at < self.interval:
+            return []
+        if not self._lock.acquire(blocking=checked_at is None):
+            return []
+        try:
+            checked_at = self._checked_at
+            if checked_at is not None and time.monotonic() - checked_at < self.interval:
+                return []
+            with uncounted(), engine.connect() as connection:
+                rows = connection.execute(select(DataVersion.name, DataVersion.version)).all()
+            self.checks += 1
+            moved = self._record(rows)
+        finally:
+            self._lock.release()
+        
+        for name in moved:
+            self._notify(name)
+        return moved
+    
+    def update(self, rows):
+        """
+        Apply versions read by the caller, e.g. the ASGI version watcher
+        
+        Args:
+            rows: Iterable of (name, version) pairs from data_versions
+            
+        Returns:
+            List of names whose version changed
+        """
+        with self._lock:
+            self.checks += 1
+            moved = self._record(rows)
+        
+        for name in moved:
+            self._notify(name)
+        return moved
+    
+    def _record(self, rows):
+        """Store freshly read versions; returns the names that moved"""
+        moved = []
+        for name, version in rows:
+            previous = self.versions.get(name)
+            self.versions[name] = version
+            if previous is not None and previous != version:
+                moved.append(name)
+        # Only now may other threads skip the check and use self.versions
+        self._checked_at = time.monotonic()
+        return moved
+    
+    def _notify(self, name):
+        for callback in self._callbacks.get(name, ()):
+            callback()
+
+def init_app(app):
+    """Attach the data versions of this worker and check them before requests"""
+    versions = DataVersions(app.config.get('DATA_VERSION_CHECK_INTERVAL', 1.0))
+    app.extensions['data_versions'] = versions
+    if 'metrics' in app.extensions:
+        registry = app.extensions['metrics']
+        registry.callback(
+            'data_version', 'Data version last seen by this worker', ('name',),
+            lambda: {(name,): version for name, version in versions.versions.items()}
+        )
+        registry.callback(
+            'data_version_checks_total', 'Reads of the data_versions table', (),
+            lambda: {(): versions.checks}, kind='counter'
+        )
+    
+    @app.before_request
+    def check_data_versions():
+        """Invalidate local caches when another worker changed their data"""
+        versions.refresh(db.engine)
+
+def get_data_versions():
+    """Get the data versions of the current application"""
+    return current_app.extensions['data_versions']
+
+def _mark(session, table, status_only=False):
+    """Remember that this transaction writes the data stored in `table`"""
+    name = TRACKED_TABLES.get(getattr(table, 'name', None))
+    if name == 'targets' and status_only:
+        name = 'target_status'
+    if name is not None:
+        session.info.setdefault('data_changed', set()).add(name)
+
+def _changed_fields(obj):
+    """Names of the attributes of a flushed object that changed"""
+    return {attribute.key for attribute in inspect(obj).attrs if attribute.history.has_changes()}
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_flushed_writes(session, flush_context, instances):
+    """Record the data written by ORM objects"""
+    for obj in (*session.new, *session.deleted):
+        _mark(session, getattr(obj, '__table__', None))
+    for obj in session.dirty:
+        if not isinstance(obj, Target):
+            _mark(session, getattr(obj, '__table__', None))
+            continue
+        changed = _changed_fields(obj)
+        if changed:
+            _mark(session, Target.__table__, status_only=changed <= STATUS_FIELDS)
+        if not changed <= STATUS_FIELDS:
+            _reconfigured(session, obj)
+    for obj in session.new:
+        if isinstance(obj, Target):
+            _reconfigured(session, obj)
+
+def _reconfigured(session, target):
+    """Have a new or reconfigured target stamped by _stamp_config_revisions()"""
+    target.config_revision = None
+    session.info['config_changed'] = True
+
+def status_write(statement):
+    """
+    Mark an UPDATE of targets as writing status columns only
+    
+    The statement then bumps 'target_status' instead of 'targets'. Only
+    mark statements that set nothing but STATUS_FIELDS.
+    
+    Returns:
+        The statement with the execution option set
+    """
+    return statement.execution_options(**{STATUS_WRITE_OPTION: True})
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_statement_writes(orm_execute_state):
+    """
+    Record the data written by INSERT, UPDATE and DELETE statements
+    
+    UPDATE statements leave config_revision alone: target configuration
+    is changed through ORM objects, which _track_flushed_writes() stamps.
+    """
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        statement = orm_execute_state.statement
+        # e.g. status ingestion, which sets last_status, last_status_code
+        # and last_check only
+        status_only = orm_execute_state.is_update and orm_execute_state.execution_options.get(STATUS_WRITE_OPTION)
+        _mark(orm_execute_state.session, statement.table, status_only=bool(status_only))
+        if orm_execute_state.is_insert and statement.table is Target.__table__:
+            # Bulk inserts leave config_revision NULL as well
+            orm_execute_state.session.info['config_changed'] = True
+
+def _stamp_config_revisions(session):
+    """Stamp the targets this transaction inserted or reconfigured with the new targets version"""
+    targets = Target.__table__
+    # On the connection: not a write to track, and last_updated (the
+    # fragment cache's stamp) keeps the value of the write itself
+    session.connection().execute(
+        update(targets).where(targets.c.config_revision.is_(None))
+        .values(config_revision=select(DataVersion.version).where(DataVersion.name == 'targets')
+                .scalar_subquery(),
+                last_updated=targets.c.last_updated)
+    )
+
+@event.listens_for(Session, 'before_commit')
+def _bump_versions(session):
+    """Bump the versions of the written data in the committing transaction"""
+    session.flush()
+    names = session.info.pop('data_changed', None)
+    config_changed = session.info.pop('config_changed', False)
+    if not names:
+        return
+    session.execute(
+        update(DataVersion).where(DataVersion.name.in_(sorted(names)))
+        .values(version=DataVersion.version + 1)
+    )
+    if config_changed:
+        _stamp_config_revisions(session)
+    session.info['data_committed'] = names
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_local(session):
+    """Invalidate this worker's caches as soon as the write is committed"""
+    names = session.info.pop('data_committed', None)
+    if names and has_app_context():
+        versions = current_app.extensions.get('data_versions')
+        if versions is not None:
+            versions.changed(names)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_writes(session):
+    """Nothing was written after all"""
+    session.info.pop('data_changed', None)
+    session.info.pop('config_changed', None)
+    session.info.pop('data_committed', None)
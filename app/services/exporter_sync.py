@@ -0,0 +1,200 @@
+"""
+Reads check results back from a running blackbox_exporter.
+
+Prometheus scrapes the exporter with the targets from /api/sd/<protocol>,
+but nothing stored the outcome, so Target.last_status stayed empty. This
+service asks the exporter's /probe endpoint for every enabled target,
+with the same target address and module the SD target group of each of
+its protocols carries (see exporter_module()), and writes the results
+back in batches through StatusIngestService. A target served for
+several protocols is probed for each of them and is UP only when every
+probe succeeds.
+
+Requests go over pooled keep-alive connections with bounded concurrency.
+Each probe gets the target's own timeout: the exporter is told about it
+through the X-Prometheus-Scrape-Timeout-Seconds header, like Prometheus
+does, and the request itself waits a little longer.
+"""
+import asyncio
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+from sqlalchemy import select
+from app import db
+from app.models.target import Target
+from app.services.http_client import HttpClient
+from app.services.prober import error_code, run_batched, write_results
+from app.utils.protocols import exporter_module, sd_target_address, target_protocols
+
+def parse_metrics(text):
+    """
+    Parse Prometheus text exposition into a dictionary
+    
+    Only unlabelled samples are kept, which covers the probe_* gauges the
+    exporter reports for the probe itself.
+    
+    Args:
+        text: Response body of /probe
+    
+    Returns:
+        Dictionary of metric name to float value
+    """
+    metrics = {}
+    for line in text.splitlines():
+        if not line or line[0] == '#' or '{' in line:
+            continue
+        parts = line.split()
+        if len(parts) >= 2:
+            try:
+                metrics[parts[0]] = float(parts[1])
+            except ValueError:
+                continue
+    return metrics
+
+def probe_status(metrics):
+    """
+    Turn probe metrics into a (status, status_code) pair
+    
+    Returns:
+        ('UP' or 'DOWN', the HTTP status code for HTTP probes, otherwise
+        'SUCCESS' or 'FAILED'); ('UNKNOWN', 'NO_RESULT') without probe_success
+    """
+    success = metrics.get('probe_success')
+    if success is None:
+        return 'UNKNOWN', 'NO_RESULT'
+    status = 'UP' if success == 1 else 'DOWN'
+    http_code = int(metrics.get('probe_http_status_code', 0))
+    if http_code:
+        return status, str(http_code)
+    return status, 'SUCCESS' if status == 'UP' else 'FAILED'
+
+# Rank of each status when the probes of several protocols disagree
+STATUS_ORDER = {'DOWN': 0, 'UNKNOWN': 1, 'UP': 2}
+
+class ExporterSync:
+    """Probes targets through a blackbox_exporter and collects the results"""
+    
+    def __init__(self, base_url, modules=None, concurrency=50, default_timeout=10,
+                 timeout_margin=1.0):
+        self.base_url = base_url.rstrip('/')
+        self.modules = modules or {}
+        self.default_timeout = default_timeout
+        self.timeout_margin = timeout_margin
+        self.client = HttpClient(max_idle_per_host=concurrency, max_idle_total=concurrency,
+                                 user_agent='blackbox-httpsd-sync')
+        self._concurrency = concurrency
+        self._limit = None
+    
+    @classmethod
+    def from_config(cls, config):
+        """Create a sync service from the application configuration"""
+        return cls(
+            config['BLACKBOX_EXPORTER_URL'],
+            modules=config.get('BLACKBOX_EXPORTER_MODULES'),
+            concurrency=config.get('EXPORTER_SYNC_CONCURRENCY', 50),
+            default_timeout=config.get('PROBER_DEFAULT_TIMEOUT', 10)
+        )
+    
+    def probe_urls(self, row):
+        """
+        Build the /probe URLs for a target row, one per protocol it is served for
+        
+        Returns:
+            List of URLs, empty if the probe type maps to no protocol
+        """
+        urls = []
+        for protocol in target_protocols(row.probe_type):
+            query = urlencode({'target': sd_target_address(row.address, row.port, protocol),
+                               'module': exporter_module(protocol, self.modules)})
+            urls.append(f'{self.base_url}/probe?{query}')
+        return urls
+    
+    async def probe(self, item):
+        """
+        Ask the exporter to probe one target for each of its protocols
+        
+        Args:
+            item: Tuple of (target_id, URLs from probe_urls(), timeout)
+        
+        Returns:
+            Tuple of (target_id, status, status_code, checked_at), from the
+            worst of the probes (DOWN, then UNKNOWN, then UP)
+        """
+        target_id, urls, timeout = item
+        results = await asyncio.gather(*(self._probe_url(url, timeout) for url in urls))
+        status, code = min(results, key=lambda result: STATUS_ORDER.get(result[0], 0))
+        return target_id, status, code, datetime.utcnow()
+    
+    async def _probe_url(self, url, timeout):
+        """Run one /probe request within the concurrency limit; returns (status, status_code)"""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self._concurrency)
+        async with self._limit:
+            try:
+                response = await self.client.get(
+                    url, timeout=timeout + self.timeout_margin,
+                    headers={'X-Prometheus-Scrape-Timeout-Seconds': str(timeout)}
+                )
+                if response.status != 200:
+                    return 'UNKNOWN', f'EXPORTER_{response.status}'
+                return probe_status(parse_metrics(response.body.decode('utf-8', 'replace')))
+            except Exception as e:
+                return 'UNKNOWN', f'EXPORTER_{error_code(e)}'
+    
+    async def run(self, rows, on_batch=None, batch_size=5000):
+        """
+        Probe all target rows once
+        
+        Args:
+            rows: Objects with id, probe_type, address, port and timeout
+            on_batch: Blocking callable receiving lists of results
+            batch_size: Results per on_batch call
+        
+        Returns:
+            Dictionary with counts per status, duration and targets per second
+        """
+        items = []
+        for row in rows:
+            urls = self.probe_urls(row)
+            if urls:
+                items.append((row.id, urls, row.timeout or self.default_timeout))
+        return await run_batched(self.probe, items, on_batch, batch_size)
+    
+    async def close(self):
+        """Release pooled connections"""
+        await self.client.close()
+
+def load_targets(app):
+    """Load the columns needed to probe all enabled targets"""
+    with app.app_context():
+        return db.session.execute(
+            select(Target.id, Target.probe_type, Target.address, Target.port, Target.timeout)
+            .where(Target.enabled == True)
+        ).all()
+
+async def run_sync(app, once=False, log=print):
+    """
+    Sync results from the exporter every EXPORTER_SYNC_INTERVAL seconds
+    
+    Args:
+        app: The Flask application
+        once: Stop after the first round
+        log: Callable receiving one status line per round
+    """
+    sync = ExporterSync.from_config(app.config)
+    interval = app.config.get('EXPORTER_SYNC_INTERVAL', 30)
+    batch_size = app.config.get('PROBER_WRITE_BATCH', 5000)
+    loop = asyncio.get_running_loop()
+    
+    try:
+        while True:
+            started = time.monotonic()
+            rows = await loop.run_in_executor(None, load_targets, app)
+            stats = await sync.run(rows, lambda batch: write_results(app, batch), batch_size)
+            log(f"Synced {stats['checks']} targets from {sync.base_url} in {stats['duration_s']}s "
+                f"({stats['checks_per_second']}/s): {stats['by_status']}")
+            if once:
+                return stats
+            await asyncio.sleep(max(0, interval - (time.monotonic() - started)))
+    finally:
+        await sync.close()
@@ -0,0 +1,243 @@
+"""
+Minimal asyncio HTTP/1.1 client with keep-alive connection pooling.
+
+Used by the checkers, which issue many small GET requests to many hosts
+and need connection reuse, per-request timeouts and no third-party
+dependencies.
+"""
+import asyncio
+import ssl
+from collections import OrderedDict, deque, namedtuple
+from urllib.parse import urlsplit
+
+HttpResponse = namedtuple('HttpResponse', ['status', 'headers', 'body'])
+
+class HttpError(Exception):
+    """Raised for malformed responses"""
+
+# Bodies larger than this are not read; the connection is closed instead
+MAX_BODY = 1024 * 1024
+
+class HttpClient:
+    """
+    HTTP/1.1 client keeping idle connections per (scheme, host, port)
+    
+    At most max_idle_per_host idle connections are kept for one host and
+    max_idle_total overall; beyond that the least recently used host's
+    connections are closed first. Bodies over max_body bytes are cut off
+    (chunked) or returned empty (Content-Length).
+    """
+    
+    def __init__(self, max_idle_per_host=8, max_idle_total=1000, verify_tls=True,
+                 user_agent='blackbox-httpsd', max_body=MAX_BODY):
+        self.max_idle_per_host = max_idle_per_host
+        self.max_idle_total = max_idle_total
+        self.max_body = max_body
+        self.user_agent = user_agent
+        self.connections_opened = 0
+        self.requests_sent = 0
+        self._idle = OrderedDict()
+        self._idle_count = 0
+        if verify_tls:
+            self._ssl = ssl.create_default_context()
+        else:
+            self._ssl = ssl.create_default_context()
+            self._ssl.check_hostname = False
+            self._ssl.verify_mode = ssl.CERT_NONE
+    
+    async def get(self, url, timeout=10, headers=None, read_body=True, connect_host=None):
+        """
+        Issue a GET request
+        
+        Args:
+            url: Absolute http:// or https:// URL
+            timeout: Seconds for the whole request including connect
+            headers: Extra request headers
+            read_body: Whether to return the body (it is always drained)
+            connect_host: Address to connect to instead of the URL host,
+                e.g. a pre-resolved IP; Host header and TLS SNI still use
+                the URL host
+                
+        Returns:
+            HttpResponse
+        """
+        return await asyncio.wait_for(
+            self._request('GET', url, headers or {}, read_body, connect_host), timeout
+        )
+    
+    async def request(self, method, url, body=None, timeout=10, headers=None):
+        """
+        Issue a request with an optional body, e.g. a JSON POST
+        
+        Args:
+            method: HTTP method
+            url: Absolute http:// or https:// URL
+            body: Request body bytes
+            timeout: Seconds for the whole request including connect
+            headers: Extra request headers, e.g. Content-Type
+            
+        Returns:
+            HttpResponse
+        """
+        return await asyncio.wait_for(
+            self._request(method, url, headers or {}, True, None, body), timeout
+        )
+    
+    async def _request(self, method, url, headers, read_body, connect_host, body=None):
+        """Send one request, retrying once if a pooled connection went stale"""
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ('http', 'https'):
+            raise HttpError(f'Unsupported scheme: {scheme}')
+        host = parts.hostname
+        port = parts.port or (443 if scheme == 'https' else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        
+        host_name = f'[{host}]' if ':' in host else host
+        host_header = host_name if parts.port is None else f'{host_name}:{port}'
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {host_header}',
+                 f'User-Agent: {self.user_agent}', 'Accept: */*']
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        if body is not None:
+            lines.append(f'Content-Length: {len(body)}')
+        payload = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b'')
+        
+        key = (scheme, connect_host or host, port, host)
+        for attempt in (0, 1):
+            reader, writer, reused = await self._acquire(key, scheme, host, port, connect_host)
+            try:
+                writer.write(payload)
+                await writer.drain()
+                self.requests_sent += 1
+                response, reusable = await self._read_response(reader, method, read_body)
+            except (ConnectionError, asyncio.IncompleteReadError, HttpError) as e:
+                writer.close()
+                # A keep-alive connection closed by the server: retry on a fresh one
+                if reused and attempt == 0 and not isinstance(e, HttpError):
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            
+            if reusable:
+                self._release(key, reader, writer)
+            else:
+                writer.close()
+            return response
+    
+    async def _acquire(self, key, scheme, host, port, connect_host):
+        """Get an idle pooled connection or open a new one"""
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            self._idle_count -= 1
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        
+        reader, writer = await asyncio.open_connection(
+            connect_host or host, port,
+            ssl=self._ssl if scheme == 'https' else None,
+            server_hostname=host if scheme == 'https' else None,
+            limit=64 * 1024
+        )
+        self.connections_opened += 1
+        return reader, writer, False
+    
+    def _release(self, key, reader, writer):
+        """Return a connection to the pool, closing it if the pool is full"""
+        idle = self._idle.setdefault(key, deque())
+        self._idle.move_to_end(key)
+        if len(idle) >= self.max_idle_per_host:
+            writer.close()
+            return
+        
+        while self._idle_count >= self.max_idle_total:
+            oldest_key = next(iter(self._idle))
+            oldest = self._idle[oldest_key]
+            if oldest:
+                oldest.popleft()[1].close()
+                self._idle_count -= 1
+            if not oldest:
+                del self._idle[oldest_key]
+            if oldest_key == key:
+                idle = self._idle.setdefault(key, deque())
+        
+        idle.append((reader, writer))
+        self._idle_count += 1
+    
+    async def _read_response(self, reader, method, read_body):
+        """
+        Read one response
+        
+        Returns:
+            Tuple of (HttpResponse, whether the connection can be reused)
+        """
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status_line = lines[0].split(' ', 2)
+        if len(status_line) < 2 or not status_line[0].startswith('HTTP/'):
+            raise HttpError(f'Malformed status line: {lines[0]!r}')
+        status = int(status_line[1])
+        
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        
+        reusable = (status_line[0] != 'HTTP/1.0'
+                    and headers.get('connection', '').lower() != 'close')
+        body = b''
+        
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            pass
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            chunks = []
+            size_read = 0
+            while True:
+                size = int((await reader.readuntil(b'\r\n')).split(b';', 1)[0], 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while await reader.readuntil(b'\r\n') != b'\r\n':
+                        pass
+                    break
+                size_read += size
+                if size_read > self.max_body:
+                    return HttpResponse(status, headers, b''.join(chunks)), False
+                chunk = await reader.readexactly(size + 2)
+                if read_body:
+                    chunks.append(chunk[:-2])
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            length = int(headers['content-length'])
+            if length > self.max_body:
+                return HttpResponse(status, headers, b''), False
+            body = await reader.readexactly(length)
+        else:
+            # Body delimited by connection close
+            chunks = []
+            size_read = 0
+            while size_read < self.max_body:
+                chunk = await reader.read(self.max_body - size_read)
+                if not chunk:
+                    break
+                size_read += len(chunk)
+                if read_body:
+                    chunks.append(chunk)
+            body = b''.join(chunks)
+            reusable = False
+        
+        return HttpResponse(status, headers, body if read_body else b''), reusable
+    
+    async def close(self):
+        """Close all pooled connections"""
+        for idle in self._idle.values():
+            while idle:
+                _, writer = idle.pop()
+                writer.close()
+        self._idle.clear()
+        self._idle_count = 0
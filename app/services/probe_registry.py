@@ -0,0 +1,98 @@
+"""
+Process-local registry of monitoring probes.
+
+The probes table holds a handful of rows that rarely change, so each
+worker keeps a snapshot in memory and serves probe listings and probe ID
+validation from it. The snapshot is dropped whenever the 'probes' data
+version changes, in any worker (see app/services/data_version.py), and
+reloaded after PROBE_REGISTRY_TTL seconds in any case so writes made
+outside the application show up too.
+"""
+import threading
+import time
+from flask import current_app
+from app.models.probe import Probe
+
+class ProbeRegistry:
+    """In-memory snapshot of the probes table"""
+    
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._probes = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+    
+    def invalidate(self):
+        """Drop the snapshot so the next lookup reloads it"""
+        self._probes = None
+    
+    def _snapshot(self):
+        """Return the current snapshot, loading it if missing or expired"""
+        probes = self._probes
+        if probes is not None and time.monotonic() - self._loaded_at < self.ttl:
+            self.hits += 1
+            return probes
+        
+        with self._lock:
+            if self._probes is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self.misses += 1
+                self._probes = {
+                    probe.id: probe.to_dict()
+                    for probe in Probe.query.order_by(Probe.id).all()
+                }
+                self._loaded_at = time.monotonic()
+            return self._probes
+    
+    def all(self):
+        """Get all probes as dictionaries, ordered by ID"""
+        return list(self._snapshot().values())
+    
+    def get(self, probe_id):
+        """Get one probe dictionary by ID, or None"""
+        return self._snapshot().get(probe_id)
+    
+    def valid_ids(self, probe_ids):
+        """
+        Filter a list of probe IDs down to existing probes
+        
+        Args:
+            probe_ids: IDs as ints or numeric strings, in any order
+            
+        Returns:
+            List of unique existing probe IDs in input order
+        """
+        probes = self._snapshot()
+        valid = []
+        for probe_id in probe_ids:
+            try:
+                probe_id = int(probe_id)
+            except (TypeError, ValueError):
+                continue
+            if probe_id in probes and probe_id not in valid:
+                valid.append(probe_id)
+        return valid
+    
+    def find_by_name(self, name):
+        """Get the first probe with the given name, or None"""
+        for probe in self._snapshot().values():
+            if probe['name'] == name:
+                return probe
+        return None
+    
+    def by_location(self, location):
+        """Get all probes at a location"""
+        return [probe for probe in self._snapshot().values() if probe['location'] == location]
+
+def init_app(app):
+    """Attach a probe registry to the application"""
+    registry = ProbeRegistry(app.config.get('PROBE_REGISTRY_TTL', 60))
+    app.extensions['probe_registry'] = registry
+    app.extensions['data_versions'].subscribe('probes', registry.invalidate)
+    if 'metrics' in app.extensions:
+        app.extensions['metrics'].register_cache('probe_registry', registry)
+
+def get_probe_registry():
+    """Get the probe registry of the current application"""
+    return current_app.extensions['probe_registry']
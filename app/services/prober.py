@@ -0,0 +1,581 @@
+"""
+Built-in asyncio checker filling Target.last_status.
+
+Checks every enabled target using its probe type, port, protocol, path,
+expected status code and timeout:
+
+- http: GET over pooled keep-alive connections, UP when the status code
+  matches expect_status_code (default 2xx)
+- tcp: UP when a TCP connection to address:port succeeds
+- icmp: raw ICMP needs privileges, so by default a TCP connect to
+  PROBER_ICMP_TCP_PORT stands in (an accepted or refused connection both
+  prove the host is reachable); PROBER_ICMP_MODE=ping uses the system
+  ping binary instead
+
+Concurrency is bounded globally and per host, and results are written
+back in batches through StatusIngestService. run_rounds() checks all
+targets at once; run_scheduled() spreads them with CheckScheduler.
+"""
+import asyncio
+import ipaddress
+import logging
+import socket
+import ssl
+import time
+from collections import namedtuple, Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+from sqlalchemy import func, select
+from app import db
+from app.models.target import Target
+from app.services.http_client import HttpClient, HttpError
+from app.services.scheduler import CheckScheduler
+from app.services.status_ingest import StatusIngestService
+from app.utils.protocols import target_protocol
+from app.utils.query_counter import tracked
+
+logger = logging.getLogger(__name__)
+
+CheckSpec = namedtuple('CheckSpec', ['target_id', 'kind', 'host', 'port', 'url', 'timeout', 'expect'])
+
+DEFAULT_EXPECT = ((200, 299),)
+
+def parse_expected_codes(value):
+    """
+    Parse expect_status_code into status code ranges
+    
+    Accepts comma or space separated codes ('200,301'), classes ('2xx')
+    and ranges ('200-399'). Falls back to 2xx when nothing is usable.
+    
+    Returns:
+        Tuple of inclusive (low, high) ranges
+    """
+    ranges = []
+    for token in (value or '').replace(',', ' ').split():
+        token = token.strip().lower()
+        try:
+            if len(token) == 3 and token.endswith('xx'):
+                low = int(token[0]) * 100
+                ranges.append((low, low + 99))
+            elif '-' in token:
+                low, high = token.split('-', 1)
+                ranges.append((int(low), int(high)))
+            else:
+                ranges.append((int(token), int(token)))
+        except ValueError:
+            continue
+    return tuple(ranges) or DEFAULT_EXPECT
+
+def build_spec(row, default_timeout=10):
+    """
+    Build the check for a target row
+    
+    Args:
+        row: Object with the Target columns used for checking
+        default_timeout: Timeout when the target has none
+        
+    Returns:
+        CheckSpec, or None if the probe type maps to no known protocol
+    """
+    kind = target_protocol(row.probe_type)
+    if kind is None:
+        return None
+    
+    timeout = row.timeout or default_timeout
+    address = row.address.strip()
+    
+    if kind == 'http':
+        if '://' in address:
+            url = address
+        else:
+            scheme = (row.protocol or ('https' if 'https' in row.probe_type.lower() else 'http')).lower()
+            netloc = f'{address}:{row.port}' if row.port else address
+            path = row.path or '/'
+            url = f'{scheme}://{netloc}{path if path.startswith("/") else "/" + path}'
+        host = urlsplit(url).hostname or address
+        return CheckSpec(row.id, kind, host, row.port, url, timeout, parse_expected_codes(row.expect_status_code))
+    
+    host, port = address, row.port
+    if port is None and address.count(':') == 1:
+        host, port = address.split(':', 1)
+        port = int(port) if port.isdigit() else None
+    return CheckSpec(row.id, kind, host, port, None, timeout, None)
+
+def error_code(exc):
+    """Map a check failure to a short status code"""
+    if isinstance(exc, asyncio.TimeoutError):
+        return 'TIMEOUT'
+    if isinstance(exc, ConnectionRefusedError):
+        return 'CONNREFUSED'
+    if isinstance(exc, ssl.SSLError):
+        return 'TLS'
+    if isinstance(exc, socket.gaierror):
+        return 'DNS'
+    if isinstance(exc, HttpError):
+        return 'PROTOCOL'
+    if isinstance(exc, OSError):
+        return 'CONNERROR'
+    return 'ERROR'
+
+async def run_batched(check, items, on_batch=None, batch_size=5000):
+    """
+    Run a check coroutine for every item and hand results over in batches
+    
+    Args:
+        check: Coroutine function returning a (target_id, status,
+            status_code, checked_at) tuple; it must bound its own concurrency
+        items: Iterable of check arguments
+        on_batch: Blocking callable receiving lists of results; runs on a
+            single writer thread so writes never overlap
+        batch_size: Results per on_batch call
+        
+    Returns:
+        Dictionary with counts per status, duration and checks per second
+    """
+    loop = asyncio.get_running_loop()
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prober-writer')
+    writes = []
+    pending = []
+    statuses = Counter()
+    started = time.perf_counter()
+    
+    def flush():
+        nonlocal pending
+        if pending and on_batch is not None:
+            writes.append(loop.run_in_executor(writer, on_batch, pending))
+        pending = []
+    
+    async def collect(item):
+        result = await check(item)
+        statuses[result[1]] += 1
+        pending.append(result)
+        if len(pending) >= batch_size:
+            flush()
+    
+    try:
+        await asyncio.gather(*(collect(item) for item in items))
+        flush()
+        await asyncio.gather(*writes)
+    finally:
+        writer.shutdown(wait=False)
+    
+    duration = time.perf_counter() - started
+    checks = sum(statuses.values())
+    return {
+        'checks': checks,
+        'by_status': dict(statuses),
+        'duration_s': round(duration, 3),
+        'checks_per_second': round(checks / duration) if duration else 0
+    }
+
+class Prober:
+    """Runs checks concurrently with global and per-host limits"""
+    
+    def __init__(self, concurrency=1000, per_host=4, icmp_mode='tcp', icmp_tcp_port=80,
+                 verify_tls=True, max_idle_connections=1000, dns_ttl=300):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.icmp_mode = icmp_mode
+        self.icmp_tcp_port = icmp_tcp_port
+        self.dns_ttl = dns_ttl
+        self.client = HttpClient(max_idle_per_host=per_host, max_idle_total=max_idle_connections,
+                                 verify_tls=verify_tls, user_agent='blackbox-httpsd-prober')
+        self._global = None
+        self._hosts = {}
+        # Hostname -> (resolution future, monotonic expiry time)
+        self._dns = {}
+    
+    @classmethod
+    def from_config(cls, config):
+        """Create a prober from the application configuration"""
+        return cls(
+            concurrency=config.get('PROBER_CONCURRENCY', 1000),
+            per_host=config.get('PROBER_PER_HOST_CONCURRENCY', 4),
+            icmp_mode=config.get('PROBER_ICMP_MODE', 'tcp'),
+            icmp_tcp_port=config.get('PROBER_ICMP_TCP_PORT', 80),
+            verify_tls=config.get('PROBER_TLS_VERIFY', True),
+            max_idle_connections=config.get('PROBER_MAX_IDLE_CONNECTIONS', 1000),
+            dns_ttl=config.get('PROBER_DNS_TTL', 300)
+        )
+    
+    async def _resolve(self, host):
+        """
+        Resolve a hostname, at most once per dns_ttl seconds
+        
+        Concurrent checks of one host share a lookup. Failed lookups are
+        not kept, so the next check of the host asks again. IP literals
+        pass through.
+        """
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+        
+        now = time.monotonic()
+        cached = self._dns.get(host)
+        if cached is None or cached[1] <= now:
+            future = asyncio.ensure_future(asyncio.get_running_loop().getaddrinfo(
+                host, None, type=socket.SOCK_STREAM
+            ))
+            cached = self._dns[host] = (future, now + self.dns_ttl)
+        future = cached[0]
+        try:
+            infos = await asyncio.shield(future)
+        except Exception:
+            if self._dns.get(host) is cached:
+                del self._dns[host]
+            raise
+        return infos[0][4][0]
+    
+    async def check(self, spec):
+        """
+        Run one check without concurrency limits
+        
+        Returns:
+            Tuple of (target_id, status, status_code, checked_at)
+        """
+        try:
+            status, code = await asyncio.wait_for(self._check(spec), spec.timeout)
+        except Exception as e:
+            status, code = 'DOWN', error_code(e)
+        return spec.target_id, status, code, datetime.utcnow()
+    
+    async def _check(self, spec):
+        """Dispatch to the check for the spec's kind"""
+        if spec.kind == 'icmp' and self.icmp_mode == 'ping':
+            return await self._ping(spec)
+        
+        ip = await self._resolve(spec.host)
+        if spec.kind == 'http':
+            response = await self.client.get(spec.url, timeout=spec.timeout, read_body=False, connect_host=ip)
+            ok = any(low <= response.status <= high for low, high in spec.expect)
+            return ('UP' if ok else 'DOWN'), str(response.status)
+        
+        if spec.kind == 'tcp':
+            if not spec.port:
+                return 'UNKNOWN', 'NOPORT'
+            await self._connect(ip, spec.port)
+            return 'UP', 'CONNECTED'
+        
+        # ICMP stand-in: any answer from the host, accept or reset, means it is up
+        try:
+            await self._connect(ip, spec.port or self.icmp_tcp_port)
+        except ConnectionRefusedError:
+            return 'UP', 'TCP_RST'
+        return 'UP', 'TCP_OPEN'
+    
+    async def _connect(self, host, port):
+        """Open and immediately close a TCP connection"""
+        _, writer = await asyncio.open_connection(host, port)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    
+    async def _ping(self, spec):
+        """Check reachability with one unprivileged system ping"""
+        process = await asyncio.create_subprocess_exec(
+            'ping', '-c', '1', '-W', str(max(1, int(spec.timeout))), spec.host,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            code = await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            raise
+        return ('UP', 'ECHO_REPLY') if code == 0 else ('DOWN', 'NO_REPLY')
+    
+    async def limited_check(self, spec):
+        """Run one check within the global and per-host concurrency limits"""
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.concurrency)
+        host = self._hosts.get(spec.host)
+        if host is None:
+            host = self._hosts[spec.host] = asyncio.Semaphore(self.per_host)
+        # Wait for the host slot first so queued hosts do not hold global slots
+        async with host:
+            async with self._global:
+                return await self.check(spec)
+    
+    async def run(self, specs, on_batch=None, batch_size=5000):
+        """
+        Check all specs once
+        
+        Args:
+            specs: Iterable of CheckSpec
+            on_batch: Blocking callable receiving lists of results; runs on
+                a single writer thread so writes never overlap
+            batch_size: Results per on_batch call
+            
+        Returns:
+            Dictionary with counts per status, duration and checks per second
+        """
+        return await run_batched(self.limited_check, specs, on_batch, batch_size)
+    
+    async def close(self):
+        """Release pooled connections"""
+        await self.client.close()
+
+def _spec_columns():
+    """Target columns needed to build check specs and schedule them"""
+    return (Target.id, Target.probe_type, Target.address, Target.port, Target.protocol,
+            Target.path, Target.expect_status_code, Target.timeout, Target.check_interval,
+            Target.enabled, Target.config_revision)
+
+def load_specs(app):
+    """Build check specs for all enabled targets"""
+    with app.app_context():
+        default_timeout = app.config.get('PROBER_DEFAULT_TIMEOUT', 10)
+        rows = db.session.execute(select(*_spec_columns()).where(Target.enabled == True)).all()
+        return [spec for spec in (build_spec(row, default_timeout) for row in rows) if spec]
+
+def fetch_changes(app, since):
+    """
+    Load targets changed since the last sync
+    
+    Args:
+        app: The Flask application
+        since: Newest config_revision seen so far, None to load every
+            enabled target
+        
+    Returns:
+        Tuple of (changed target rows, number of enabled targets, newest
+        config_revision the rows cover)
+    """
+    with app.app_context():
+        query = select(*_spec_columns())
+        if since is None:
+            # Read first: disabled targets, left out below, may carry the
+            # newest revision, and whatever commits meanwhile is loaded again
+            # by the next sync
+            revision = db.session.execute(select(func.max(Target.config_revision))).scalar()
+            query = query.where(Target.enabled == True)
+        else:
+            # Revisions grow in commit order and status writes keep them, so
+            # this reads exactly the targets reconfigured since the last sync
+            query = query.where(Target.config_revision > since)
+        rows = db.session.execute(query).all()
+        if since is not None:
+            revision = max([since, *(row.config_revision for row in rows)])
+        enabled = db.session.execute(
+            select(func.count()).select_from(Target).where(Target.enabled == True)
+        ).scalar()
+        return rows, enabled, revision
+
+def fetch_enabled_ids(app):
+    """Load the IDs of all enabled targets"""
+    with app.app_context():
+        return set(db.session.execute(select(Target.id).where(Target.enabled == True)).scalars())
+
+class TargetSync:
+    """
+    Turns changes to the targets table into schedule updates
+    
+    The first poll loads every enabled target. Later polls reload only
+    targets reconfigured since (by config_revision), and read the full ID
+    list only when the enabled target count shows that some targets were
+    deleted.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self.default_timeout = app.config.get('PROBER_DEFAULT_TIMEOUT', 10)
+        self.enabled_ids = set()
+        self.since = None
+    
+    @tracked()
+    def poll(self):
+        """
+        Load target changes since the previous poll
+        
+        Returns:
+            Tuple of (list of (CheckSpec, check_interval) to schedule,
+            list of target IDs to stop checking)
+        """
+        rows, enabled, self.since = fetch_changes(self.app, self.since)
+        upserts, removes = [], []
+        for row in rows:
+            spec = build_spec(row, self.default_timeout) if row.enabled else None
+            if row.enabled:
+                self.enabled_ids.add(row.id)
+            else:
+                self.enabled_ids.discard(row.id)
+            if spec is None:
+                removes.append(row.id)
+            else:
+                upserts.append((spec, row.check_interval))
+        
+        if enabled != len(self.enabled_ids):
+            # Deleted targets leave no changed row behind
+            current = fetch_enabled_ids(self.app)
+            removes.extend(self.enabled_ids - current)
+            self.enabled_ids &= current
+        return upserts, removes
+
+def apply_updates(scheduler, specs, upserts, removes):
+    """
+    Apply schedule updates from TargetSync.poll()
+    
+    Args:
+        scheduler: CheckScheduler to update
+        specs: Dictionary of target ID to CheckSpec, updated in place
+        upserts: List of (CheckSpec, check_interval) to schedule
+        removes: List of target IDs to stop checking
+    """
+    for spec, interval in upserts:
+        specs[spec.target_id] = spec
+        scheduler.add(spec.target_id, interval)
+    for target_id in removes:
+        specs.pop(target_id, None)
+        scheduler.remove(target_id)
+
+def write_results(app, results):
+    """Write a batch of check results back to the targets"""
+    with app.app_context():
+        try:
+            StatusIngestService.apply(
+                results,
+                touch_interval=app.config.get('STATUS_INGEST_TOUCH_INTERVAL', 60),
+                record_history=app.config.get('STATUS_HISTORY_ENABLED', True)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+async def run_rounds(app, once=False, log=print):
+    """
+    Check all enabled targets every PROBER_INTERVAL seconds
+    
+    Args:
+        app: The Flask application
+        once: Stop after the first round
+        log: Callable receiving one status line per round
+    """
+    prober = Prober.from_config(app.config)
+    interval = app.config.get('PROBER_INTERVAL', 60)
+    batch_size = app.config.get('PROBER_WRITE_BATCH', 5000)
+    loop = asyncio.get_running_loop()
+    
+    try:
+        while True:
+            started = time.monotonic()
+            specs = await loop.run_in_executor(None, load_specs, app)
+            stats = await prober.run(specs, lambda batch: write_results(app, batch), batch_size)
+            log(f"Checked {stats['checks']} targets in {stats['duration_s']}s "
+                f"({stats['checks_per_second']}/s): {stats['by_status']}")
+            if once:
+                return stats
+            await asyncio.sleep(max(0, interval - (time.monotonic() - started)))
+    finally:
+        await prober.close()
+
+async def check_loop(prober, scheduler, poll, sink, stop=None, log=None,
+                     sync_interval=10, batch_size=5000):
+    """
+    Check scheduled targets until stopped
+    
+    Args:
+        prober: Prober running the checks
+        scheduler: CheckScheduler deciding when each target is due
+        poll: Coroutine function returning (upserts, removes) for apply_updates()
+        sink: Blocking callable receiving lists of results; runs on a single
+            writer thread so writes never overlap
+        stop: Optional asyncio.Event ending the loop when set
+        log: Optional callable receiving one status line per minute
+        sync_interval: Seconds between poll() calls
+        batch_size: Results per sink call; smaller batches go out every second
+    """
+    loop = asyncio.get_running_loop()
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prober-writer')
+    
+    specs = {}
+    checks = set()
+    writes = set()
+    pending = []
+    statuses = Counter()
+    last_sync = last_flush = last_log = float('-inf')
+    
+    def finished(task):
+        checks.discard(task)
+        if task.cancelled():
+            return
+        result = task.result()
+        scheduler.complete(result[0], result[1])
+        statuses[result[1]] += 1
+        pending.append(result)
+    
+    def written(future):
+        writes.discard(future)
+        if future.exception() is not None:
+            logger.error('Writing check results failed', exc_info=future.exception())
+    
+    def flush():
+        nonlocal pending, last_flush
+        if pending:
+            future = loop.run_in_executor(writer, sink, pending)
+            writes.add(future)
+            future.add_done_callback(written)
+            pending = []
+        last_flush = time.monotonic()
+    
+    try:
+        while stop is None or not stop.is_set():
+            now = time.monotonic()
+            if now - last_sync >= sync_interval:
+                apply_updates(scheduler, specs, *await poll())
+                last_sync = now
+            
+            for target_id in scheduler.due():
+                task = asyncio.ensure_future(prober.limited_check(specs[target_id]))
+                checks.add(task)
+                task.add_done_callback(finished)
+            
+            if len(pending) >= batch_size or (pending and now - last_flush >= 1):
+                flush()
+            if log is not None and now - last_log >= 60:
+                log(f"Scheduled {len(scheduler)} targets, {len(checks)} checks in flight, "
+                    f"results so far: {dict(statuses)}")
+                last_log = now
+            
+            await asyncio.sleep(scheduler.seconds_until_next_tick())
+    finally:
+        for task in list(checks):
+            task.cancel()
+        await asyncio.gather(*checks, return_exceptions=True)
+        flush()
+        await asyncio.gather(*writes, return_exceptions=True)
+        writer.shutdown(wait=False)
+
+async def run_scheduled(app, log=print, stop=None):
+    """
+    Check enabled targets continuously, each on its own schedule
+    
+    Targets are spread over their interval by CheckScheduler instead of
+    being checked all at once every round, and target changes are picked
+    up every PROBER_SYNC_INTERVAL seconds through TargetSync.
+    
+    Args:
+        app: The Flask application
+        log: Callable receiving one status line per minute
+        stop: Optional asyncio.Event ending the loop when set
+    """
+    prober = Prober.from_config(app.config)
+    sync = TargetSync(app)
+    loop = asyncio.get_running_loop()
+    
+    async def poll():
+        return await loop.run_in_executor(None, sync.poll)
+    
+    try:
+        await check_loop(
+            prober, CheckScheduler.from_config(app.config), poll,
+            lambda batch: write_results(app, batch), stop=stop, log=log,
+            sync_interval=app.config.get('PROBER_SYNC_INTERVAL', 10),
+            batch_size=app.config.get('PROBER_WRITE_BATCH', 5000)
+        )
+    finally:
+        await prober.close()
@@ -0,0 +1,209 @@
+"""
+Bulk status import from the Prometheus query API.
+
+Prometheus already scrapes probe_success for every target served by
+/api/sd/<protocol>, and each of those series carries the id label the SD
+endpoint emits. Instead of probing targets one by one, this job issues a
+single instant query per blackbox job, e.g.
+
+    {__name__=~"probe_success|probe_http_status_code",job="blackbox_icmp"}
+    or label_replace(timestamp(probe_success{job="blackbox_icmp"}),
+                     "httpsd_sample", "timestamp", "", "")
+
+joins the series back to targets by their id label and writes the
+statuses with the set-based batches of StatusIngestService. The whole
+inventory refreshes with one HTTP call per protocol.
+
+The time of an instant query's values is the evaluation time, not the
+time the sample was scraped, so the query also returns timestamp() of
+each probe_success series; that is the checked_at written. Series that
+went stale therefore keep their old time and are not taken as fresh.
+The extra label keeps those series apart from probe_success, since `or`
+matches series on their labels without the metric name.
+"""
+import asyncio
+import gzip
+import json
+import time
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlencode
+from app.services.exporter_sync import probe_status
+from app.services.http_client import HttpClient
+from app.services.prober import write_results
+from app.utils.protocols import PROTOCOL_KEYWORDS
+
+PROBE_METRICS = ('probe_success', 'probe_http_status_code')
+
+# Label marking the timestamp() series in query results
+TIMESTAMP_LABEL = 'httpsd_sample'
+
+class PrometheusQueryError(Exception):
+    """Raised when Prometheus rejects a query or returns an unusable response"""
+
+def job_query(job):
+    """Build the instant query fetching the probe metrics of one job and their sample times"""
+    return ('{__name__=~"%s",job="%s"} or label_replace(timestamp(probe_success{job="%s"}), '
+            '"%s", "timestamp", "", "")' % ('|'.join(PROBE_METRICS), job, job, TIMESTAMP_LABEL))
+
+def parse_query_result(payload):
+    """
+    Join probe series from an instant query to target results
+    
+    Series without a numeric id label are ignored, and so are targets
+    without the timestamp() of their probe_success sample. When several
+    series exist for one target (e.g. two Prometheus replicas scraping
+    it), the newest sample wins.
+    
+    Args:
+        payload: Decoded JSON response of /api/v1/query
+    
+    Returns:
+        List of (target_id, status, status_code, checked_at) tuples
+    
+    Raises:
+        PrometheusQueryError: If the query did not succeed
+    """
+    if not isinstance(payload, dict):
+        raise PrometheusQueryError('unexpected response')
+    if payload.get('status') != 'success':
+        raise PrometheusQueryError(payload.get('error', 'query failed'))
+    
+    # (target_id, labels of the series) -> {metric: value}, where the
+    # timestamp() series is 'timestamp'
+    samples = defaultdict(dict)
+    for series in payload.get('data', {}).get('result', ()):
+        labels = dict(series.get('metric', {}))
+        target_id = labels.get('id', '')
+        if not target_id.isdigit():
+            continue
+        name = labels.pop('__name__', None)
+        if labels.pop(TIMESTAMP_LABEL, None) == 'timestamp':
+            name = 'timestamp'
+        samples[int(target_id), tuple(sorted(labels.items()))][name] = float(series['value'][1])
+    
+    newest = {}
+    for (target_id, _), metrics in samples.items():
+        if 'probe_success' not in metrics or 'timestamp' not in metrics:
+            continue
+        current = newest.get(target_id)
+        if current is None or current['timestamp'] < metrics['timestamp']:
+            newest[target_id] = metrics
+    
+    results = []
+    for target_id, metrics in newest.items():
+        status, code = probe_status(metrics)
+        results.append((target_id, status, code, datetime.utcfromtimestamp(metrics['timestamp'])))
+    return results
+
+class PrometheusSync:
+    """Imports probe results of the blackbox jobs from Prometheus"""
+    
+    def __init__(self, base_url, jobs=None, timeout=30, max_body=512 * 1024 * 1024):
+        self.base_url = base_url.rstrip('/')
+        self.jobs = jobs or [f'blackbox_{protocol}' for protocol in PROTOCOL_KEYWORDS]
+        self.timeout = timeout
+        self.client = HttpClient(max_idle_per_host=len(self.jobs), user_agent='blackbox-httpsd-sync',
+                                 max_body=max_body)
+        self.requests = 0
+    
+    @classmethod
+    def from_config(cls, config):
+        """Create a sync job from the application configuration"""
+        return cls(
+            config['PROMETHEUS_URL'],
+            jobs=config.get('PROMETHEUS_SYNC_JOBS') or None,
+            timeout=config.get('PROMETHEUS_SYNC_TIMEOUT', 30)
+        )
+    
+    async def query(self, promql):
+        """
+        Run one instant query
+        
+        Returns:
+            Decoded JSON response
+        """
+        url = f'{self.base_url}/api/v1/query?' + urlencode({'query': promql})
+        self.requests += 1
+        response = await self.client.get(url, timeout=self.timeout,
+                                         headers={'Accept-Encoding': 'gzip'})
+        body = response.body
+        if response.headers.get('content-encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise PrometheusQueryError(f'HTTP {response.status}: unreadable or oversized response')
+        if not isinstance(payload, dict):
+            raise PrometheusQueryError(f'HTTP {response.status}: unexpected response')
+        if response.status != 200 and payload.get('status') != 'error':
+            raise PrometheusQueryError(f'HTTP {response.status}')
+        return payload
+    
+    async def fetch(self):
+        """
+        Query all jobs concurrently
+        
+        Returns:
+            List of (target_id, status, status_code, checked_at) tuples
+        """
+        payloads = await asyncio.gather(*(self.query(job_query(job)) for job in self.jobs))
+        results = []
+        for payload in payloads:
+            results.extend(parse_query_result(payload))
+        return results
+    
+    async def close(self):
+        """Release pooled connections"""
+        await self.client.close()
+
+def import_results(app, results, batch_size=5000):
+    """
+    Write imported results in batches
+    
+    Returns:
+        Dictionary of status counts
+    """
+    counts = defaultdict(int)
+    for offset in range(0, len(results), batch_size):
+        batch = results[offset:offset + batch_size]
+        write_results(app, batch)
+        for result in batch:
+            counts[result[1]] += 1
+    return dict(counts)
+
+async def run_sync(app, once=False, log=print):
+    """
+    Import statuses from Prometheus every PROMETHEUS_SYNC_INTERVAL seconds
+    
+    Args:
+        app: The Flask application
+        once: Stop after the first import
+        log: Callable receiving one status line per import
+    """
+    sync = PrometheusSync.from_config(app.config)
+    interval = app.config.get('PROMETHEUS_SYNC_INTERVAL', 30)
+    batch_size = app.config.get('PROBER_WRITE_BATCH', 5000)
+    loop = asyncio.get_running_loop()
+    
+    try:
+        while True:
+            started = time.monotonic()
+            requests = sync.requests
+            try:
+                results = await sync.fetch()
+            except Exception as e:
+                if once:
+                    raise
+                log(f"Importing from {sync.base_url} failed: {e!r}")
+                await asyncio.sleep(interval)
+                continue
+            counts = await loop.run_in_executor(None, import_results, app, results, batch_size)
+            log(f"Imported {len(results)} target statuses from {sync.base_url} with "
+                f"{sync.requests - requests} queries in {time.monotonic() - started:.2f}s: {counts}")
+            if once:
+                return {'targets': len(results), 'queries': sync.requests - requests,
+                        'by_status': counts}
+            await asyncio.sleep(max(0, interval - (time.monotonic() - started)))
+    finally:
+        await sync.close()
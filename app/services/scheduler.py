@@ -0,0 +1,220 @@
+"""
+Check scheduler spreading targets evenly over their check interval.
+
+Each target is checked at a fixed phase within its interval, derived from
+its ID with a multiplicative (Fibonacci) hash. The phase is deterministic,
+so restarts and other processes schedule a target at the same offset, and
+consecutive IDs land far apart, so a block of new targets does not burst.
+Due times are aligned to the wall clock: a target with interval I and
+phase p is due at p, p + I, p + 2I, ...
+
+Targets live in a hashed timing wheel: one dict per tick slot, keyed by
+target ID. Adding, removing and rescheduling a target are O(1) dict
+operations, and collecting the due targets only touches the slots of the
+ticks that elapsed.
+
+A target whose check comes back DOWN is rescheduled with its interval
+multiplied by backoff for each consecutive failure, capped at max_backoff
+seconds, and returns to its normal interval after the first non-DOWN
+result.
+"""
+import math
+import time
+
+# 2**32 / golden ratio
+_GOLDEN = 2654435769
+
+def stable_fraction(target_id):
+    """
+    Map a target ID to a deterministic fraction in [0, 1)
+    
+    Consecutive IDs are spread as far apart as possible, so any range of
+    IDs covers [0, 1) evenly.
+    """
+    return ((target_id * _GOLDEN) & 0xFFFFFFFF) / 4294967296.0
+
+def shard_of(target_id, shards):
+    """
+    Assign a target ID to one of a number of shards
+    
+    Uses a 64-bit mixing function, so a shard gets an even share of any
+    ID range and of every check phase (stable_fraction() is unrelated).
+    """
+    x = (target_id + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return (x ^ (x >> 31)) % shards
+
+class CheckScheduler:
+    """Timing wheel of target IDs keyed by their next due tick"""
+    
+    def __init__(self, default_interval=60, tick=1.0, slots=4096, backoff=2.0, max_backoff=600):
+        self.default_interval = default_interval
+        self.tick = tick
+        self.slots = slots
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._wheel = [{} for _ in range(slots)]
+        # target_id -> [interval, consecutive failures, due tick, waiting in the wheel]
+        self._targets = {}
+        self._cursor = None
+    
+    @classmethod
+    def from_config(cls, config):
+        """Create a scheduler from the application configuration"""
+        return cls(
+            default_interval=config.get('PROBER_INTERVAL', 60),
+            tick=config.get('SCHEDULER_TICK', 1.0),
+            backoff=config.get('SCHEDULER_DOWN_BACKOFF', 2.0),
+            max_backoff=config.get('SCHEDULER_MAX_BACKOFF', 600)
+        )
+    
+    def __len__(self):
+        return len(self._targets)
+    
+    def __contains__(self, target_id):
+        return target_id in self._targets
+    
+    def ids(self):
+        """Get the IDs of all scheduled targets"""
+        return self._targets.keys()
+    
+    def effective_interval(self, target_id):
+        """Get the interval a target is currently checked at, including backoff"""
+        interval, failures = self._targets[target_id][:2]
+        if failures and self.backoff > 1:
+            backed_off = interval * self.backoff ** min(failures, 64)
+            return max(interval, min(backed_off, self.max_backoff))
+        return interval
+    
+    def next_due(self, target_id, interval, now):
+        """
+        Get the first due time of a target strictly after now
+        
+        Args:
+            target_id: The target ID
+            interval: Seconds between checks
+            now: Current time in seconds since the epoch
+        
+        Returns:
+            Due time in seconds since the epoch
+        """
+        phase = stable_fraction(target_id) * interval
+        return phase + (math.floor((now - phase) / interval) + 1) * interval
+    
+    def _place(self, target_id, state, due):
+        """Put a target in the wheel slot of its due tick"""
+        due_tick = int(due // self.tick)
+        if self._cursor is not None and due_tick <= self._cursor:
+            due_tick = self._cursor + 1
+        state[2] = due_tick
+        state[3] = True
+        self._wheel[due_tick % self.slots][target_id] = due_tick
+    
+    def _unplace(self, target_id, state):
+        """Take a target out of the wheel, if it is waiting in it"""
+        if state[3]:
+            self._wheel[state[2] % self.slots].pop(target_id, None)
+            state[3] = False
+    
+    def add(self, target_id, interval=None, now=None):
+        """
+        Schedule a target, or update the interval of a scheduled one
+        
+        Args:
+            target_id: The target ID
+            interval: Seconds between checks, None for the default interval
+            now: Current time, defaults to time.time()
+        """
+        interval = interval or self.default_interval
+        state = self._targets.get(target_id)
+        if state is not None:
+            if state[0] == interval:
+                return
+            state[0] = interval
+            if not state[3]:
+                # Being checked; complete() will use the new interval
+                return
+            self._unplace(target_id, state)
+        else:
+            state = self._targets[target_id] = [interval, 0, None, False]
+        
+        now = time.time() if now is None else now
+        self._place(target_id, state, self.next_due(target_id, interval, now))
+    
+    def remove(self, target_id):
+        """
+        Stop scheduling a target
+        
+        Returns:
+            True if the target was scheduled
+        """
+        state = self._targets.pop(target_id, None)
+        if state is None:
+            return False
+        self._unplace(target_id, state)
+        return True
+    
+    def due(self, now=None):
+        """
+        Take all targets that are due
+        
+        Targets returned here are considered in flight and are not returned
+        again until complete() reschedules them.
+        
+        Args:
+            now: Current time, defaults to time.time()
+        
+        Returns:
+            List of due target IDs
+        """
+        now = time.time() if now is None else now
+        now_tick = int(now // self.tick)
+        if self._cursor is None:
+            # Nothing placed so far can be older than one revolution
+            self._cursor = now_tick - self.slots
+        if now_tick <= self._cursor:
+            return []
+        
+        first = self._cursor + 1
+        if now_tick - first >= self.slots:
+            first = now_tick - self.slots + 1
+        
+        due = []
+        for tick in range(first, now_tick + 1):
+            slot = self._wheel[tick % self.slots]
+            if not slot:
+                continue
+            ready = [target_id for target_id, due_tick in slot.items() if due_tick <= now_tick]
+            for target_id in ready:
+                del slot[target_id]
+                self._targets[target_id][3] = False
+            due.extend(ready)
+        
+        self._cursor = now_tick
+        return due
+    
+    def complete(self, target_id, status, now=None):
+        """
+        Reschedule a target after its check finished
+        
+        Args:
+            target_id: The target ID
+            status: Result of the check; DOWN backs off the next check
+            now: Current time, defaults to time.time()
+        """
+        state = self._targets.get(target_id)
+        if state is None or state[3]:
+            # Removed while it was being checked, or not taken by due()
+            return
+        state[1] = state[1] + 1 if status == 'DOWN' else 0
+        now = time.time() if now is None else now
+        # A check finishing within its own tick must not be due again in the next one
+        now = max(now, (state[2] + 1) * self.tick)
+        interval = self.effective_interval(target_id)
+        self._place(target_id, state, self.next_due(target_id, interval, now))
+    
+    def seconds_until_next_tick(self, now=None):
+        """Get the time until the next tick boundary"""
+        now = time.time() if now is None else now
+        return self.tick - (now % self.tick)
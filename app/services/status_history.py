@@ -0,0 +1,238 @@
+"""
+Status history business logic.
+
+Raw results are kept as run-length encoded rows in status_runs: checks
+that repeat the previous status and status code only extend the current
+run, so a stable target costs one row no matter how often it is checked.
+compact() moves runs older than the raw retention into 5 minute rollups,
+5 minute rollups older than their retention into 1 hour rollups, and
+drops 1 hour rollups past the final retention.
+"""
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, update, delete, func, bindparam
+from app import db
+from app.models.status_history import StatusRun, StatusRollup, clamp_epoch, from_epoch, to_epoch
+from app.utils.dialect import upsert_increment
+
+FIVE_MINUTES = 300
+ONE_HOUR = 3600
+
+def _status_bucket(status):
+    """Map a status to the rollup counter it is added to"""
+    if status == 'UP':
+        return 'up'
+    if status == 'DOWN':
+        return 'down'
+    return 'other'
+
+def _spread(started_at, ended_at, checks, resolution):
+    """
+    Spread the checks of a run evenly over the buckets it overlaps
+    
+    Checks are assumed evenly spaced between the first and last check of
+    the run, which holds for a fixed check interval.
+    
+    Returns:
+        List of (bucket_start, checks) pairs
+    """
+    first = started_at // resolution * resolution
+    if checks <= 1 or ended_at <= started_at:
+        return [(first, checks)]
+    
+    span = ended_at - started_at
+    
+    def checks_before(moment):
+        # Number of checks i (0 <= i < checks) at started_at + i * span / (checks - 1) < moment
+        if moment > ended_at:
+            return checks
+        return min(checks, max(0, -(-(moment - started_at) * (checks - 1) // span)))
+    
+    buckets = []
+    bucket = first
+    while bucket <= ended_at:
+        count = checks_before(bucket + resolution) - checks_before(bucket)
+        if count:
+            buckets.append((bucket, count))
+        bucket += resolution
+    return buckets
+
+class StatusHistoryService:
+    @staticmethod
+    def record(results):
+        """
+        Append check results to the history
+        
+        Results are expected in roughly chronological order per target.
+        The caller commits.
+        
+        Args:
+            results: Iterable of (target_id, status, status_code, checked_at)
+                tuples, checked_at being a naive UTC datetime
+        """
+        by_target = {}
+        for target_id, status, status_code, checked_at in results:
+            by_target.setdefault(target_id, []).append((to_epoch(checked_at), status, status_code))
+        if not by_target:
+            return
+        
+        runs = StatusRun.__table__
+        latest_ids = (
+            select(func.max(runs.c.id))
+            .where(runs.c.target_id.in_(list(by_target)))
+            .group_by(runs.c.target_id)
+        )
+        latest = {
+            row.target_id: dict(row._mapping)
+            for row in db.session.execute(select(runs).where(runs.c.id.in_(latest_ids)))
+        }
+        
+        extended = {}
+        new_runs = []
+        for target_id, checks in by_target.items():
+            checks.sort(key=lambda check: check[0])
+            current = latest.get(target_id)
+            for checked_at, status, status_code in checks:
+                if (current is not None and current['status'] == status
+                        and current['status_code'] == status_code):
+                    current['ended_at'] = max(current['ended_at'], checked_at)
+                    current['checks'] += 1
+                    if 'id' in current:
+                        extended[current['id']] = current
+                else:
+                    current = {
+                        'target_id': target_id,
+                        'status': status,
+                        'status_code': status_code,
+                        'started_at': checked_at,
+                        'ended_at': checked_at,
+                        'checks': 1
+                    }
+                    new_runs.append(current)
+        
+        if extended:
+            db.session.execute(
+                update(runs)
+                .where(runs.c.id == bindparam('run_id'))
+                .values(ended_at=bindparam('run_ended_at'), checks=bindparam('run_checks')),
+                [
+                    {'run_id': run_id, 'run_ended_at': run['ended_at'], 'run_checks': run['checks']}
+                    for run_id, run in extended.items()
+                ]
+            )
+        if new_runs:
+            db.session.execute(runs.insert(), new_runs)
+    
+    @staticmethod
+    def get_history(target_id, start, end):
+        """
+        Get the history of a target between two moments
+        
+        Args:
+            target_id: The target ID
+            start: Range start in epoch seconds
+            end: Range end in epoch seconds
+            
+        Returns:
+            Dictionary with raw runs and downsampled rollups overlapping the range
+        """
+        start, end = clamp_epoch(start), clamp_epoch(end)
+        runs = StatusRun.query.filter(
+            StatusRun.target_id == target_id,
+            StatusRun.started_at <= end,
+            StatusRun.ended_at >= start
+        ).order_by(StatusRun.started_at).all()
+        
+        rollups = StatusRollup.query.filter(
+            StatusRollup.target_id == target_id,
+            StatusRollup.bucket_start <= end,
+            StatusRollup.bucket_start > start - StatusRollup.resolution
+        ).order_by(StatusRollup.bucket_start, StatusRollup.resolution).all()
+        
+        return {
+            'target_id': target_id,
+            'from': from_epoch(start).isoformat(),
+            'to': from_epoch(end).isoformat(),
+            'runs': [run.to_dict() for run in runs],
+            'rollups': [rollup.to_dict() for rollup in rollups]
+        }
+    
+    @staticmethod
+    def compact(now=None, batch_size=10000):
+        """
+        Downsample and expire history according to the retention settings
+        
+        Args:
+            now: Current time in epoch seconds, defaults to the clock
+            batch_size: Raw runs folded per statement batch
+            
+        Returns:
+            Dictionary with the number of rows folded or removed per tier
+        """
+        if now is None:
+            now = to_epoch(datetime.utcnow())
+        config = current_app.config
+        raw_cutoff = now - config['STATUS_HISTORY_RAW_RETENTION']
+        five_minute_cutoff = now - config['STATUS_HISTORY_5M_RETENTION']
+        hourly_cutoff = now - config['STATUS_HISTORY_1H_RETENTION']
+        
+        runs = StatusRun.__table__
+        rollups = StatusRollup.__table__
+        result = {'raw_folded': 0, 'five_minute_folded': 0, 'hourly_expired': 0}
+        
+        # Raw runs -> 5 minute rollups
+        while True:
+            batch = db.session.execute(
+                select(runs).where(runs.c.ended_at < raw_cutoff).order_by(runs.c.id).limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            
+            counts = {}
+            for run in batch:
+                column = _status_bucket(run.status)
+                for bucket, checks in _spread(run.started_at, run.ended_at, run.checks, FIVE_MINUTES):
+                    row = counts.setdefault((run.target_id, bucket), {'up': 0, 'down': 0, 'other': 0})
+                    row[column] += checks
+            
+            upsert_increment(rollups, [
+                dict(row, target_id=target_id, resolution=FIVE_MINUTES, bucket_start=bucket)
+                for (target_id, bucket), row in counts.items()
+            ], ['target_id', 'resolution', 'bucket_start'], ['up', 'down', 'other'])
+            db.session.execute(delete(runs).where(runs.c.id.in_([run.id for run in batch])))
+            result['raw_folded'] += len(batch)
+        
+        # 5 minute rollups -> 1 hour rollups
+        old_five_minute = (
+            (rollups.c.resolution == FIVE_MINUTES) & (rollups.c.bucket_start < five_minute_cutoff)
+        )
+        hour = (rollups.c.bucket_start // ONE_HOUR) * ONE_HOUR
+        hourly = db.session.execute(
+            select(rollups.c.target_id, hour, func.sum(rollups.c.up),
+                   func.sum(rollups.c.down), func.sum(rollups.c.other))
+            .where(old_five_minute)
+            .group_by(rollups.c.target_id, hour)
+        ).all()
+        upsert_increment(rollups, [
+            {'target_id': target_id, 'resolution': ONE_HOUR, 'bucket_start': bucket,
+             'up': up, 'down': down, 'other': other}
+            for target_id, bucket, up, down, other in hourly
+        ], ['target_id', 'resolution', 'bucket_start'], ['up', 'down', 'other'])
+        result['five_minute_folded'] = db.session.execute(delete(rollups).where(old_five_minute)).rowcount
+        
+        # Expire 1 hour rollups
+        result['hourly_expired'] = db.session.execute(
+            delete(rollups).where(
+                (rollups.c.resolution == ONE_HOUR) & (rollups.c.bucket_start < hourly_cutoff)
+            )
+        ).rowcount
+        
+        return result
+    
+    @staticmethod
+    def delete_for_targets(target_ids):
+        """Remove all history of the given targets"""
+        if not target_ids:
+            return
+        for table in (StatusRun.__table__, StatusRollup.__table__):
+            db.session.execute(delete(table).where(table.c.target_id.in_(target_ids)))
@@ -0,0 +1,328 @@
+"""
+Batched ingestion of check results into Target.last_status.
+
+External checkers push results in batches. Results are buffered per
+worker, coalesced per target (the newest check wins) and written once
+per flush window with a handful of set-based statements:
+
+- targets whose status or status code changed get one executemany UPDATE
+- unchanged targets only get last_check refreshed, and only when the
+  stored value is older than STATUS_INGEST_TOUCH_INTERVAL seconds
+- results checked before the stored last_check (late or replayed) are
+  counted as stale and written nowhere
+- every other result is appended to the status history
+
+When a flush fails, its results go back to the buffer for the next one,
+and the failure is logged rather than raised: the results were accepted.
+"""
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, bindparam
+from app import db
+from app.models.target import Target
+from app.services.data_version import status_write
+from app.services.status_history import StatusHistoryService
+from app.services.target_statistics import CounterDelta
+from app.utils.query_counter import tracked
+
+# IDs per SELECT when loading current status (stays below SQLite's bind limit)
+LOAD_CHUNK = 10000
+
+def is_stale(row, checked_at):
+    """Whether a result was checked before the stored last_check of its target"""
+    return row.last_check is not None and checked_at < row.last_check
+
+class StatusIngestService:
+    @staticmethod
+    @tracked()
+    def apply(results, touch_interval=60, record_history=True):
+        """
+        Write check results to targets in set-based batches
+        
+        Args:
+            results: List of (target_id, status, status_code, checked_at) tuples
+            touch_interval: Seconds after which an unchanged target's
+                last_check is refreshed anyway
+            record_history: Whether to append the results to the status history
+            
+        Returns:
+            Dictionary with counts of received, changed, touched, skipped,
+            stale and unknown targets
+        """
+        latest = {}
+        for result in results:
+            current = latest.get(result[0])
+            if current is None or result[3] >= current[3]:
+                latest[result[0]] = result
+        
+        # Sorted IDs and row locks (PostgreSQL) keep the status counters
+        # exact when several workers flush results for the same targets
+        stored = {}
+        ids = sorted(latest)
+        for offset in range(0, len(ids), LOAD_CHUNK):
+            rows = db.session.execute(
+                select(Target.id, Target.last_status, Target.last_status_code, Target.last_check)
+                .where(Target.id.in_(ids[offset:offset + LOAD_CHUNK]))
+                .with_for_update()
+            )
+            stored.update((row.id, row) for row in rows)
+        
+        changed = []
+        touched = []
+        counters = CounterDelta()
+        skipped = stale = 0
+        touch_delta = timedelta(seconds=touch_interval)
+        for target_id, (_, status, status_code, checked_at) in latest.items():
+            row = stored.get(target_id)
+            if row is None:
+                continue
+            if is_stale(row, checked_at):
+                # Older than what is stored: it must not overwrite newer state
+                stale += 1
+                continue
+            if row.last_status != status or row.last_status_code != status_code:
+                changed.append({'target_id': target_id, 'new_status': status,
+                                'new_status_code': status_code, 'new_check': checked_at})
+                if row.last_status != status:
+                    if row.last_status is not None:
+                        counters.add('status', row.last_status, -1)
+                    counters.add('status', status)
+            elif row.last_check is None or checked_at - row.last_check >= touch_delta:
+                touched.append({'target_id': target_id, 'new_check': checked_at})
+            else:
+                skipped += 1
+        
+        targets = Target.__table__
+        if changed:
+            db.session.execute(
+                status_write(update(targets)
+                             .where(targets.c.id == bindparam('target_id'))
+                             .values(last_status=bindparam('new_status'),
+                                     last_status_code=bindparam('new_status_code'),
+                                     last_check=bindparam('new_check'))),
+                changed
+            )
+        if touched:
+            db.session.execute(
+                status_write(update(targets)
+                             .where(targets.c.id == bindparam('target_id'))
+                             .values(last_check=bindparam('new_check'))),
+                touched
+            )
+        counters.apply()
+        if record_history:
+            StatusHistoryService.record(
+                result for result in results
+                if result[0] in stored and not is_stale(stored[result[0]], result[3])
+            )
+        
+        return {
+            'received': len(results),
+            'targets': len(latest),
+            'changed': len(changed),
+            'touched': len(touched),
+            'skipped': skipped,
+            'stale': stale,
+            'unknown': len(latest) - len(stored)
+        }
+
+class StatusIngestor:
+    """Per-worker buffer that coalesces results and flushes them periodically"""
+    
+    def __init__(self, app):
+        self.app = app
+        self.flush_interval = app.config.get('STATUS_INGEST_FLUSH_INTERVAL', 1.0)
+        self.max_pending = app.config.get('STATUS_INGEST_MAX_PENDING', 50000)
+        self.background = app.config.get('STATUS_INGEST_BACKGROUND_FLUSH', True)
+        self.totals = {'received': 0, 'flushes': 0, 'changed': 0, 'touched': 0, 'skipped': 0, 'stale': 0,
+                       'unknown': 0, 'dropped': 0, 'failed_flushes': 0}
+        self._pending = []
+        self._first_pending_at = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+    
+    def submit(self, results):
+        """
+        Buffer check results and flush when the window or buffer is full
+        
+        Args:
+            results: List of (target_id, status, status_code, checked_at) tuples
+            
+        Returns:
+            Flush statistics if this call flushed, otherwise None
+        """
+        with self._lock:
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending.extend(results)
+            due = (len(self._pending) >= self.max_pending
+                   or time.monotonic() - self._first_pending_at >= self.flush_interval)
+        
+        if self.background:
+            self._start_flusher()
+        if due:
+            return self.flush()
+        return None
+    
+    def flush(self):
+        """
+        Write all buffered results
+        
+        A failed write is logged and its results are buffered again for
+        the next flush, not raised: they were accepted already.
+        
+        Returns:
+            Flush statistics, or None if the buffer was empty or the write
+            failed
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                first_pending_at, self._first_pending_at = self._first_pending_at, None
+            if not pending:
+                return None
+            
+            config = self.app.config
+            with self.app.app_context():
+                try:
+                    stats = StatusIngestService.apply(
+                        pending,
+                        touch_interval=config.get('STATUS_INGEST_TOUCH_INTERVAL', 60),
+                        record_history=config.get('STATUS_HISTORY_ENABLED', True)
+                    )
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    self._requeue(pending, first_pending_at)
+                    self.totals['failed_flushes'] += 1
+                    self.app.logger.exception('Status ingest flush failed, %d results buffered again',
+                                              len(pending))
+                    return None
+            
+            self.totals['flushes'] += 1
+            for key in ('received', 'changed', 'touched', 'skipped', 'stale', 'unknown'):
+                self.totals[key] += stats[key]
+            return stats
+    
+    def _requeue(self, pending, first_pending_at):
+        """
+        Put the results of a failed flush back in front of the buffer
+        
+        The buffer stays bounded by max_pending: beyond it the oldest
+        results are dropped, since a newer check of a target supersedes them.
+        """
+        with self._lock:
+            pending.extend(self._pending)
+            dropped = len(pending) - self.max_pending
+            if dropped > 0:
+                del pending[:dropped]
+                self.totals['dropped'] += dropped
+            self._pending = pending
+            if first_pending_at is not None:
+                self._first_pending_at = first_pending_at
+            elif self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+        if dropped > 0:
+            self.app.logger.warning('Status ingest buffer full, dropped %d results after a failed flush', dropped)
+    
+    def pending(self):
+        """Number of results waiting for the next flush"""
+        return len(self._pending)
+    
+    def _start_flusher(self):
+        """Start the background flush thread of this worker once"""
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._run_flusher, name='status-ingest-flusher', daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+    
+    def _run_flusher(self):
+        """Flush pending results once per flush window"""
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+def parse_results(payload):
+    """
+    Validate an ingest payload
+    
+    Args:
+        payload: List of result objects, or an object with a 'results' list.
+            Each result needs target_id and status; status_code and
+            checked_at (epoch seconds or ISO 8601 UTC) are optional.
+            
+    Returns:
+        List of (target_id, status, status_code, checked_at) tuples
+        
+    Raises:
+        ValueError: If the payload or one of its results is malformed
+    """
+    if isinstance(payload, dict):
+        payload = payload.get('results')
+    if not isinstance(payload, list):
+        raise ValueError('Expected a list of results')
+    
+    now = datetime.utcnow()
+    results = []
+    for index, item in enumerate(payload):
+        if not isinstance(item, dict) or 'target_id' not in item or not item.get('status'):
+            raise ValueError(f'Result {index}: target_id and status are required')
+        try:
+            target_id = int(item['target_id'])
+            checked_at = item.get('checked_at')
+            if checked_at is None:
+                checked_at = now
+            elif isinstance(checked_at, (int, float)):
+                checked_at = datetime.utcfromtimestamp(checked_at)
+            else:
+                checked_at = datetime.fromisoformat(str(checked_at).replace('Z', '+00:00'))
+                if checked_at.tzinfo is not None:
+                    checked_at = datetime.utcfromtimestamp(checked_at.timestamp())
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise ValueError(f'Result {index}: invalid target_id or checked_at')
+        
+        status_code = item.get('status_code')
+        results.append((
+            target_id,
+            str(item['status']).upper(),
+            str(status_code) if status_code is not None else None,
+            checked_at
+        ))
+    return results
+
+def init_app(app):
+    """Attach a status ingestor to the application"""
+    ingestor = StatusIngestor(app)
+    app.extensions['status_ingestor'] = ingestor
+    if 'metrics' in app.extensions:
+        registry = app.extensions['metrics']
+        registry.callback(
+            'status_ingest_results_total', 'Pushed check results by outcome', ('outcome',),
+            lambda: {(key,): ingestor.totals[key]
+                     for key in ('received', 'changed', 'touched', 'skipped', 'stale', 'unknown', 'dropped')},
+            kind='counter'
+        )
+        registry.callback(
+            'status_ingest_flushes_total', 'Coalesced ingestion writes', (),
+            lambda: {(): ingestor.totals['flushes']}, kind='counter'
+        )
+        registry.callback(
+            'status_ingest_failed_flushes_total', 'Ingestion writes that failed and were buffered again', (),
+            lambda: {(): ingestor.totals['failed_flushes']}, kind='counter'
+        )
+        registry.callback(
+            'status_ingest_pending', 'Results waiting for the next flush', (),
+            lambda: {(): ingestor.pending()}
+        )
+
+def get_status_ingestor():
+    """Get the status ingestor of the current application"""
+    return current_app.extensions['status_ingestor']
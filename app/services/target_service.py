@@ -1,14 +1,42 @@
 """
 Target-related business logic.
 """
-from sqlalchemy import and_, or_, func
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, or_, func, insert
+from sqlalchemy.orm import selectinload
 from app import db
-from app.models.target import Target
-from app.models.probe import Probe
+from app.models.target import (Target, target_assignees, target_probes,
+                               parse_assignees, format_assignees, DICT_FIELDS, FRAGMENT_KEY)
+from app.services.probe_registry import get_probe_registry
+from app.services.status_history import StatusHistoryService
+from app.services.target_statistics import CounterDelta, StatisticsService, target_values
 from app.utils.query_parser import parse_search_query, build_filter_conditions
+from app.utils.dialect import text_contains, query_plan, is_full_scan, delete_returning
+from app.utils.fragment_cache import get_fragment_cache, join_fragments, missing_statement
+from app.utils.query_counter import tracked
+from app.utils.row_serializer import get_row_serializer
 
 class TargetService:
     @staticmethod
+    def _with_probes(query, include_probes):
+        """
+        Load probes for all returned targets in one extra query when requested
+        
+        Args:
+            query: The target query
+            include_probes: Whether probe information will be serialized
+            
+        Returns:
+            The query, with a selectin load of Target.probes if needed
+        """
+        if include_probes:
+            return query.options(selectinload(Target.probes))
+        return query
+    
+    @staticmethod
+    @tracked()
     def get_all_targets(include_probes=False):
         """
         Get all targets
@@ -19,7 +47,7 @@ class TargetService:
         Returns:
             List of target dictionaries
         """
-        targets = Target.query.all()
+        targets = TargetService._with_probes(Target.query, include_probes).all()
         return [target.to_dict(include_probes=include_probes) for target in targets]
     
     @staticmethod
@@ -34,12 +62,14 @@ class TargetService:
         Returns:
             Target dictionary or None if not found
         """
-        target = Target.query.get(target_id)
+        options = [selectinload(Target.probes)] if include_probes else []
+        target = db.session.get(Target, target_id, options=options)
         if target:
             return target.to_dict(include_probes=include_probes)
         return None
     
     @staticmethod
+    @tracked()
     def search_targets(search_query, include_probes=False):
         """
         Search targets using a query string
@@ -56,31 +86,172 @@ class TargetService:
         
         parsed_query = parse_search_query(search_query)
         conditions = build_filter_conditions(parsed_query)
+        query, _ = TargetService._search_query(search_query, conditions)
+        targets = TargetService._with_probes(query, include_probes).all()
         
-        if conditions:
-            targets = Target.query.filter(and_(*conditions)).all()
-        else:
-            # For free-text search without field specifications
-            search_terms = search_query.split()
-            query = Target.query
+        return [target.to_dict(include_probes=include_probes) for target in targets]
+    
+    @staticmethod
+    @tracked()
+    def search_targets_json(search_query):
+        """
+        Search targets and serialize them without loading Target objects
+        
+        Selects the to_dict() columns as plain rows, executed on the
+        session's connection to skip ORM result processing, and writes them
+        with a compiled row serializer. With the fragment cache, only
+        (id, last_updated) of the matching targets is selected first, and
+        only targets changed since they were last listed are selected in
+        full and encoded.
+        
+        Args:
+            search_query: The search query string
             
-            for term in search_terms:
-                if term:
-                    search_condition = or_(
-                        Target.hostname.contains(term),
-                        Target.region.contains(term),
-                        Target.zone.contains(term),
-                        Target.probe_type.contains(term),
-                        Target.assignees.contains(term),
-                        Target.last_status.contains(term)
-                    )
-                    query = query.filter(search_condition)
+        Returns:
+            JSON array bytes, identical to the body of jsonify() of
+            search_targets() without its trailing newline, in ID order when
+            the fragment cache is enabled
+        """
+        serializer = get_row_serializer('target', DICT_FIELDS)
+        statement = TargetService.search_statement(search_query)
+        connection = db.session.connection()
+        cache = get_fragment_cache()
+        if not cache.enabled:
+            return serializer.dumps_rows(connection.execute(statement.with_only_columns(*serializer.columns)).all())
+        
+        # Fragments depend on the serializer's settings: it is the shape.
+        # Keys in ID order, the order of a scan of the table
+        keys = connection.execute(statement.with_only_columns(*FRAGMENT_KEY).order_by(Target.id)).all()
+        fragments, missing = cache.lookup(serializer, keys)
+        if missing:
+            rows = connection.execute(
+                missing_statement(statement.with_only_columns(*FRAGMENT_KEY, *serializer.columns), missing)
+            ).all()
+            fragments = cache.complete(serializer, keys, fragments, rows,
+                                       lambda rows: serializer.dumps_fragments([row[2:] for row in rows]))
+        return join_fragments(fragments, serializer.pretty)
+    
+    @staticmethod
+    def search_statement(search_query):
+        """
+        Build the SELECT of a target search without running it
+        
+        Args:
+            search_query: The search query string
             
-            targets = query.all()
+        Returns:
+            SELECT of the matching Target entities, for callers that run it
+            on their own connection (see app/asgi)
+        """
+        conditions = build_filter_conditions(parse_search_query(search_query)) if search_query else []
+        query, _ = TargetService._search_query(search_query, conditions)
+        return query.statement
+    
+    @staticmethod
+    def _search_query(search_query, conditions):
+        """
+        Build the target query for a search string
         
-        return [target.to_dict(include_probes=include_probes) for target in targets]
+        Args:
+            search_query: The raw search query string
+            conditions: Filter conditions built from the parsed query
+            
+        Returns:
+            Tuple of (query, mode) where mode is 'all', 'fields' or 'free_text'
+        """
+        if not search_query:
+            return Target.query, 'all'
+        
+        if conditions:
+            return Target.query.filter(and_(*conditions)), 'fields'
+        
+        # For free-text search without field specifications
+        search_terms = search_query.split()
+        query = Target.query
+        
+        for term in search_terms:
+            if term:
+                search_condition = or_(
+                    text_contains(Target.hostname, term),
+                    text_contains(Target.region, term),
+                    text_contains(Target.zone, term),
+                    text_contains(Target.probe_type, term),
+                    text_contains(Target.assignees, term),
+                    text_contains(Target.last_status, term)
+                )
+                query = query.filter(search_condition)
+        
+        return query, 'free_text'
+    
+    @staticmethod
+    def explain_search(search_query, include_probes=False):
+        """
+        Run a search while recording how it was executed
+        
+        Args:
+            search_query: The search query string
+            include_probes: Whether to include probe information
+            
+        Returns:
+            Dictionary with the parsed query, generated SQL and parameters,
+            the database query plan, row counts and per-stage wall times
+        """
+        timings = {}
+        
+        start = time.perf_counter()
+        parsed_query = parse_search_query(search_query)
+        conditions = build_filter_conditions(parsed_query)
+        query, mode = TargetService._search_query(search_query, conditions)
+        query = TargetService._with_probes(query, include_probes)
+        timings['parse'] = time.perf_counter() - start
+        
+        statement = query.statement
+        compiled = statement.compile(dialect=db.engine.dialect)
+        sql = str(compiled)
+        if compiled.positional:
+            params = [compiled.params[name] for name in compiled.positiontup]
+        else:
+            params = compiled.params
+        
+        start = time.perf_counter()
+        result = db.session.execute(statement)
+        timings['sql'] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        targets = result.scalars().all()
+        timings['hydrate'] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        payload = current_app.json.dumps(
+            [target.to_dict(include_probes=include_probes) for target in targets]
+        )
+        timings['serialize'] = time.perf_counter() - start
+        
+        plan = query_plan(db.session.connection(), sql, params)
+        full_scan = is_full_scan(plan, Target.__tablename__)
+        table_total = Target.query.count()
+        
+        return {
+            'query': search_query,
+            'mode': mode,
+            'parsed': parsed_query,
+            'sql': sql,
+            'params': params if isinstance(params, list) else dict(params),
+            'plan': plan,
+            'rows': {
+                # The database does not report rows visited; a full scan reads
+                # the whole table, an index search reads (about) what it returns
+                'examined': table_total if full_scan else len(targets),
+                'returned': len(targets),
+                'table_total': table_total,
+                'full_scan': full_scan
+            },
+            'response_bytes': len(payload),
+            'timings_ms': {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+        }
     
     @staticmethod
+    @tracked()
     def create_target(data):
         """
         Create a new target
@@ -90,7 +261,13 @@ class TargetService:
             
         Returns:
             Dictionary with status message and target ID
+            
+        Raises:
+            ValueError: When a field has an invalid value
         """
+        TargetService._validate(data)
+        assignee_names = parse_assignees(data['assignees'])
+        
         # Create new target
         new_target = Target(
             hostname=data['hostname'],
@@ -98,28 +275,33 @@ class TargetService:
             region=data['region'],
             zone=data['zone'],
             probe_type=data['probe_type'],
-            assignees=data['assignees'],
+            assignees=format_assignees(assignee_names),
             enabled=data.get('enabled', True),
             port=data.get('port'),
             protocol=data.get('protocol'),
             path=data.get('path'),
             expect_status_code=data.get('expect_status_code'),
-            timeout=data.get('timeout', 10)
+            timeout=data.get('timeout', 10),
+            check_interval=data.get('check_interval')
         )
         
+        db.session.add(new_target)
+        db.session.flush()
+        counters = CounterDelta()
+        counters.add_target(target_values(new_target))
+        TargetService._set_assignees([new_target.id], assignee_names, counters)
+        
         # Add associated probes if provided
         if 'probe_ids' in data and isinstance(data['probe_ids'], list):
-            for probe_id in data['probe_ids']:
-                probe = Probe.query.get(probe_id)
-                if probe:
-                    new_target.probes.append(probe)
+            TargetService._set_probes([new_target.id], data['probe_ids'], counters)
         
-        db.session.add(new_target)
+        counters.apply()
         db.session.commit()
         
         return {'message': 'Target created successfully', 'id': new_target.id}
     
     @staticmethod
+    @tracked()
     def update_target(target_id, data):
         """
         Update a target
@@ -130,33 +312,42 @@ class TargetService:
             
         Returns:
             Dictionary with status message or None if target not found
+            
+        Raises:
+            ValueError: When a field has an invalid value
         """
-        target = Target.query.get(target_id)
+        TargetService._validate(data)
+        target = db.session.get(Target, target_id, with_for_update=True)
         if not target:
             return None
         
+        counters = CounterDelta()
+        old_values = target_values(target)
+        
         # Update target fields
-        for field in ['hostname', 'address', 'region', 'zone', 'probe_type', 'assignees', 
-                      'enabled', 'port', 'protocol', 'path', 'expect_status_code', 'timeout']:
+        for field in ['hostname', 'address', 'region', 'zone', 'probe_type', 
+                      'enabled', 'port', 'protocol', 'path', 'expect_status_code', 'timeout',
+                      'check_interval']:
             if field in data:
                 setattr(target, field, data[field])
         
-        # Update associated probes if provided
+        if 'assignees' in data:
+            assignee_names = parse_assignees(data['assignees'])
+            target.assignees = format_assignees(assignee_names)
+            TargetService._set_assignees([target.id], assignee_names, counters)
+        
+        # Replace associated probes if provided
         if 'probe_ids' in data and isinstance(data['probe_ids'], list):
-            # Clear existing associations
-            target.probes = []
-            
-            # Add new associations
-            for probe_id in data['probe_ids']:
-                probe = Probe.query.get(probe_id)
-                if probe:
-                    target.probes.append(probe)
+            TargetService._set_probes([target.id], data['probe_ids'], counters)
         
+        counters.change_target(old_values, target_values(target))
+        counters.apply()
         db.session.commit()
         
         return {'message': 'Target updated successfully'}
     
     @staticmethod
+    @tracked()
     def delete_target(target_id):
         """
         Delete a target
@@ -167,16 +358,23 @@ class TargetService:
         Returns:
             Dictionary with status message or None if target not found
         """
-        target = Target.query.get(target_id)
+        target = db.session.get(Target, target_id, with_for_update=True)
         if not target:
             return None
         
+        counters = CounterDelta()
+        counters.add_target(target_values(target), -1)
+        TargetService._set_assignees([target.id], [], counters)
+        TargetService._set_probes([target.id], [], counters)
+        StatusHistoryService.delete_for_targets([target.id])
         db.session.delete(target)
+        counters.apply()
         db.session.commit()
         
         return {'message': 'Target deleted successfully'}
     
     @staticmethod
+    @tracked()
     def batch_operation(operation, target_ids, fields=None):
         """
         Perform a batch operation on multiple targets
@@ -187,15 +385,30 @@ class TargetService:
             fields: Dictionary of fields to update (for 'update' operation)
             
         Returns:
-            Dictionary with status message and affected count
+            Tuple of (dictionary with status message and affected count, HTTP status code)
         """
-        targets = Target.query.filter(Target.id.in_(target_ids)).all()
+        if operation == 'update' and fields:
+            try:
+                TargetService._validate(fields)
+            except ValueError as e:
+                return {'error': str(e)}, 400
+        
+        # Row locks keep the counter deltas exact under concurrent writers
+        # (a no-op on SQLite, where writers are serialized anyway)
+        targets = Target.query.filter(Target.id.in_(target_ids)).with_for_update().all()
         
         if not targets:
             return {'error': 'No valid targets found'}, 404
         
+        counters = CounterDelta()
+        old_values = {target.id: target_values(target) for target in targets}
         if operation == 'delete':
+            ids = [target.id for target in targets]
+            TargetService._set_assignees(ids, [], counters)
+            TargetService._set_probes(ids, [], counters)
+            StatusHistoryService.delete_for_targets(ids)
             for target in targets:
+                counters.add_target(old_values[target.id], -1)
                 db.session.delete(target)
         elif operation == 'enable':
             for target in targets:
@@ -204,61 +417,138 @@ class TargetService:
             for target in targets:
                 target.enabled = False
         elif operation == 'update' and fields:
+            fields = dict(fields)
+            if 'assignees' in fields:
+                assignee_names = parse_assignees(fields['assignees'])
+                fields['assignees'] = format_assignees(assignee_names)
+                TargetService._set_assignees([target.id for target in targets], assignee_names, counters)
             for target in targets:
                 for field, value in fields.items():
                     if hasattr(target, field):
                         setattr(target, field, value)
+            if 'last_status' in fields and current_app.config.get('STATUS_HISTORY_ENABLED', True):
+                checked_at = datetime.utcnow()
+                StatusHistoryService.record(
+                    (target.id, target.last_status, target.last_status_code, checked_at)
+                    for target in targets
+                )
         else:
             return {'error': 'Unsupported operation'}, 400
         
+        if operation != 'delete':
+            for target in targets:
+                counters.change_target(old_values[target.id], target_values(target))
+        counters.apply()
         db.session.commit()
         
         return {
             'message': f'Batch {operation} successful',
             'affected_count': len(targets)
-        }
+        }, 200
     
     @staticmethod
-    def get_statistics():
+    def _validate(data):
         """
-        Get statistics about targets
+        Check the values of target fields before they are written
         
-        Returns:
-            Dictionary containing various statistics
+        Args:
+            data: Dictionary of target fields
+            
+        Raises:
+            ValueError: When check_interval is not a whole number of seconds
+                of at least PROBER_MIN_CHECK_INTERVAL
         """
-        # Count total targets
-        total_targets = Target.query.count()
-        
-        # Count enabled/disabled targets
-        enabled_targets = Target.query.filter_by(enabled=True).count()
-        disabled_targets = Target.query.filter_by(enabled=False).count()
+        interval = data.get('check_interval')
+        if interval is None:
+            return
+        minimum = current_app.config.get('PROBER_MIN_CHECK_INTERVAL', 1)
+        if isinstance(interval, bool) or not isinstance(interval, int) or interval < minimum:
+            raise ValueError(f'check_interval must be a whole number of seconds, at least {minimum}')
+    
+    @staticmethod
+    def _set_assignees(target_ids, assignee_names, counters):
+        """
+        Replace the assignee rows of the given targets
         
-        # Count targets by status
-        status_counts = db.session.query(
-            Target.last_status, func.count(Target.id)
-        ).group_by(Target.last_status).all()
+        Args:
+            target_ids: List of target IDs
+            assignee_names: Normalized assignee names, empty to clear
+            counters: CounterDelta receiving the per-assignee changes
+        """
+        if not target_ids:
+            return
+        
+        for (name,) in delete_returning(target_assignees, target_assignees.c.target_id.in_(target_ids),
+                                        target_assignees.c.assignee):
+            counters.add('assignee', name, -1)
+        for name in assignee_names:
+            counters.add('assignee', name, len(target_ids))
+        
+        if assignee_names:
+            db.session.execute(insert(target_assignees), [
+                {'target_id': target_id, 'assignee': name}
+                for target_id in target_ids
+                for name in assignee_names
+            ])
+    
+    @staticmethod
+    def _set_probes(target_ids, probe_ids, counters):
+        """
+        Replace the probe associations of the given targets
         
-        status_stats = {status: count for status, count in status_counts if status is not None}
+        Unknown probe IDs are ignored. IDs are validated against the
+        in-memory probe registry, so no probe rows are loaded.
         
-        # Count targets by probe type
-        type_counts = db.session.query(
-            Target.probe_type, func.count(Target.id)
-        ).group_by(Target.probe_type).all()
+        Args:
+            target_ids: List of target IDs
+            probe_ids: List of probe IDs, empty to clear
+            counters: CounterDelta receiving the per-probe changes
+        """
+        if not target_ids:
+            return
+        
+        valid_ids = get_probe_registry().valid_ids(probe_ids) if probe_ids else []
+        
+        for (probe_id,) in delete_returning(target_probes, target_probes.c.target_id.in_(target_ids),
+                                            target_probes.c.probe_id):
+            counters.add('probe', probe_id, -1)
+        for probe_id in valid_ids:
+            counters.add('probe', probe_id, len(target_ids))
+        
+        if valid_ids:
+            db.session.execute(insert(target_probes), [
+                {'target_id': target_id, 'probe_id': probe_id}
+                for target_id in target_ids
+                for probe_id in valid_ids
+            ])
+    
+    @staticmethod
+    @tracked()
+    def get_assignee_facets():
+        """
+        Count targets per assignee
         
-        type_stats = {probe_type: count for probe_type, count in type_counts if probe_type is not None}
+        Returns:
+            List of dictionaries with assignee name and target count
+        """
+        counts = db.session.query(
+            target_assignees.c.assignee, func.count(target_assignees.c.target_id)
+        ).group_by(target_assignees.c.assignee).order_by(target_assignees.c.assignee).all()
         
-        # Count targets by region
-        region_counts = db.session.query(
-            Target.region, func.count(Target.id)
-        ).group_by(Target.region).all()
+        return [{'assignee': assignee, 'count': count} for assignee, count in counts]
+    
+    @staticmethod
+    @tracked()
+    def get_statistics():
+        """
+        Get statistics about targets
         
-        region_stats = {region: count for region, count in region_counts if region is not None}
+        Computed in a single pass over targets, or read from the
+        incrementally maintained counters when STATISTICS_COUNTERS is set
+        (see app/services/target_statistics.py).
         
-        return {
-            'total': total_targets,
-            'enabled': enabled_targets,
-            'disabled': disabled_targets,
-            'by_status': status_stats,
-            'by_type': type_stats,
-            'by_region': region_stats
-        }
\ No newline at end of file
+        Returns:
+            Dictionary containing various statistics
+        """
+        return StatisticsService.get_statistics()
+        
\ No newline at end of file
@@ -0,0 +1,201 @@
+"""
+Target statistics for /api/statistics.
+
+Two ways to compute the same payload:
+
+- single_pass() runs one statement: a UNION ALL of a GROUP BY over the
+  (enabled, probe_type, last_status, region) combinations of targets,
+  read in order from the covering ix_targets_statistics index, and one
+  index-only GROUP BY each over target_assignees and target_probes.
+- from_counters() reads the target_counters table, which every target
+  write keeps up to date through CounterDelta in its own transaction, so
+  the cost no longer grows with the number of targets.
+
+STATISTICS_COUNTERS selects the counters. They are maintained either way,
+so the setting can be switched without a rebuild; rebuild_counters()
+(flask statistics rebuild) recomputes them after targets were written
+behind the application's back, e.g. with bulk SQL.
+"""
+from collections import Counter
+from flask import current_app
+from sqlalchemy import String, case, cast, delete, func, insert, literal, null, select, union_all
+from app import db
+from app.models.target import Target, target_assignees, target_probes
+from app.models.target_counter import TargetCounter
+from app.services.probe_registry import get_probe_registry
+from app.utils.dialect import upsert_increment
+
+# Counter dimensions reported as breakdowns, and their payload keys
+BREAKDOWNS = {
+    'status': 'by_status',
+    'type': 'by_type',
+    'region': 'by_region',
+    'assignee': 'by_assignee',
+    'probe': 'by_probe',
+}
+
+def target_values(target):
+    """The columns of a target that statistics are kept for"""
+    return target.enabled, target.last_status, target.probe_type, target.region
+
+def target_keys(values):
+    """
+    Counter keys a target contributes to
+    
+    Args:
+        values: Tuple from target_values()
+    
+    Returns:
+        List of (dimension, value) tuples
+    """
+    enabled, last_status, probe_type, region = values
+    keys = [('total', ''), ('type', probe_type), ('region', region)]
+    if enabled is not None:
+        keys.append(('enabled', 'true' if enabled else 'false'))
+    if last_status is not None:
+        keys.append(('status', last_status))
+    return keys
+
+class CounterDelta:
+    """Counter changes collected during one write, applied before its commit"""
+    
+    def __init__(self):
+        self.changes = Counter()
+    
+    def add(self, dimension, value, amount=1):
+        """Change one counter"""
+        self.changes[(dimension, str(value))] += amount
+    
+    def add_target(self, values, amount=1):
+        """Count a created (amount=1) or deleted (amount=-1) target"""
+        for dimension, value in target_keys(values):
+            self.add(dimension, value, amount)
+    
+    def change_target(self, old_values, new_values):
+        """Move a target from the counters of its old values to its new ones"""
+        if old_values != new_values:
+            self.add_target(old_values, -1)
+            self.add_target(new_values)
+    
+    def apply(self):
+        """Write the collected changes with one upsert and reset them"""
+        rows = [{'dimension': dimension, 'value': value, 'count': amount}
+                for (dimension, value), amount in self.changes.items() if amount]
+        upsert_increment(TargetCounter.__table__, rows, ['dimension', 'value'], ['count'])
+        self.changes.clear()
+
+def _payload(total, enabled, disabled, breakdowns):
+    """Build the statistics dictionary, naming probes instead of numbering them"""
+    registry = get_probe_registry()
+    by_probe = {}
+    for probe_id, count in breakdowns.get('probe', {}).items():
+        probe = registry.get(int(probe_id))
+        name = probe['name'] if probe else probe_id
+        by_probe[name] = by_probe.get(name, 0) + count
+    
+    result = {'total': total, 'enabled': enabled, 'disabled': disabled}
+    for dimension, key in BREAKDOWNS.items():
+        values = by_probe if dimension == 'probe' else breakdowns.get(dimension, {})
+        result[key] = {value: count for value, count in values.items() if count}
+    return result
+
+class StatisticsService:
+    @staticmethod
+    def get_statistics():
+        """
+        Get statistics about targets, from the counters when STATISTICS_COUNTERS is set
+        
+        Returns:
+            Dictionary with total, enabled and disabled counts and
+            breakdowns by status, type, region, assignee and probe
+        """
+        if current_app.config.get('STATISTICS_COUNTERS'):
+            return StatisticsService.from_counters()
+        return StatisticsService.single_pass()
+    
+    @staticmethod
+    def single_pass():
+        """
+        Compute statistics with one statement and one scan of targets
+        
+        Returns:
+            Statistics dictionary, see get_statistics()
+        """
+        # Groupings labelled by their first column; assignee and probe
+        # groups carry their value where target groups carry the region
+        rows = db.session.execute(union_all(
+            select(literal('target'), Target.enabled, Target.probe_type, Target.last_status, Target.region,
+                   func.count())
+            .group_by(Target.enabled, Target.probe_type, Target.last_status, Target.region),
+            select(literal('assignee'), null(), null(), null(), target_assignees.c.assignee, func.count())
+            .group_by(target_assignees.c.assignee),
+            select(literal('probe'), null(), null(), null(), cast(target_probes.c.probe_id, String(20)),
+                   func.count())
+            .group_by(target_probes.c.probe_id),
+        )).all()
+        
+        total = enabled = disabled = 0
+        breakdowns = {'status': Counter(), 'type': Counter(), 'region': Counter(), 'assignee': {}, 'probe': {}}
+        for grouping, is_enabled, probe_type, last_status, region, count in rows:
+            if grouping != 'target':
+                breakdowns[grouping][region] = count
+                continue
+            total += count
+            if is_enabled is True:
+                enabled += count
+            elif is_enabled is False:
+                disabled += count
+            if last_status is not None:
+                breakdowns['status'][last_status] += count
+            if probe_type is not None:
+                breakdowns['type'][probe_type] += count
+            if region is not None:
+                breakdowns['region'][region] += count
+        return _payload(total, enabled, disabled, breakdowns)
+    
+    @staticmethod
+    def from_counters():
+        """
+        Read statistics from target_counters with one small query
+        
+        Returns:
+            Statistics dictionary, see get_statistics()
+        """
+        counters = {}
+        for dimension, value, count in db.session.execute(
+            select(TargetCounter.dimension, TargetCounter.value, TargetCounter.count)
+        ):
+            counters.setdefault(dimension, {})[value] = count
+        
+        enabled = counters.get('enabled', {})
+        return _payload(counters.get('total', {}).get('', 0), enabled.get('true', 0),
+                        enabled.get('false', 0), counters)
+    
+    @staticmethod
+    def rebuild_counters():
+        """
+        Recompute target_counters from the targets and association tables
+        
+        The caller commits. Returns the number of counter rows written.
+        """
+        counters = TargetCounter.__table__
+        sources = [
+            select(literal('total'), literal(''), func.count()).select_from(Target),
+            select(literal('enabled'), case((Target.enabled, 'true'), else_='false'), func.count())
+            .where(Target.enabled.isnot(None)).group_by(Target.enabled),
+            select(literal('status'), Target.last_status, func.count())
+            .where(Target.last_status.isnot(None)).group_by(Target.last_status),
+            select(literal('type'), Target.probe_type, func.count()).group_by(Target.probe_type),
+            select(literal('region'), Target.region, func.count()).group_by(Target.region),
+            select(literal('assignee'), target_assignees.c.assignee, func.count())
+            .group_by(target_assignees.c.assignee),
+            select(literal('probe'), cast(target_probes.c.probe_id, String(20)), func.count())
+            .group_by(target_probes.c.probe_id),
+        ]
+        db.session.execute(delete(counters))
+        written = 0
+        for source in sources:
+            written += db.session.execute(
+                insert(counters).from_select(['dimension', 'value', 'count'], source)
+            ).rowcount
+        return written
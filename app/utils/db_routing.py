@@ -0,0 +1,56 @@
+"""
+Read replica routing for read-only endpoints.
+"""
+from functools import wraps
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+PRIMARY_WRITES = 'primary_writes'
+
+class RoutingSession(Session):
+    """Session that sends reads of read-only requests to the replica bind"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        """
+        Use the replica engine when the request is read-only and one is configured
+        
+        Flushes and INSERT/UPDATE/DELETE statements go to the primary, and so
+        do the reads that follow them in the same transaction, so they see
+        the write.
+        """
+        if bind is None and use_replica():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info[PRIMARY_WRITES] = True
+            elif not self.info.get(PRIMARY_WRITES):
+                engine = self._db.engines.get(REPLICA_BIND)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_commit')
+@event.listens_for(RoutingSession, 'after_rollback')
+def _end_primary_writes(session):
+    """Let the next transaction read from the replica again"""
+    session.info.pop(PRIMARY_WRITES, None)
+
+def use_replica():
+    """Return True when the current request was marked read-only"""
+    return has_app_context() and g.get('db_read_only', False)
+
+def read_only(view):
+    """
+    Mark a view as read-only so its queries may be served by the replica
+    
+    Only reads use the replica; a write made by the view (or by a commit
+    hook) still goes to the primary.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.db_read_only = False
+    return wrapper
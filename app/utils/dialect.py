@@ -0,0 +1,132 @@
+"""
+Backend-specific pieces of search and bulk writes, kept in one place.
+
+SQLite and PostgreSQL differ in how they explain queries, in the case
+sensitivity of LIKE, in upsert syntax and in how a long list of values
+is bound; callers use these helpers instead of checking the dialect
+themselves.
+"""
+import json
+from sqlalchemy import ARRAY, Integer, any_, bindparam, delete, func, select
+from app import db
+
+def dialect_name():
+    """Return the dialect name of the primary engine, e.g. 'sqlite' or 'postgresql'"""
+    return db.engine.dialect.name
+
+def text_contains(column, term):
+    """
+    Case-insensitive substring match
+    
+    SQLite's LIKE already ignores ASCII case; PostgreSQL needs ILIKE.
+    """
+    if dialect_name() == 'sqlite':
+        return column.contains(term)
+    return column.icontains(term)
+
+def text_like(column, pattern):
+    """Case-insensitive LIKE pattern match"""
+    if dialect_name() == 'sqlite':
+        return column.like(pattern)
+    return column.ilike(pattern)
+
+def in_ids(column, ids):
+    """
+    Match a column against a list of integer IDs of any length
+    
+    The list is one bound parameter: a JSON array read with json_each() on
+    SQLite, an array compared with = ANY() on PostgreSQL. Elsewhere it is
+    an IN list with a parameter per ID.
+    """
+    name = dialect_name()
+    if name == 'sqlite':
+        return column.in_(select(func.json_each(json.dumps(list(ids))).table_valued('value').c.value))
+    if name == 'postgresql':
+        return column == any_(bindparam('ids', list(ids), type_=ARRAY(Integer), unique=True))
+    return column.in_(ids)
+
+def upsert_increment(table, rows, key_columns, increment_columns):
+    """
+    Insert rows, adding their counters to existing rows with the same key
+    
+    Uses INSERT ... ON CONFLICT DO UPDATE on SQLite and PostgreSQL and an
+    UPDATE-then-INSERT per row elsewhere.
+    
+    Args:
+        table: Target table
+        rows: List of row dictionaries
+        key_columns: Names of the primary/unique key columns
+        increment_columns: Names of the columns to add up
+    """
+    if not rows:
+        return
+    
+    name = dialect_name()
+    if name in ('sqlite', 'postgresql'):
+        if name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={column: table.c[column] + statement.excluded[column] for column in increment_columns}
+        )
+        db.session.execute(statement, rows)
+        return
+    
+    for row in rows:
+        key = [table.c[column] == row[column] for column in key_columns]
+        result = db.session.execute(
+            table.update().where(*key).values({
+                column: table.c[column] + row[column] for column in increment_columns
+            })
+        )
+        if result.rowcount == 0:
+            db.session.execute(table.insert().values(row))
+
+def delete_returning(table, condition, *columns):
+    """
+    Delete rows and return columns of the deleted rows
+    
+    One DELETE ... RETURNING where the backend supports it (SQLite 3.35+,
+    PostgreSQL), a SELECT followed by the DELETE elsewhere.
+    
+    Args:
+        table: Table to delete from
+        condition: WHERE clause selecting the rows
+        columns: Columns of the deleted rows to return
+    
+    Returns:
+        List of rows with the requested columns
+    """
+    if db.engine.dialect.delete_returning:
+        return db.session.execute(delete(table).where(condition).returning(*columns)).all()
+    
+    rows = db.session.execute(select(*columns).where(condition)).all()
+    db.session.execute(delete(table).where(condition))
+    return rows
+
+def query_plan(connection, sql, params):
+    """
+    Ask the database how it would execute a statement
+    
+    Args:
+        connection: Connection to run EXPLAIN on
+        sql: The compiled SQL string
+        params: Positional list (SQLite) or dictionary of parameters
+        
+    Returns:
+        List of plan steps with id, parent and detail
+    """
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, tuple(params)).fetchall()
+        return [{'id': row[0], 'parent': row[1], 'detail': row[3]} for row in rows]
+    
+    rows = connection.exec_driver_sql('EXPLAIN ' + sql, params).fetchall()
+    return [{'id': index, 'parent': None, 'detail': row[0]} for index, row in enumerate(rows)]
+
+def is_full_scan(plan, table):
+    """Return True when a query plan reads every row of a table"""
+    markers = (f'SCAN {table}', f'SCAN TABLE {table}', f'Seq Scan on {table}')
+    return any(marker in step['detail'] for step in plan for marker in markers)
@@ -0,0 +1,207 @@
+"""
+Cache of per-target JSON fragments for full listings.
+
+Between two refreshes of a target listing or an SD URL most targets have
+not changed, yet every response serialized all of them again. The cache
+keeps the encoded JSON of each target in each response shape (an item of
+GET /api/targets, an SD target group of one protocol), tagged with the
+target's stamp: last_updated for listing items, config_revision for SD
+target groups, which hold no status. A listing first selects only (id,
+stamp) of its targets, takes the fragments whose stamp still matches,
+selects and encodes only the other targets, and joins the fragments into
+the response body. Serialization work is thus proportional to the
+targets that changed since they were last served.
+
+Every write to a target moves its last_updated (the column's onupdate,
+including Core UPDATE statements), and every configuration change its
+config_revision (see app/services/data_version.py), so a fragment is
+never served for a newer row, in any worker. Writes made with SQL
+outside the application that keep the stamp are not seen until the
+fragment is evicted.
+
+The cache is bounded by FRAGMENT_CACHE_MAX_BYTES per worker process, and
+the least recently served fragments are evicted first; 0 disables it.
+"""
+import threading
+from collections import OrderedDict
+from flask import current_app
+from app.utils.dialect import in_ids
+from app.utils.json_provider import pretty_json
+
+# Estimated memory of one entry besides the fragment: key and value
+# tuples, the target ID and stamp objects, and the dict slot
+ENTRY_OVERHEAD = 320
+
+class FragmentCache:
+    """LRU cache of encoded JSON fragments by response shape and target"""
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        """Whether fragments are kept at all"""
+        return self.max_bytes > 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def lookup(self, shape, keys):
+        """
+        Get the cached fragments of a listing
+        
+        Args:
+            shape: Hashable identifying the JSON form of the fragments
+            keys: Sequence of rows starting with (id, stamp), in listing
+                order
+        
+        Returns:
+            Tuple of the list of fragments in key order, None where missing
+            or outdated, and the list of IDs to load
+        """
+        entries = self._entries
+        fragments = []
+        missing = []
+        with self._lock:
+            for key in keys:
+                entry = entries.get((shape, key[0]))
+                if entry is not None and entry[0] == key[1]:
+                    entries.move_to_end((shape, key[0]))
+                    fragments.append(entry[1])
+                else:
+                    fragments.append(None)
+                    missing.append(key[0])
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return fragments, missing
+    
+    def complete(self, shape, keys, fragments, rows, encode):
+        """
+        Encode and store the missing fragments of a listing
+        
+        Args:
+            shape: Shape given to lookup()
+            keys: Keys given to lookup()
+            fragments: Fragments returned by lookup()
+            rows: Rows of the missing targets (see missing_statement()),
+                starting with (id, stamp)
+            encode: Function taking a list of rows and returning their
+                fragments
+        
+        Returns:
+            List of the fragments of every key whose target still exists,
+            in key order
+        """
+        encoded = encode(rows)
+        self.store(shape, [row[0] for row in rows], [row[1] for row in rows], encoded)
+        loaded = dict(zip([row[0] for row in rows], encoded))
+        # Targets deleted since the keys were read have no row
+        return [fragment if fragment is not None else loaded.get(key[0])
+                for key, fragment in zip(keys, fragments)
+                if fragment is not None or key[0] in loaded]
+    
+    def store(self, shape, ids, stamps, fragments):
+        """
+        Store fragments, evicting the least recently used beyond the budget
+        
+        Args:
+            shape: Hashable identifying the JSON form of the fragments
+            ids: Target IDs
+            stamps: Their stamps, e.g. last_updated values
+            fragments: Their fragments
+        """
+        if not self.enabled:
+            return
+        entries = self._entries
+        with self._lock:
+            for target_id, stamp, fragment in zip(ids, stamps, fragments):
+                key = (shape, target_id)
+                previous = entries.get(key)
+                if previous is not None:
+                    # Replaced in place, then moved to the recent end
+                    self.size -= len(previous[1])
+                    entries.move_to_end(key)
+                else:
+                    self.size += ENTRY_OVERHEAD
+                entries[key] = (stamp, fragment)
+            self.size += sum(map(len, fragments))
+            while self.size > self.max_bytes and entries:
+                _, (_, fragment) = entries.popitem(last=False)
+                self.size -= len(fragment) + ENTRY_OVERHEAD
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop every fragment"""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+def missing_statement(statement, missing):
+    """
+    Restrict a listing SELECT to the targets missing from the cache
+    
+    Args:
+        statement: SELECT of the listing, with an id column
+        missing: IDs returned by FragmentCache.lookup()
+    
+    Returns:
+        SELECT of those targets, with the IDs bound as one parameter where
+        the database allows it, so that the query costs as many index
+        lookups as there are missing targets
+    """
+    return statement.where(in_ids(statement.selected_columns.id, missing))
+
+def join_fragments(fragments, pretty=False):
+    """
+    Join item fragments into a JSON array
+    
+    Args:
+        fragments: Encoded items, as written inside a jsonify()'d list
+        pretty: Whether the items are indented, as in debug mode
+    
+    Returns:
+        JSON array bytes, without the newline jsonify() appends
+    """
+    if not fragments:
+        return b'[]'
+    if pretty:
+        return b'[\n  ' + b',\n  '.join(fragments) + b'\n]'
+    return b'[' + b','.join(fragments) + b']'
+
+def encode_items(objects):
+    """
+    Encode objects as they are written as items of a jsonify()'d list
+    
+    Args:
+        objects: Iterable of JSON-serializable objects
+    
+    Returns:
+        List of fragments for join_fragments(), one per object
+    """
+    if pretty_json(current_app):
+        # '[\n  ' + item + '\n]', the item indented as a member of the list
+        return [current_app.json.dumps([obj], indent=2)[4:-2].encode() for obj in objects]
+    return [current_app.json.dumps([obj], separators=(',', ':'))[1:-1].encode() for obj in objects]
+
+def init_app(app):
+    """Attach a fragment cache to the application"""
+    cache = FragmentCache(app.config.get('FRAGMENT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    app.extensions['fragment_cache'] = cache
+    if 'metrics' in app.extensions:
+        registry = app.extensions['metrics']
+        registry.register_cache('fragments', cache)
+        registry.callback('fragment_cache_bytes', 'Estimated memory held by cached JSON fragments', (),
+                          lambda: {(): cache.size})
+        registry.callback('fragment_cache_evictions_total', 'JSON fragments evicted from the cache', (),
+                          lambda: {(): cache.evictions}, kind='counter')
+    return cache
+
+def get_fragment_cache():
+    """Get the fragment cache of the current application"""
+    return current_app.extensions['fragment_cache']
@@ -0,0 +1,80 @@
+"""
+Fast JSON provider for the Flask app.
+
+With orjson installed, jsonify() and app.json.dumps() encode with it
+instead of the json module, several times faster on large listings.
+Output keeps Flask's conventions: sorted keys, compact out of debug
+mode and indented by 2 in debug mode, datetimes as HTTP dates. Two
+things differ: non-ASCII characters are sent as UTF-8 instead of \\u
+escapes, and floats may be written differently (e.g. 1e16, not 1e+16).
+Calls with json.dumps() options orjson does not have are passed to the
+json module.
+
+JSON_PROVIDER selects the provider: 'auto' (orjson when installed),
+'orjson' or 'stdlib'.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider encoding with orjson"""
+    
+    # orjson always writes UTF-8
+    ensure_ascii = False
+    
+    def _options(self, indent=None):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        return option
+    
+    def dumps_bytes(self, obj, indent=None):
+        """
+        Serialize to UTF-8 bytes
+        
+        Args:
+            obj: The data to serialize
+            indent: None for compact output, or 2
+        
+        Returns:
+            Bytes, encoded by the json module if orjson cannot encode obj
+        """
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options(indent))
+        except TypeError:
+            # Non-string keys, integers beyond 64 bits, ...
+            separators = None if indent else (',', ':')
+            return super().dumps(obj, indent=indent, separators=separators).encode()
+    
+    def dumps(self, obj, **kwargs):
+        """Serialize to a string; options other than Flask's own go to the json module"""
+        indent = kwargs.get('indent')
+        if set(kwargs) == {'indent'} and indent == 2 or kwargs == {'separators': (',', ':')}:
+            return self.dumps_bytes(obj, indent).decode()
+        return super().dumps(obj, **kwargs)
+    
+    def response(self, *args, **kwargs):
+        """Serialize to a JSON response without a round trip through str"""
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = 2 if (self.compact is None and self._app.debug) or self.compact is False else None
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
+
+def init_app(app):
+    """Install the JSON provider selected by JSON_PROVIDER"""
+    choice = app.config.get('JSON_PROVIDER', 'auto')
+    if choice == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER=orjson but orjson is not installed')
+    if choice == 'orjson' or choice == 'auto' and orjson is not None:
+        app.json = OrjsonProvider(app)
+    return app.json
+
+def pretty_json(app):
+    """Whether jsonify() indents its output, as in debug mode"""
+    compact = app.json.compact
+    return (compact is None and app.debug) or compact is False
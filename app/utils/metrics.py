@@ -0,0 +1,323 @@
+"""
+Application metrics in the Prometheus text exposition format.
+
+A small registry of counters, gauges and histograms, kept dependency free
+and cheap enough to update on every request: recording a sample is a
+dictionary lookup for the label values and an in-place update under a
+lock. Values that already live elsewhere (cache hit counters, ingestion
+totals) are read when /metrics is scraped through callbacks instead of
+being mirrored on every change.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, g, request
+
+# Request latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Queries per request
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+def _format_value(value):
+    """Format a sample value the way Prometheus expects"""
+    if value == math.inf:
+        return '+Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+def _escape(value):
+    """Escape a label value"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _label_text(names, values, extra=''):
+    """Render {name="value",...} for one child"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    """Base class: one metric family with children per label values"""
+    kind = 'untyped'
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+    
+    def labels(self, *values):
+        """Get the child for the given label values, creating it on first use"""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def samples(self):
+        """Yield (suffix, label text, value) for every child"""
+        raise NotImplementedError
+    
+    def render(self):
+        """Render the HELP/TYPE header and all samples"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{labels} {_format_value(value)}')
+        return lines
+
+class _Value:
+    """Single float guarded by a lock"""
+    __slots__ = ('value', 'lock')
+    
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+    
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+    
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+    
+    def set(self, value):
+        self.value = value
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+    
+    def _new_child(self):
+        return _Value()
+    
+    def inc(self, amount=1):
+        """Increment the unlabelled counter"""
+        self._default.inc(amount)
+    
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield '', _label_text(self.labelnames, values), child.value
+
+class Gauge(Counter):
+    """Value that goes up and down"""
+    kind = 'gauge'
+    
+    def dec(self, amount=1):
+        """Decrement the unlabelled gauge"""
+        self._default.dec(amount)
+    
+    def set(self, value):
+        """Set the unlabelled gauge"""
+        self._default.set(value)
+
+class _HistogramValue:
+    """Bucket counts (not cumulative), sum and count of one histogram child"""
+    __slots__ = ('bounds', 'counts', 'sum', 'lock')
+    
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+    
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets"""
+    kind = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+    
+    def observe(self, value):
+        """Record an observation on the unlabelled histogram"""
+        self._default.observe(value)
+    
+    def samples(self):
+        for values, child in list(self._children.items()):
+            with child.lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                yield '_bucket', _label_text(self.labelnames, values, le), cumulative
+            yield '_sum', _label_text(self.labelnames, values), total
+            yield '_count', _label_text(self.labelnames, values), cumulative
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose samples are read from a function at scrape time"""
+    
+    def __init__(self, name, documentation, labelnames, callback, kind='gauge'):
+        self.callback = callback
+        self.kind = kind
+        super().__init__(name, documentation, labelnames)
+    
+    def _new_child(self):
+        return None
+    
+    def samples(self):
+        """The callback returns a dict of label value tuples to values"""
+        for values, value in self.callback().items():
+            yield '', _label_text(self.labelnames, values), value
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together"""
+    
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._caches = {}
+    
+    def register(self, metric):
+        """Add a metric, or return the already registered one of that name"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+    
+    def _get_or_create(self, name, factory):
+        """Look a metric up by name and only build it when missing"""
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self.register(factory())
+        return metric
+    
+    def counter(self, name, documentation, labelnames=()):
+        """Get or create a counter"""
+        return self._get_or_create(name, lambda: Counter(name, documentation, labelnames))
+    
+    def gauge(self, name, documentation, labelnames=()):
+        """Get or create a gauge"""
+        return self._get_or_create(name, lambda: Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """Get or create a histogram"""
+        return self._get_or_create(name, lambda: Histogram(name, documentation, labelnames, buckets))
+    
+    def callback(self, name, documentation, labelnames, callback, kind='gauge'):
+        """Register values read from a callback at scrape time"""
+        return self.register(CallbackMetric(name, documentation, labelnames, callback, kind))
+    
+    def register_cache(self, name, cache):
+        """
+        Expose hit, miss and hit ratio metrics of a cache
+        
+        Args:
+            name: Value of the cache label
+            cache: Object with hits and misses attributes
+        """
+        if not self._caches:
+            self.callback('cache_hits_total', 'Cache lookups answered from memory', ('cache',),
+                          lambda: self._cache_values('hits'), kind='counter')
+            self.callback('cache_misses_total', 'Cache lookups that had to load', ('cache',),
+                          lambda: self._cache_values('misses'), kind='counter')
+            self.callback('cache_hit_ratio', 'Share of cache lookups answered from memory',
+                          ('cache',), self._cache_ratios)
+        self._caches[name] = cache
+    
+    def _cache_values(self, attribute):
+        return {(name,): getattr(cache, attribute) for name, cache in self._caches.items()}
+    
+    def _cache_ratios(self):
+        ratios = {}
+        for name, cache in self._caches.items():
+            total = cache.hits + cache.misses
+            ratios[(name,)] = cache.hits / total if total else 0.0
+        return ratios
+    
+    def get(self, name):
+        """Get a registered metric by name, or None"""
+        return self._metrics.get(name)
+    
+    def render(self):
+        """Render all metrics in the text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+class RequestMetrics:
+    """Per-route request metrics recorded around every request"""
+    
+    def __init__(self, registry):
+        self.in_flight = registry.gauge(
+            'http_requests_in_flight', 'Requests currently being served', ('route',))
+        self.duration = registry.histogram(
+            'http_request_duration_seconds', 'Request latency', ('route', 'method', 'status'))
+        self.queries = registry.histogram(
+            'db_queries_per_request', 'SQL statements executed per request', ('route',),
+            buckets=QUERY_COUNT_BUCKETS)
+        self.query_duration = registry.histogram(
+            'db_query_duration_seconds_per_request', 'Time spent in SQL per request', ('route',))
+    
+    def start(self, route):
+        """Record the start of a request; returns the state for finish()"""
+        self.in_flight.labels(route).inc()
+        return route, time.perf_counter()
+    
+    def finish(self, state, method, status, counter=None):
+        """Record the end of a request started with start()"""
+        route, started = state
+        self.duration.labels(route, method, status).observe(time.perf_counter() - started)
+        self.in_flight.labels(route).dec()
+        if counter is not None:
+            self.queries.labels(route).observe(counter.count)
+            self.query_duration.labels(route).observe(counter.duration)
+
+def init_app(app):
+    """
+    Attach a metrics registry and record request metrics
+    
+    With METRICS_ENABLED off the registry still exists, so code recording
+    metrics does not need to check, but requests are not timed.
+    """
+    registry = MetricsRegistry()
+    app.extensions['metrics'] = registry
+    if not app.config.get('METRICS_ENABLED', True):
+        return registry
+    
+    request_metrics = RequestMetrics(registry)
+    
+    @app.before_request
+    def start_request_metrics():
+        """Time the request and count it as in flight"""
+        rule = request.url_rule
+        g.request_metrics = request_metrics.start(rule.rule if rule is not None else 'unmatched')
+    
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        """Record latency, status and query statistics"""
+        state = g.pop('request_metrics', None)
+        if state is not None:
+            status = g.pop('response_status', 500 if exc is not None else 200)
+            request_metrics.finish(state, request.method, status, g.get('query_counter'))
+    
+    @app.after_request
+    def remember_status(response):
+        """Keep the status code for the teardown handler"""
+        g.response_status = response.status_code
+        return response
+    
+    return registry
+
+def get_metrics():
+    """Get the metrics registry of the current application"""
+    return current_app.extensions['metrics']
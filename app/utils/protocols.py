@@ -0,0 +1,76 @@
+"""
+Mapping between target probe types and Blackbox protocols.
+"""
+
+# Blackbox exporter module probing each protocol: the params.module of
+# the matching Prometheus job, the module label of SD target groups and
+# the module the exporter sync asks for. Override with
+# BLACKBOX_EXPORTER_MODULES
+DEFAULT_EXPORTER_MODULES = {
+    'http': 'http_2xx',
+    'tcp': 'tcp_connect',
+    'icmp': 'icmp',
+}
+
+# Keywords in Target.probe_type that select each protocol, in priority order
+PROTOCOL_KEYWORDS = {
+    'http': ('http', 'web', 'url'),
+    'tcp': ('tcp', 'socket'),
+    'icmp': ('icmp', 'ping'),
+}
+
+def matches_protocol(probe_type, protocol):
+    """
+    Check whether a target with this probe type is served for a protocol
+    
+    Args:
+        probe_type: Target.probe_type value (any case, may be None)
+        protocol: Protocol name, e.g. 'icmp', 'http' or 'tcp'
+        
+    Returns:
+        True if the protocol name or one of its keywords occurs in the probe type
+    """
+    probe_type = probe_type.lower() if probe_type else ''
+    protocol = protocol.lower()
+    return protocol in probe_type or any(
+        keyword in probe_type for keyword in PROTOCOL_KEYWORDS.get(protocol, ())
+    )
+
+def target_protocols(probe_type):
+    """Get every protocol matching a probe type, in priority order"""
+    return [protocol for protocol in PROTOCOL_KEYWORDS if matches_protocol(probe_type, protocol)]
+
+def target_protocol(probe_type):
+    """Get the first protocol matching a probe type, or None"""
+    protocols = target_protocols(probe_type)
+    return protocols[0] if protocols else None
+
+def exporter_module(protocol, modules=None):
+    """
+    Get the blackbox exporter module probing a protocol
+    
+    Args:
+        protocol: Lowercase protocol name
+        modules: Overrides of DEFAULT_EXPORTER_MODULES, e.g. the
+            BLACKBOX_EXPORTER_MODULES setting
+        
+    Returns:
+        The module name; the protocol name itself when none is configured
+    """
+    return (modules or {}).get(protocol) or DEFAULT_EXPORTER_MODULES.get(protocol, protocol)
+
+def sd_target_address(address, port, protocol):
+    """
+    Get the address Prometheus passes to the exporter as ?target=
+    
+    Args:
+        address: Target.address
+        port: Target.port, appended for TCP targets
+        protocol: Protocol the target is served for
+        
+    Returns:
+        The target parameter, e.g. '10.0.0.1:5432' for TCP
+    """
+    if protocol == 'tcp' and port:
+        return f"{address}:{port}"
+    return address
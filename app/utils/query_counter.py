@@ -0,0 +1,324 @@
+"""
+Request-scoped SQL query counting, N+1 detection and the slow query log.
+
+Every statement is attributed to the Flask endpoint serving the request
+and, inside service code wrapped with tracked(), to the named operation
+(e.g. 'TargetService.get_statistics'). Statements slower than
+SLOW_QUERY_THRESHOLD_MS are logged with that attribution, and views can
+be held to a query count and time budget per request.
+"""
+import logging
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from flask import g, current_app, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+# Counters currently collecting queries in this context (innermost last)
+_active_counters = ContextVar('active_query_counters', default=())
+
+# Named operation the statements executed in this context belong to
+_current_operation = ContextVar('query_operation', default=None)
+
+# Slow statements are logged here; route it to a file with SLOW_QUERY_LOG_FILE
+slow_query_log = logging.getLogger('app.slow_queries')
+
+# One executed statement: parameter shape is 'N' bound values or 'ROWSxN'
+# for executemany(); rowcount is -1 when the driver does not report it
+# (SELECT on SQLite)
+QueryRecord = namedtuple('QueryRecord', 'statement duration rowcount parameters endpoint operation')
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request exceeds its query budget and QUERY_BUDGET_ENFORCE is set"""
+
+class QueryCounter:
+    """Collects the statements executed while it is active"""
+    
+    def __init__(self):
+        self.statements = []
+        self.records = []
+        self.duration = 0.0
+    
+    @property
+    def count(self):
+        """Number of statements executed"""
+        return len(self.statements)
+    
+    def record(self, statement, duration, rowcount=-1, parameters='', endpoint=None, operation=None):
+        """Record one executed statement and its duration in seconds"""
+        self.statements.append(statement)
+        self.records.append(QueryRecord(statement, duration, rowcount, parameters, endpoint, operation))
+        self.duration += duration
+    
+    def repeated(self, threshold):
+        """
+        Find statements executed at least `threshold` times
+        
+        The same SQL text issued over and over within one request is the
+        signature of an N+1 pattern (one lazy load per row).
+        
+        Returns:
+            Dictionary of SQL text to execution count
+        """
+        counts = {}
+        for statement in self.statements:
+            counts[statement] = counts.get(statement, 0) + 1
+        return {statement: n for statement, n in counts.items() if n >= threshold}
+    
+    def by_operation(self):
+        """
+        Summarize statements per operation (or endpoint outside operations)
+        
+        Returns:
+            Dictionary of name to (statement count, duration in seconds)
+        """
+        summary = {}
+        for record in self.records:
+            name = record.operation or record.endpoint or '-'
+            count, duration = summary.get(name, (0, 0.0))
+            summary[name] = (count + 1, duration + record.duration)
+        return summary
+
+def start_counter():
+    """Activate a new counter; returns (counter, token) for stop_counter()"""
+    counter = QueryCounter()
+    token = _active_counters.set(_active_counters.get() + (counter,))
+    return counter, token
+
+def stop_counter(token):
+    """Deactivate the counter started with the given token"""
+    _active_counters.reset(token)
+
+@contextmanager
+def count_queries():
+    """Count the queries executed inside a with block"""
+    counter, token = start_counter()
+    try:
+        yield counter
+    finally:
+        stop_counter(token)
+
+@contextmanager
+def uncounted():
+    """Keep the statements of a with block out of every active counter"""
+    token = _active_counters.set(())
+    try:
+        yield
+    finally:
+        _active_counters.reset(token)
+
+@contextmanager
+def operation(name):
+    """Attribute the statements executed inside a with block to `name`"""
+    token = _current_operation.set(name)
+    try:
+        yield
+    finally:
+        _current_operation.reset(token)
+
+def tracked(name=None):
+    """
+    Decorator attributing a function's statements to an operation
+    
+    Args:
+        name: Operation name, defaults to the function's qualified name
+            (e.g. 'TargetService.get_statistics')
+    """
+    def decorator(function):
+        label = name or function.__qualname__
+        
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with operation(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def query_budget(max_queries=None, max_ms=None):
+    """
+    Decorator overriding the per-request query budget of a view
+    
+    Args:
+        max_queries: Maximum number of statements per request
+        max_ms: Maximum total statement time per request in milliseconds
+    """
+    def decorator(view):
+        view.query_budget = (max_queries, max_ms)
+        return view
+    return decorator
+
+@contextmanager
+def assert_max_queries(limit, n_plus_one_threshold=None, max_ms=None):
+    """
+    Fail when a block executes more than `limit` queries
+    
+    Args:
+        limit: Maximum number of statements allowed
+        n_plus_one_threshold: Also fail when any statement repeats this many times
+        max_ms: Also fail when the statements take longer than this in total
+    """
+    with count_queries() as counter:
+        yield counter
+    
+    if counter.count > limit:
+        raise AssertionError(
+            f'Expected at most {limit} queries, got {counter.count}:\n' + '\n'.join(counter.statements)
+        )
+    if n_plus_one_threshold:
+        repeated = counter.repeated(n_plus_one_threshold)
+        if repeated:
+            raise AssertionError(f'Possible N+1 queries: {repeated}')
+    if max_ms is not None and counter.duration * 1000 > max_ms:
+        raise AssertionError(f'Expected at most {max_ms} ms of queries, took {counter.duration * 1000:.1f} ms')
+
+def parameter_shape(parameters, executemany):
+    """Describe bound parameters without their values"""
+    if executemany:
+        return f'{len(parameters)}x{len(parameters[0]) if parameters else 0}'
+    return str(len(parameters)) if parameters else '0'
+
+def current_endpoint():
+    """Endpoint of the request being served, or None outside requests"""
+    return request.endpoint if has_request_context() else None
+
+def _log_slow_query(statement, duration, rowcount, parameters, endpoint, name):
+    """Write one slow query log line and count it on /metrics"""
+    slow_query_log.warning(
+        'Slow query: %.1f ms, rows=%s, params=%s, endpoint=%s, operation=%s: %s',
+        duration * 1000, rowcount, parameters, endpoint or '-', name or '-', ' '.join(statement.split())
+    )
+    if has_app_context():
+        registry = current_app.extensions.get('metrics')
+        if registry is not None:
+            registry.counter('db_slow_queries_total', 'Statements slower than SLOW_QUERY_THRESHOLD_MS',
+                             ('operation',)).labels(name or endpoint or '-').inc()
+
+def install(engine, slow_threshold=None):
+    """
+    Register cursor execution listeners on an engine
+    
+    Args:
+        engine: SQLAlchemy engine
+        slow_threshold: Log statements taking at least this many seconds
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        """Remember when the statement started"""
+        if slow_threshold is not None or _active_counters.get():
+            conn.info.setdefault('query_start', []).append(time.perf_counter())
+    
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        """Attribute the statement to every active counter and log it when slow"""
+        counters = _active_counters.get()
+        if not counters and slow_threshold is None:
+            return
+        starts = conn.info.get('query_start')
+        duration = time.perf_counter() - starts.pop() if starts else 0.0
+        is_slow = slow_threshold is not None and duration >= slow_threshold
+        if not counters and not is_slow:
+            return
+        
+        shape = parameter_shape(parameters, executemany)
+        endpoint = current_endpoint()
+        name = _current_operation.get()
+        rowcount = cursor.rowcount
+        for counter in counters:
+            counter.record(statement, duration, rowcount, shape, endpoint, name)
+        if is_slow:
+            _log_slow_query(statement, duration, rowcount, shape, endpoint, name)
+
+def request_budget(app, endpoint):
+    """
+    Get the (max_queries, max_ms) budget of an endpoint
+    
+    A view's query_budget() overrides QUERY_BUDGET_COUNT/QUERY_BUDGET_MS
+    field by field.
+    """
+    max_queries = app.config.get('QUERY_BUDGET_COUNT')
+    max_ms = app.config.get('QUERY_BUDGET_MS')
+    view = app.view_functions.get(endpoint) if endpoint else None
+    override = getattr(view, 'query_budget', None)
+    if override is not None:
+        max_queries = override[0] if override[0] is not None else max_queries
+        max_ms = override[1] if override[1] is not None else max_ms
+    return max_queries, max_ms
+
+def check_budget(app, counter, endpoint):
+    """
+    Compare a request's queries to its budget
+    
+    Returns:
+        Description of the overrun, or None within budget
+    """
+    max_queries, max_ms = request_budget(app, endpoint)
+    problems = []
+    if max_queries is not None and counter.count > max_queries:
+        problems.append(f'{counter.count} queries (budget {max_queries})')
+    if max_ms is not None and counter.duration * 1000 > max_ms:
+        problems.append(f'{counter.duration * 1000:.1f} ms in SQL (budget {max_ms} ms)')
+    if not problems:
+        return None
+    
+    breakdown = ', '.join(f'{name}: {count} in {duration * 1000:.1f} ms'
+                          for name, (count, duration) in counter.by_operation().items())
+    return f"{endpoint} exceeded its query budget with {' and '.join(problems)} [{breakdown}]"
+
+def init_app(app, engines):
+    """
+    Count queries per request
+    
+    Adds X-Query-Count/X-Query-Time-Ms response headers when
+    QUERY_STATS_HEADERS is set, logs a warning when a statement repeats
+    QUERY_N_PLUS_ONE_THRESHOLD times within one request, logs statements
+    slower than SLOW_QUERY_THRESHOLD_MS and checks the per-request budget
+    (QUERY_BUDGET_COUNT/QUERY_BUDGET_MS), raising QueryBudgetExceeded
+    instead of logging when QUERY_BUDGET_ENFORCE is set.
+    """
+    threshold_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    for engine in engines:
+        install(engine, threshold_ms / 1000 if threshold_ms is not None else None)
+    
+    log_file = app.config.get('SLOW_QUERY_LOG_FILE')
+    if log_file and not any(getattr(handler, 'baseFilename', None) == log_file
+                            for handler in slow_query_log.handlers):
+        handler = logging.FileHandler(log_file)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        slow_query_log.addHandler(handler)
+    
+    @app.before_request
+    def start_request_counter():
+        """Collect the queries of this request"""
+        g.query_counter, g.query_counter_token = start_counter()
+    
+    @app.after_request
+    def report_request_queries(response):
+        """Expose and check the query count of this request"""
+        counter = g.get('query_counter')
+        if counter is None:
+            return response
+        
+        if current_app.config.get('QUERY_STATS_HEADERS'):
+            response.headers['X-Query-Count'] = str(counter.count)
+            response.headers['X-Query-Time-Ms'] = f'{counter.duration * 1000:.3f}'
+        
+        threshold = current_app.config.get('QUERY_N_PLUS_ONE_THRESHOLD')
+        if threshold:
+            for statement, n in counter.repeated(threshold).items():
+                current_app.logger.warning('Possible N+1: %d executions of %s', n, statement)
+        
+        overrun = check_budget(current_app, counter, request.endpoint)
+        if overrun:
+            if current_app.config.get('QUERY_BUDGET_ENFORCE'):
+                raise QueryBudgetExceeded(overrun)
+            current_app.logger.warning(overrun)
+        return response
+    
+    @app.teardown_request
+    def stop_request_counter(exc):
+        """Stop collecting once the request is done"""
+        token = g.pop('query_counter_token', None)
+        if token is not None:
+            stop_counter(token)
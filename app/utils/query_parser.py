@@ -2,8 +2,9 @@
 Utilities for parsing search queries.
 """
 import re
-from sqlalchemy import and_, or_
-from app.models.target import Target
+from sqlalchemy import and_, or_, select
+from app.models.target import Target, target_assignees
+from app.utils.dialect import text_like
 
 def parse_search_query(query_string):
     """
@@ -46,12 +47,35 @@ def build_filter_conditions(parsed_query):
     for field, value in parsed_query.items():
         if field == 'enabled' and value.lower() in ('true', 'false'):
             conditions.append(Target.enabled == (value.lower() == 'true'))
+        elif field in ('assignees', 'assignee'):
+            conditions.append(assignee_condition(value))
         elif hasattr(Target, field):
             # Handle wildcard searches with %
             if '*' in value:
                 value = value.replace('*', '%')
-                conditions.append(getattr(Target, field).like(value))
+                conditions.append(text_like(getattr(Target, field), value))
             else:
                 conditions.append(getattr(Target, field) == value)
     
-    return conditions
\ No newline at end of file
+    return conditions
+
+def assignee_condition(value):
+    """
+    Build a filter matching targets assigned to a team
+    
+    Matches whole assignee names through the target_assignees index, so
+    'team-network' does not match 'team-network-legacy'. A '*' wildcard
+    matches name prefixes/suffixes instead.
+    
+    Args:
+        value: Assignee name, optionally with '*' wildcards
+        
+    Returns:
+        SQLAlchemy filter condition on Target
+    """
+    if '*' in value:
+        match = text_like(target_assignees.c.assignee, value.replace('*', '%'))
+    else:
+        match = target_assignees.c.assignee == value
+    
+    return Target.id.in_(select(target_assignees.c.target_id).where(match))
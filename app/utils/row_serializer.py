@@ -0,0 +1,202 @@
+"""
+Serialize Core rows to JSON without building ORM objects or dictionaries.
+
+A RowSerializer is compiled once for a list of (key, column) pairs: the
+text around each value (key, separators, indentation) is computed up
+front, and each column gets an encoder chosen from its type and
+nullability. Rows are encoded a column at a time, and a whole array is
+assembled with slice assignments into one list and a single join, so
+the per-row work stays in C. Under the orjson provider, rows are instead
+zipped with the keys and handed to orjson, which is faster still. The
+output is byte-identical to jsonify() of the dictionaries holding the
+same values (e.g. Target.to_dict()), under the settings of the app's
+JSON provider.
+"""
+import json
+from json.encoder import encode_basestring, encode_basestring_ascii
+from flask import current_app
+from sqlalchemy import Boolean, DateTime, Integer
+from app.utils.json_provider import OrjsonProvider, orjson, pretty_json
+
+# JSON of Boolean column values
+_BOOLEANS = {True: 'true', False: 'false', None: 'null'}
+
+_INT_TYPES = {int}
+_INT_OR_NONE_TYPES = {int, type(None)}
+
+def _value_encoder(ensure_ascii):
+    """
+    Get the function writing any one value as JSON, as the json module does
+    
+    For values a column's type does not promise, e.g. a float stored in an
+    Integer column (SQLite keeps what it is given) or a bool.
+    """
+    def encode(value):
+        if value is None:
+            return 'null'
+        if value is True or value is False:
+            return 'true' if value else 'false'
+        return json.dumps(value, ensure_ascii=ensure_ascii)
+    return encode
+
+def _column_encoder(column, encode_str):
+    """
+    Get the function writing a whole column of values as JSON
+    
+    Columns holding only what their type promises are mapped straight
+    through the C encoders, without a Python call per value.
+    
+    Args:
+        column: The selected column
+        encode_str: JSON string encoder
+    
+    Returns:
+        Function taking a sequence of values and returning their JSON texts
+    """
+    column_type = column.type
+    encode_value = _value_encoder(encode_str is encode_basestring_ascii)
+    if isinstance(column_type, Boolean):
+        return lambda values: [_BOOLEANS[value] for value in values]
+    if isinstance(column_type, Integer):
+        def encode_integers(values):
+            # Checked per column: int.__repr__ rejects floats, and writes
+            # bools as 'True'
+            types = set(map(type, values))
+            if types <= _INT_TYPES:
+                return map(int.__repr__, values)
+            if types <= _INT_OR_NONE_TYPES:
+                return ['null' if value is None else int.__repr__(value) for value in values]
+            return [encode_value(value) for value in values]
+        return encode_integers
+    if isinstance(column_type, DateTime):
+        # As to_dict() writes them: ISO 8601 strings
+        return lambda values: ['null' if value is None else encode_str(value.isoformat()) for value in values]
+    if not column.nullable:
+        return lambda values: map(encode_str, values)
+    return lambda values: ['null' if value is None else encode_str(value) for value in values]
+
+class RowSerializer:
+    """Writes rows of fixed columns as a JSON array of objects"""
+    
+    def __init__(self, fields, ensure_ascii=True, sort_keys=True, pretty=False, use_orjson=False):
+        """
+        Compile the serializer
+        
+        Args:
+            fields: Sequence of (key, column) pairs in dictionary order
+            ensure_ascii: Escape non-ASCII characters, as the json module does
+            sort_keys: Write keys in sorted order
+            pretty: Indent like jsonify() in debug mode
+            use_orjson: Encode with orjson, as OrjsonProvider does
+                (ensure_ascii must be off)
+        """
+        encode_str = encode_basestring_ascii if ensure_ascii else encode_basestring
+        if sort_keys:
+            fields = sorted(fields, key=lambda field: field[0])
+        self.keys = [key for key, _ in fields]
+        self.columns = [column for _, column in fields]
+        self.orjson_option = None
+        if use_orjson:
+            self.orjson_option = orjson.OPT_SORT_KEYS if sort_keys else 0
+            if pretty:
+                self.orjson_option |= orjson.OPT_INDENT_2
+        self.encoders = [_column_encoder(column, encode_str) for column in self.columns]
+        self.pretty = pretty
+        
+        # Text before each value, and after the last one. Objects are items
+        # of an indented list when pretty: members 4 deep, braces 2
+        keys = [encode_str(key) for key, _ in fields]
+        if pretty:
+            self.prefixes = ['{\n    ' + f'{keys[0]}: '] + [f',\n    {key}: ' for key in keys[1:]]
+            self.suffix = '\n  }'
+            self.separator = ',\n  '
+        else:
+            self.prefixes = ['{' + f'{keys[0]}:'] + [f',{key}:' for key in keys[1:]]
+            self.suffix = '}'
+            self.separator = ','
+    
+    def dumps_rows(self, rows):
+        """
+        Serialize rows as a JSON array
+        
+        Args:
+            rows: Sequence of rows selected with self.columns
+            
+        Returns:
+            UTF-8 JSON bytes, without the newline jsonify() appends
+        """
+        if self.orjson_option is not None:
+            keys = self.keys
+            return orjson.dumps([dict(zip(keys, row)) for row in rows], option=self.orjson_option)
+        
+        count = len(rows)
+        if not count:
+            return b'[]'
+        
+        # Row r's texts go to slots r*width .. r*width+width-1: a prefix and
+        # a value per column, then the suffix and separator
+        width = 2 * len(self.encoders) + 1
+        parts = [None] * (count * width)
+        for index, (prefix, encode, values) in enumerate(zip(self.prefixes, self.encoders, zip(*rows))):
+            parts[2 * index::width] = [prefix] * count
+            parts[2 * index + 1::width] = encode(values)
+        parts[width - 1::width] = [self.suffix + self.separator] * count
+        parts[-1] = self.suffix
+        
+        if self.pretty:
+            return ('[\n  ' + ''.join(parts) + '\n]').encode()
+        return ('[' + ''.join(parts) + ']').encode()
+
+    def dumps_fragments(self, rows):
+        """
+        Serialize rows as separate items of a JSON array
+        
+        Args:
+            rows: Sequence of rows selected with self.columns
+            
+        Returns:
+            List of UTF-8 JSON bytes per row, as written inside the array of
+            dumps_rows() (see app/utils/fragment_cache.py)
+        """
+        if self.orjson_option is not None:
+            keys = self.keys
+            fragments = [orjson.dumps(dict(zip(keys, row)), option=self.orjson_option) for row in rows]
+            if self.pretty:
+                # Members of a list are indented one level deeper
+                return [fragment.replace(b'\n', b'\n  ') for fragment in fragments]
+            # orjson's bytes keep their whole output buffer allocated (about
+            # 1 KiB); copies hold only their length while they are cached
+            return [bytes(memoryview(fragment)) for fragment in fragments]
+        
+        count = len(rows)
+        if not count:
+            return []
+        width = 2 * len(self.encoders) + 1
+        parts = [None] * (count * width)
+        for index, (prefix, encode, values) in enumerate(zip(self.prefixes, self.encoders, zip(*rows))):
+            parts[2 * index::width] = [prefix] * count
+            parts[2 * index + 1::width] = encode(values)
+        parts[width - 1::width] = [self.suffix] * count
+        return [''.join(parts[start:start + width]).encode() for start in range(0, len(parts), width)]
+
+def get_row_serializer(name, fields):
+    """
+    Get the serializer of `fields` for the current app's JSON provider
+    
+    Compiled once per name and provider settings, and kept in the app.
+    
+    Args:
+        name: Name of the field list, e.g. 'target'
+        fields: Sequence of (key, column) pairs
+    
+    Returns:
+        RowSerializer
+    """
+    provider = current_app.json
+    settings = (provider.ensure_ascii, provider.sort_keys, pretty_json(current_app),
+                isinstance(provider, OrjsonProvider))
+    serializers = current_app.extensions.setdefault('row_serializers', {})
+    serializer = serializers.get((name, settings))
+    if serializer is None:
+        serializer = serializers[(name, settings)] = RowSerializer(fields, *settings)
+    return serializer
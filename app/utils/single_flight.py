@@ -0,0 +1,132 @@
+"""
+Request coalescing (single-flight) for expensive read endpoints.
+
+When the SD data changes, every Prometheus server's next refresh arrives
+within seconds, and each request would run the same query and
+serialization. With single-flight the first request for a key computes
+the result while concurrent requests for the same key wait for it and
+share it. Keys include the data version (see app/services/data_version.py),
+so a request that arrives after a write never gets a result computed
+from older data than its own view.
+
+Coalescing is per worker process: it joins requests served by threads of
+one process (gthread workers, the threaded development server), or by
+the event loop of the ASGI app (do_async()). Nothing is kept once the
+computation finishes.
+"""
+import asyncio
+import threading
+from flask import current_app
+
+class _Call:
+    """One in-flight computation and its outcome"""
+    __slots__ = ('done', 'result', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Runs a function once for all concurrent callers with the same key"""
+    
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+    
+    def do(self, key, function):
+        """
+        Call function(), or wait for the in-flight call with the same key
+        
+        Args:
+            key: Hashable key identifying the computation
+            function: Callable without arguments
+        
+        Returns:
+            The function's result, shared by every caller that waited for it
+        
+        Raises:
+            Whatever the function raised, in the caller that ran it and in
+            every caller that waited for it
+        """
+        if not self.enabled:
+            self.misses += 1
+            return function()
+        
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.misses += 1
+            else:
+                leader = False
+                self.hits += 1
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+    
+    async def do_async(self, key, function):
+        """
+        Await function(), or the in-flight call with the same key
+        
+        The asyncio counterpart of do(); all callers must run on one event loop.
+        
+        Args:
+            key: Hashable key identifying the computation
+            function: Coroutine function without arguments
+        
+        Returns:
+            The coroutine's result, shared by every caller that waited for it
+        """
+        if not self.enabled:
+            self.misses += 1
+            return await function()
+        
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(function())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self.misses += 1
+        else:
+            self.hits += 1
+        
+        # A caller that disconnects must not cancel the computation of the others
+        return await asyncio.shield(task)
+    
+    def in_flight(self):
+        """Number of computations currently running"""
+        return len(self._calls) + len(self._tasks)
+
+def init_app(app):
+    """Attach a single-flight group to the application"""
+    flight = SingleFlight(app.config.get('SINGLE_FLIGHT_ENABLED', True))
+    app.extensions['single_flight'] = flight
+    if 'metrics' in app.extensions:
+        registry = app.extensions['metrics']
+        registry.register_cache('single_flight', flight)
+        registry.callback('single_flight_in_flight', 'Coalesced computations currently running', (),
+                          lambda: {(): flight.in_flight()})
+    return flight
+
+def get_single_flight():
+    """Get the single-flight group of the current application"""
+    return current_app.extensions['single_flight']
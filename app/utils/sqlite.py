@@ -0,0 +1,30 @@
+"""
+SQLite connection tuning.
+"""
+from sqlalchemy import event
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """
+    Run PRAGMA statements on every new connection of a SQLite engine
+    
+    Args:
+        engine: SQLAlchemy engine, ignored unless it uses SQLite
+        pragmas: Dictionary of PRAGMA name to value
+    """
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    
+    statements = [f'PRAGMA {name}={value}' for name, value in pragmas.items()]
+    
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Apply the configured PRAGMAs to a fresh DBAPI connection"""
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+    
+    # Connections opened before the listener was registered
+    engine.dispose()
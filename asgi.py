@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point for the Blackbox Target Manager application.
+
+Serve with an ASGI server, e.g. `uvicorn asgi:app --workers 4`.
+"""
+from app import create_app
+from app.asgi import create_asgi_app
+
+# Create the Flask application and serve it through the ASGI app
+app = create_asgi_app(create_app())
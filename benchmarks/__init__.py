@@ -0,0 +1,5 @@
+"""
+Benchmark scripts package.
+"""
+# This file is intentionally left mostly empty,
+# as we're using a package structure for benchmarks.
@@ -0,0 +1,134 @@
+"""
+Idle connection cost of the ASGI app: long-polling SD requests and event streams.
+
+Opens --connections connections to the ASGI app in-process, half of them
+long-polling GET /api/sd/http?index=<version>&wait=600 and half GET
+/api/events streams, the way an ASGI server would call the app for each
+accepted connection. Once all are waiting, reports the Python memory
+they hold (tracemalloc) per connection and the number of threads. Then a
+target is updated through the app, and it reports how long it took to
+answer every long poll and deliver the event to every stream, and how
+many times the SD body was built for all the woken requests.
+
+Socket buffers of the server are not included; with a WSGI server each
+of these connections would hold a worker thread instead.
+
+Usage:
+    python -m benchmarks.bench_asgi [--connections 5000] [--targets 1000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import tracemalloc
+from app.asgi import create_asgi_app
+from benchmarks.common import make_app, seed_targets, quiet
+
+class Connection:
+    """One client connection driving the ASGI app through receive() and send()"""
+    
+    def __init__(self, method, path, query=b'', body=b''):
+        self.scope = {
+            'type': 'http', 'method': method, 'path': path, 'query_string': query, 'root_path': '',
+            'headers': [(b'content-type', b'application/json')] if body else [],
+            'http_version': '1.1', 'scheme': 'http', 'server': ('bench', 80), 'client': ('127.0.0.1', 0),
+        }
+        self.body = body
+        self.requested = False
+        self.closed = asyncio.Event()
+        self.received = asyncio.Event()
+        self.status = None
+        self.headers = {}
+        self.chunks = []
+    
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': self.body, 'more_body': False}
+        await self.closed.wait()
+        return {'type': 'http.disconnect'}
+    
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            self.headers = dict(message['headers'])
+        else:
+            self.chunks.append(message.get('body', b''))
+            self.received.set()
+
+async def request(asgi, method, path, query=b'', body=b''):
+    """Run one request to completion"""
+    connection = Connection(method, path, query, body)
+    await asgi(connection.scope, connection.receive, connection.send)
+    return connection
+
+async def run(asgi, flight, connections):
+    """Open the idle connections, measure them, then wake them all with one write"""
+    response = await request(asgi, 'GET', '/api/sd/http')
+    version = int(response.headers[b'x-data-version'])
+    threads_before = threading.active_count()
+    
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    polls = [Connection('GET', '/api/sd/http', f'index={version}&wait=600'.encode())
+             for _ in range(connections // 2)]
+    streams = [Connection('GET', '/api/events') for _ in range(connections - len(polls))]
+    tasks = [asyncio.ensure_future(asgi(c.scope, c.receive, c.send)) for c in polls + streams]
+    # Let every connection reach its wait, and every stream send its first events
+    while not all(stream.received.is_set() for stream in streams):
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)
+    idle_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    threads_idle = threading.active_count()
+    for stream in streams:
+        stream.received.clear()
+    
+    builds = flight.misses
+    started = time.perf_counter()
+    response = await request(asgi, 'PUT', '/api/targets/1', body=json.dumps({'zone': 'bench'}).encode())
+    assert response.status == 200, response.status
+    await asyncio.gather(*tasks[:len(polls)])
+    polls_ms = (time.perf_counter() - started) * 1000
+    await asyncio.gather(*(stream.received.wait() for stream in streams))
+    streams_ms = (time.perf_counter() - started) * 1000
+    
+    answered = sum(1 for poll in polls if poll.status == 200
+                   and int(poll.headers[b'x-data-version']) == version + 1)
+    for stream in streams:
+        stream.closed.set()
+    await asyncio.gather(*tasks)
+    await asgi.close()
+    
+    return {
+        'connections': connections,
+        'idle_kb_per_connection': round(idle_bytes / connections / 1024, 2),
+        'threads_before': threads_before,
+        'threads_with_idle_connections': threads_idle,
+        'long_polls_answered': answered,
+        'all_long_polls_answered_ms': round(polls_ms, 1),
+        'all_streams_notified_ms': round(streams_ms, 1),
+        'sd_builds_for_woken_polls': flight.misses - builds,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--connections', type=int, default=5000)
+    parser.add_argument('--targets', type=int, default=1000)
+    args = parser.parse_args()
+    
+    app, db_path = make_app(QUERY_BUDGET_ENFORCE=False)
+    try:
+        seed_targets(app, args.targets)
+        asgi = create_asgi_app(app)
+        with quiet():
+            result = asyncio.run(run(asgi, app.extensions['single_flight'], args.connections))
+        result['database_driver'] = asgi.database.driver
+        print(json.dumps(result, indent=2))
+    finally:
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Cross-worker cache coherence: how long other workers serve stale data.
+
+Starts --workers reader processes on one seeded SQLite database, each
+with its own application (and so its own in-memory caches), like
+Gunicorn workers. Each polls GET /api/probes, served from the per-worker
+probe registry, every --poll seconds. The parent process renames a probe
+--rounds times, --pause seconds apart, and each reader records when it
+first serves the new name.
+
+Staleness is the time from the commit of a rename to the first response
+that shows it. With data versions it is bounded by
+DATA_VERSION_CHECK_INTERVAL plus the poll period. --interval sets that
+interval; a large value shows the staleness the caches' own TTLs alone
+would allow.
+
+Usage:
+    python -m benchmarks.bench_coherence [--workers 4] [--interval 1.0] [--poll 0.05]
+                                         [--rounds 10] [--pause 1.5]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from app import db
+from benchmarks.common import make_app, seed_targets, quiet, percentile
+
+PROBE_ID = 1
+
+def reader(db_path, interval, poll, stop, ready, queue):
+    """Poll the probe list and record when each probe name was first served"""
+    app, _ = make_app(db_path, DATA_VERSION_CHECK_INTERVAL=interval)
+    client = app.test_client()
+    first_seen = {}
+    ready.release()
+    while not stop.is_set():
+        with quiet():
+            response = client.get('/api/probes')
+        now = time.time()
+        for probe in response.get_json():
+            if probe['id'] == PROBE_ID:
+                first_seen.setdefault(probe['name'], now)
+        time.sleep(poll)
+    queue.put(first_seen)
+
+def rename_probe(app, name):
+    """Rename the probe through the ORM, as a write in another worker would"""
+    from app.models.probe import Probe
+    
+    with app.app_context():
+        probe = db.session.get(Probe, PROBE_ID)
+        probe.name = name
+        db.session.commit()
+        db.session.remove()
+    return time.time()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=1.0, help='DATA_VERSION_CHECK_INTERVAL of the readers')
+    parser.add_argument('--poll', type=float, default=0.05, help='Seconds between a reader\'s requests')
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--pause', type=float, default=1.5, help='Seconds between renames')
+    args = parser.parse_args()
+    
+    app, db_path = make_app()
+    seed_targets(app, 1000)
+    
+    stop = multiprocessing.Event()
+    ready = multiprocessing.Semaphore(0)
+    queue = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=reader, args=(db_path, args.interval, args.poll, stop, ready, queue))
+        for _ in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+    
+    committed = {}
+    for round_number in range(args.rounds):
+        time.sleep(args.pause)
+        name = f'Probe round {round_number}'
+        committed[name] = rename_probe(app, name)
+    time.sleep(args.interval + args.poll + 0.5)
+    
+    stop.set()
+    samples = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+    
+    staleness = []
+    missed = 0
+    for first_seen in samples:
+        for name, committed_at in committed.items():
+            if name in first_seen:
+                staleness.append((first_seen[name] - committed_at) * 1000)
+            else:
+                missed += 1
+    
+    print(json.dumps({
+        'workers': args.workers,
+        'interval_s': args.interval,
+        'poll_s': args.poll,
+        'rounds': args.rounds,
+        'staleness_ms': {
+            'p50': percentile(staleness, 0.50),
+            'p99': percentile(staleness, 0.99),
+            'max': round(max(staleness), 3) if staleness else None,
+        },
+        'bound_ms': (args.interval + args.poll) * 1000,
+        'within_bound': bool(staleness) and max(staleness) <= (args.interval + args.poll) * 1000 + 50,
+        'missed': missed,
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
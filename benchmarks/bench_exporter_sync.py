@@ -0,0 +1,72 @@
+"""
+Throughput of the blackbox_exporter result sync against a fake exporter.
+
+The fake exporter answers /probe like blackbox_exporter, after --delay
+seconds per probe; targets with 'down' in their address fail. Reports
+probes per second, the resulting statuses and how many connections the
+keep-alive pool opened.
+
+Usage:
+    python -m benchmarks.bench_exporter_sync [--targets 20000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+from sqlalchemy import func, insert, select
+from app import db
+from app.models.target import Target
+from app.services.exporter_sync import ExporterSync, load_targets
+from app.services.prober import write_results
+from benchmarks.common import make_app
+from benchmarks.local_servers import start_fake_exporter
+
+def seed_exporter_targets(app, count):
+    """Insert HTTP, TCP and ICMP targets; every tenth one is down"""
+    kinds = ['HTTP', 'TCP', 'ICMP']
+    rows = []
+    for target_id in range(1, count + 1):
+        suffix = '-down' if target_id % 10 == 0 else ''
+        rows.append({
+            'id': target_id, 'hostname': f'host-{target_id}',
+            'address': f'host-{target_id}{suffix}.example', 'region': 'local', 'zone': 'local',
+            'probe_type': kinds[target_id % len(kinds)], 'assignees': 'bench', 'enabled': True,
+            'port': 443, 'timeout': 5,
+        })
+    with app.app_context():
+        for offset in range(0, count, 5000):
+            db.session.execute(insert(Target.__table__), rows[offset:offset + 5000])
+        db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--delay', type=float, default=0.005)
+    args = parser.parse_args()
+
+    exporter, port = start_fake_exporter(delay=args.delay)
+    app, db_path = make_app(STATUS_HISTORY_ENABLED=False)
+    try:
+        seed_exporter_targets(app, args.targets)
+        sync = ExporterSync(f'http://127.0.0.1:{port}', concurrency=args.concurrency)
+
+        async def run():
+            try:
+                return await sync.run(load_targets(app), lambda batch: write_results(app, batch))
+            finally:
+                await sync.close()
+
+        stats = asyncio.run(run())
+        stats['connections_opened'] = sync.client.connections_opened
+        with app.app_context():
+            stats['stored'] = dict(db.session.execute(
+                select(Target.last_status_code, func.count()).group_by(Target.last_status_code)
+            ).all())
+        print(json.dumps(stats, indent=2))
+    finally:
+        exporter.terminate()
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
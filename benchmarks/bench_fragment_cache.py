@@ -0,0 +1,108 @@
+"""
+Fragment cache: full listings and SD responses when few targets changed.
+
+Seeds --targets targets and times GET /api/targets and GET /api/sd/http:
+
+- uncached: FRAGMENT_CACHE_MAX_BYTES=0, every target encoded each time
+- cold: cache emptied before each request
+- warm: no target changed since the previous request
+- churn_<percent>: --churn percent of the targets changed by status
+  ingestion before each request (untimed)
+
+Bodies are checked to hold the same items as the uncached ones, before
+and after the changes (the cached path lists SD target groups by ID).
+Reports the median time, and the cache's entries, estimated bytes and
+hit ratio at the end.
+
+Usage:
+    python -m benchmarks.bench_fragment_cache [--targets 100000] [--repeat 5] [--churn 0.1,1,10]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime
+from app import db
+from app.services.status_ingest import StatusIngestService
+from benchmarks.common import make_app, seed_targets, measure
+
+URLS = ('/api/targets', '/api/sd/http')
+
+def check_same(url, client, plain):
+    """Check that a cached response holds the same items as the uncached one"""
+    cached = sorted(json.loads(client.get(url).data), key=json.dumps)
+    if cached != sorted(json.loads(plain.get(url).data), key=json.dumps):
+        raise AssertionError(f'{url}: cached body differs from the uncached one')
+
+def change_targets(app, count, run, rng, total):
+    """Change the status code of `count` random targets through status ingestion"""
+    checked_at = datetime.utcnow()
+    results = [(target_id, 'UP', str(run), checked_at) for target_id in rng.sample(range(1, total + 1), count)]
+    with app.app_context():
+        StatusIngestService.apply(results, record_history=False)
+        db.session.commit()
+
+def time_churn(app, client, url, count, args, rng):
+    """Time requests that each follow a change to `count` targets"""
+    samples = []
+    for run in range(args.repeat):
+        change_targets(app, count, run, rng, args.targets)
+        started = time.perf_counter()
+        client.get(url)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {'median_ms': round(statistics.median(samples), 3), 'min_ms': round(min(samples), 3),
+            'max_ms': round(max(samples), 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--churn', default='0.1,1,10', help='Comma-separated percentages of changed targets')
+    parser.add_argument('--budget', type=int, default=256 * 1024 * 1024, help='FRAGMENT_CACHE_MAX_BYTES')
+    args = parser.parse_args()
+    
+    common = dict(DEBUG=False, QUERY_BUDGET_ENFORCE=False, QUERY_N_PLUS_ONE_THRESHOLD=None,
+                  SINGLE_FLIGHT_ENABLED=False, DATA_VERSION_CHECK_INTERVAL=0,
+                  SLOW_QUERY_THRESHOLD_MS=60000)
+    app, db_path = make_app(FRAGMENT_CACHE_MAX_BYTES=args.budget, **common)
+    try:
+        seed_targets(app, args.targets)
+        plain_app, _ = make_app(db_path, FRAGMENT_CACHE_MAX_BYTES=0, **common)
+        client, plain = app.test_client(), plain_app.test_client()
+        cache = app.extensions['fragment_cache']
+        rng = random.Random(42)
+        results = {}
+        for url in URLS:
+            check_same(url, client, plain)
+            
+            timings = {
+                'uncached': measure(lambda: plain.get(url), repeat=args.repeat),
+                'cold': measure(lambda: (cache.clear(), client.get(url)), repeat=args.repeat),
+                'warm': measure(lambda: client.get(url), repeat=args.repeat),
+            }
+            for percent in args.churn.split(','):
+                count = max(1, int(args.targets * float(percent) / 100))
+                timings[f'churn_{percent}'] = time_churn(app, client, url, count, args, rng)
+            check_same(url, client, plain)
+            results[url] = timings
+        
+        lookups = cache.hits + cache.misses
+        print(json.dumps({
+            'targets': args.targets,
+            'results': results,
+            'cache': {
+                'entries': len(cache),
+                'estimated_bytes': cache.size,
+                'hit_ratio': round(cache.hits / lookups, 4) if lookups else None,
+                'evictions': cache.evictions,
+            },
+        }, indent=2))
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+if __name__ == '__main__':
+    main()
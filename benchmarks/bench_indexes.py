@@ -0,0 +1,83 @@
+"""
+Before/after latency of the filter indexes added by migration 2.
+
+Usage:
+    python -m benchmarks.bench_indexes [--targets 100000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+from sqlalchemy import text
+from app import db
+from app.migrations.versions import FILTER_INDEXES, add_filter_indexes
+from benchmarks.common import make_app, seed_targets, measure, quiet
+
+SCENARIOS = {
+    'sd_http': ('GET', '/api/sd/http'),
+    'sd_tcp': ('GET', '/api/sd/tcp'),
+    'search_region_zone': ('GET', '/api/targets?q=region=EU-West zone=zone-b'),
+    'search_hostname': ('GET', '/api/targets?q=hostname=host-0001234.example.com'),
+    'search_status': ('GET', '/api/targets?q=last_status=DOWN probe_type=TCP'),
+    'statistics': ('GET', '/api/statistics'),
+}
+
+def run_scenarios(app, repeat):
+    """Time every scenario through the Flask test client"""
+    client = app.test_client()
+    results = {}
+    
+    for name, (method, url) in SCENARIOS.items():
+        def call():
+            with quiet():
+                response = client.open(url, method=method)
+            assert response.status_code == 200, (url, response.status_code)
+        results[name] = measure(call, repeat=repeat)
+    
+    with app.app_context():
+        def reverse_lookup():
+            db.session.execute(text(
+                'SELECT target_id FROM target_probes WHERE probe_id = 2'
+            )).fetchall()
+        results['probe_reverse_lookup'] = measure(reverse_lookup, repeat=repeat)
+    
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    app, db_path = make_app()
+    try:
+        seed_targets(app, args.targets)
+        
+        with app.app_context():
+            with db.engine.begin() as connection:
+                for name, _, _ in FILTER_INDEXES:
+                    connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+                connection.execute(text('ANALYZE'))
+        before = run_scenarios(app, args.repeat)
+        
+        with app.app_context():
+            with db.engine.begin() as connection:
+                add_filter_indexes(connection)
+        after = run_scenarios(app, args.repeat)
+        
+        report = {
+            'targets': args.targets,
+            'scenarios': {
+                name: {
+                    'before': before[name],
+                    'after': after[name],
+                    'speedup': round(before[name]['median_ms'] / max(after[name]['median_ms'], 1e-6), 2)
+                }
+                for name in before
+            }
+        }
+        print(json.dumps(report, indent=2))
+    finally:
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Checks per second of the built-in prober against a local HTTP server.
+
+Targets are spread over distinct loopback addresses (127.0.x.y) so the
+per-host concurrency limit behaves as it would against real hosts. HTTP,
+TCP and ICMP (TCP stand-in) targets all point at the local server; one
+in ten HTTP targets requests /fail and is expected DOWN.
+
+With --workers N the targets are sharded across N check processes
+(PROBER_WORKERS); compare runs with 1 and N workers on a machine with at
+least N spare cores.
+
+Usage:
+    python -m benchmarks.bench_prober [--targets 50000] [--workers 1]
+"""
+import argparse
+import asyncio
+import json
+import os
+from sqlalchemy import insert
+from app import db
+from app.models.target import Target
+from app.services.check_workers import CheckWorkers
+from app.services.prober import run_rounds
+from benchmarks.common import make_app
+from benchmarks.local_servers import start_http_server
+
+def seed_local_targets(app, count, port):
+    """Insert targets pointing at the local server"""
+    kinds = ['HTTP', 'HTTP', 'TCP', 'ICMP']
+    rows = []
+    for target_id in range(1, count + 1):
+        kind = kinds[target_id % len(kinds)]
+        rows.append({
+            'id': target_id,
+            'hostname': f'local-{target_id}',
+            'address': f'127.0.{(target_id >> 8) & 255}.{(target_id & 255) or 1}',
+            'region': 'local', 'zone': 'local', 'probe_type': kind, 'assignees': 'bench',
+            'enabled': True, 'port': port, 'protocol': 'http' if kind == 'HTTP' else None,
+            'path': '/fail' if kind == 'HTTP' and target_id % 10 == 0 else '/',
+            'expect_status_code': '200', 'timeout': 5,
+        })
+    with app.app_context():
+        for offset in range(0, count, 5000):
+            db.session.execute(insert(Target.__table__), rows[offset:offset + 5000])
+        db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=50000)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+    
+    server, port = start_http_server(processes=args.workers)
+    app, db_path = make_app(PROBER_CONCURRENCY=args.concurrency, STATUS_HISTORY_ENABLED=False)
+    try:
+        seed_local_targets(app, args.targets, port)
+        if args.workers > 1:
+            stats = CheckWorkers(app, args.workers).run_once()
+        else:
+            stats = asyncio.run(run_rounds(app, once=True, log=lambda line: None))
+        stats['checks_per_minute'] = stats['checks_per_second'] * 60
+        print(json.dumps(stats, indent=2))
+    finally:
+        server.terminate()
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
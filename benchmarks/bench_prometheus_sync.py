@@ -0,0 +1,82 @@
+"""
+Full-inventory status import from a fake Prometheus query API.
+
+Every enabled target gets a probe_success series (and
+probe_http_status_code for HTTP) in its blackbox_<protocol> job; one in
+ten is failing. Reports the number of queries, the time to fetch and to
+write, and the stored statuses.
+
+Usage:
+    python -m benchmarks.bench_prometheus_sync [--targets 100000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from sqlalchemy import func, select
+from app import db
+from app.models.target import Target
+from app.services.prometheus_sync import PrometheusSync, import_results
+from app.utils.protocols import target_protocol
+from benchmarks.common import make_app, seed_targets
+from benchmarks.local_servers import start_fake_prometheus
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=100000)
+    args = parser.parse_args()
+    
+    app, db_path = make_app(STATUS_HISTORY_ENABLED=False)
+    prometheus = None
+    try:
+        seed_targets(app, args.targets)
+        with app.app_context():
+            rows = db.session.execute(
+                select(Target.id, Target.probe_type).where(Target.enabled == True)
+            ).all()
+        series = []
+        for target_id, probe_type in rows:
+            protocol = target_protocol(probe_type)
+            success = target_id % 10 != 0
+            http_code = (200 if success else 503) if protocol == 'http' else None
+            series.append((target_id, f'blackbox_{protocol}', success, http_code))
+        prometheus, port = start_fake_prometheus(series)
+        
+        sync = PrometheusSync(f'http://127.0.0.1:{port}')
+        
+        async def fetch():
+            try:
+                return await sync.fetch()
+            finally:
+                await sync.close()
+        
+        started = time.perf_counter()
+        results = asyncio.run(fetch())
+        fetched = time.perf_counter()
+        counts = import_results(app, results)
+        written = time.perf_counter()
+        
+        with app.app_context():
+            stored = dict(db.session.execute(
+                select(Target.last_status, func.count())
+                .where(Target.enabled == True)
+                .group_by(Target.last_status)
+            ).all())
+        print(json.dumps({
+            'targets': len(rows),
+            'queries': sync.requests,
+            'imported': len(results),
+            'by_status': counts,
+            'fetch_s': round(fetched - started, 3),
+            'write_s': round(written - fetched, 3),
+            'total_s': round(written - started, 3),
+            'stored': stored
+        }, indent=2))
+    finally:
+        if prometheus is not None:
+            prometheus.terminate()
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Cost of scheduling, taking and rescheduling targets in CheckScheduler.
+
+Works on in-memory target IDs only, no database. Reports nanoseconds per
+operation and how evenly one interval's checks spread over the ticks.
+
+Usage:
+    python -m benchmarks.bench_scheduler [--targets 1000000]
+"""
+import argparse
+import json
+import time
+from app.services.scheduler import CheckScheduler
+
+def timed(count, fn):
+    """Run fn once and return nanoseconds per item"""
+    started = time.perf_counter()
+    fn()
+    return round((time.perf_counter() - started) * 1e9 / count, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=1000000)
+    parser.add_argument('--interval', type=int, default=60)
+    args = parser.parse_args()
+    
+    count, interval = args.targets, args.interval
+    ids = range(1, count + 1)
+    start = 1_700_000_000.0
+    scheduler = CheckScheduler(default_interval=interval)
+    results = {'targets': count, 'interval_s': interval, 'ns_per_op': {}}
+    ns = results['ns_per_op']
+    
+    def schedule():
+        for target_id in ids:
+            scheduler.add(target_id, now=start)
+    ns['schedule'] = timed(count, schedule)
+    
+    # Take everything due over one interval, one tick at a time
+    per_tick = []
+    def take():
+        for tick in range(interval):
+            per_tick.append(len(scheduler.due(start + tick)))
+    ns['take_due'] = timed(count, take)
+    
+    # Every tenth check fails and backs off
+    def reschedule():
+        now = start + interval
+        for target_id in ids:
+            scheduler.complete(target_id, 'DOWN' if target_id % 10 == 0 else 'UP', now=now)
+    ns['reschedule'] = timed(count, reschedule)
+    
+    def change_interval():
+        for target_id in ids:
+            scheduler.add(target_id, interval * 2, now=start + interval)
+    ns['change_interval'] = timed(count, change_interval)
+    
+    removed = range(1, count + 1, 10)
+    def remove():
+        for target_id in removed:
+            scheduler.remove(target_id)
+    ns['remove'] = timed(len(removed), remove)
+    
+    mean = count / interval
+    results['checks_per_tick'] = {
+        'mean': round(mean, 1),
+        'min': min(per_tick),
+        'max': max(per_tick),
+        'max_over_mean': round(max(per_tick) / mean, 3)
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Target listing serialization: ORM objects and to_dict() against plain rows and a compiled serializer.
+
+Seeds --targets targets and times the body of GET /api/targets built:
+
+- orm_to_dict: Target objects, to_dict() and jsonify() (the old path)
+- rows_serializer: to_dict() columns as plain rows and the row serializer
+- endpoint: the whole GET /api/targets request through the test client
+
+once with the json module and once with orjson as JSON provider (when
+installed), out of debug mode unless --debug. Before timing, each
+provider's bodies from both paths are checked to be byte-identical.
+Reports the median time and rows per second.
+
+Usage:
+    python -m benchmarks.bench_serialization [--targets 100000] [--repeat 5] [--debug]
+"""
+import argparse
+import json
+import os
+from app.models.target import Target
+from app.services.target_service import TargetService
+from app.utils.json_provider import orjson
+from benchmarks.common import make_app, seed_targets, measure
+
+def orm_to_dict(app):
+    """The listing as the route built it before: entities, to_dict() and jsonify()"""
+    return app.json.response([target.to_dict() for target in Target.query.all()]).get_data()
+
+def rows_serializer(app):
+    """The listing as plain rows through the compiled row serializer"""
+    return TargetService.search_targets_json('') + b'\n'
+
+def run_provider(db_path, provider, args):
+    """Check and time every path with one JSON provider"""
+    app, _ = make_app(db_path, JSON_PROVIDER=provider, DEBUG=args.debug,
+                      QUERY_BUDGET_ENFORCE=False, QUERY_N_PLUS_ONE_THRESHOLD=None)
+    client = app.test_client()
+    results = {}
+    with app.test_request_context():
+        expected = orm_to_dict(app)
+        if rows_serializer(app) != expected or client.get('/api/targets').data != expected:
+            raise AssertionError(f'{provider}: row serializer output differs from to_dict()')
+        
+        for name, function in (('orm_to_dict', lambda: orm_to_dict(app)),
+                               ('rows_serializer', lambda: rows_serializer(app)),
+                               ('endpoint', lambda: client.get('/api/targets'))):
+            timing = measure(function, repeat=args.repeat)
+            timing['rows_per_second'] = round(args.targets / timing['median_ms'] * 1000)
+            results[name] = timing
+    results['body_bytes'] = len(expected)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--debug', action='store_true', help='Indented output, as in debug mode')
+    args = parser.parse_args()
+    
+    app, db_path = make_app()
+    try:
+        seed_targets(app, args.targets)
+        providers = ['stdlib'] + (['orjson'] if orjson is not None else [])
+        results = {provider: run_provider(db_path, provider, args) for provider in providers}
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+    
+    print(json.dumps({
+        'targets': args.targets,
+        'debug': args.debug,
+        'providers': results,
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Thundering herd on the SD and statistics endpoints, with and without single-flight.
+
+For each round a target is updated (a new data version), then --callers
+threads released by one barrier request the same URL at once, as
+Prometheus servers do after a change. Reports per mode how many times
+the response was built from the database per round, and the callers'
+latency.
+
+Usage:
+    python -m benchmarks.bench_single_flight [--targets 10000] [--callers 50] [--rounds 5]
+                                             [--paths /api/sd/http,/api/statistics]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from benchmarks.common import make_app, seed_targets, quiet, percentile
+
+def herd(app, path, callers):
+    """
+    Release `callers` simultaneous requests for `path`
+    
+    Returns:
+        List of latencies in milliseconds
+    """
+    barrier = threading.Barrier(callers)
+    latencies = []
+    errors = []
+    
+    def call():
+        client = app.test_client()
+        barrier.wait()
+        started = time.perf_counter()
+        response = client.get(path)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+    
+    # redirect_stdout is process-wide, so silence the whole herd at once
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    with quiet():
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise RuntimeError(f'{path} failed: {errors[:5]}')
+    return latencies
+
+def run_mode(enabled, args):
+    """Run every round for every path with SINGLE_FLIGHT_ENABLED set to `enabled`"""
+    app, db_path = make_app(SINGLE_FLIGHT_ENABLED=enabled, QUERY_BUDGET_ENFORCE=False,
+                            QUERY_N_PLUS_ONE_THRESHOLD=None)
+    try:
+        seed_targets(app, args.targets)
+        client = app.test_client()
+        flight = app.extensions['single_flight']
+        results = {}
+        for path in args.paths.split(','):
+            builds = []
+            latencies = []
+            for round_number in range(args.rounds):
+                # A write bumps the data version, so every round starts cold
+                response = client.put('/api/targets/1', json={'zone': f'zone-{round_number}'})
+                assert response.status_code == 200, response.status_code
+                before = flight.misses
+                latencies.extend(herd(app, path, args.callers))
+                builds.append(flight.misses - before)
+            results[path] = {
+                'builds_per_round': builds,
+                'p50_ms': percentile(latencies, 0.50),
+                'p99_ms': percentile(latencies, 0.99),
+                'max_ms': round(max(latencies), 3),
+            }
+        return results
+    finally:
+        os.unlink(db_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=10000)
+    parser.add_argument('--callers', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--paths', default='/api/sd/http,/api/statistics')
+    args = parser.parse_args()
+    
+    print(json.dumps({
+        'targets': args.targets,
+        'callers': args.callers,
+        'rounds': args.rounds,
+        'single_flight': run_mode(True, args),
+        'without': run_mode(False, args),
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
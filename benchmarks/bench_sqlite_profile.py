@@ -0,0 +1,104 @@
+"""
+Concurrent read/write throughput with the default and production SQLite profiles.
+
+Each profile runs the same mix as separate processes (like gunicorn
+workers): readers polling SD, search and statistics, and writers updating
+targets. Reports throughput, p50/p99 latency and "database is locked"
+errors per role.
+
+Usage:
+    python -m benchmarks.bench_sqlite_profile [--targets 10000] [--readers 4] [--writers 2] [--duration 10]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+from app.config import ProductionConfig
+from benchmarks.common import make_app, seed_targets, quiet, percentile
+
+READ_URLS = [
+    '/api/sd/icmp?assignee=team-payments',
+    '/api/targets?q=region=EU-West zone=zone-b',
+    '/api/statistics',
+]
+
+PROFILES = {
+    'default': {},
+    'production': {
+        'SQLITE_PRAGMAS': ProductionConfig.SQLITE_PRAGMAS,
+        'SQLALCHEMY_ENGINE_OPTIONS': ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS,
+    },
+}
+
+def worker(role, db_path, profile, targets, duration, seed, queue):
+    """Run one reader or writer process and report its samples"""
+    app, _ = make_app(db_path, PROPAGATE_EXCEPTIONS=False, **PROFILES[profile])
+    client = app.test_client()
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        with quiet():
+            if role == 'reader':
+                response = client.get(rng.choice(READ_URLS))
+            else:
+                response = client.put(f'/api/targets/{rng.randint(1, targets)}',
+                                      json={'zone': rng.choice(['zone-a', 'zone-b', 'zone-c'])})
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 500:
+            errors += 1
+    
+    queue.put((role, latencies, errors))
+
+def run_profile(profile, args):
+    """Seed a fresh database and run the concurrent mix under one profile"""
+    app, db_path = make_app(**PROFILES[profile])
+    seed_targets(app, args.targets)
+    
+    queue = multiprocessing.Queue()
+    roles = ['reader'] * args.readers + ['writer'] * args.writers
+    processes = [
+        multiprocessing.Process(target=worker, args=(role, db_path, profile, args.targets,
+                                                      args.duration, index, queue))
+        for index, role in enumerate(roles)
+    ]
+    for process in processes:
+        process.start()
+    samples = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.unlink(db_path + suffix)
+    
+    report = {}
+    for role in ('reader', 'writer'):
+        latencies = [value for r, values, _ in samples if r == role for value in values]
+        errors = sum(e for r, _, e in samples if r == role)
+        report[role] = {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / args.duration, 1),
+            'p50_ms': percentile(latencies, 0.50),
+            'p99_ms': percentile(latencies, 0.99),
+            'errors': errors,
+        }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=10000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+    
+    print(json.dumps({profile: run_profile(profile, args) for profile in PROFILES}, indent=2))
+
+if __name__ == '__main__':
+    main()
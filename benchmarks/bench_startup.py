@@ -0,0 +1,118 @@
+"""
+Worker startup time: import, create_app() and the first request.
+
+Every sample is a fresh Python process, as a Gunicorn worker would be,
+started against a seeded and migrated SQLite database with the
+production configuration. The 'check' mode is the production default
+(DB_AUTO_MIGRATE off: one schema version query), 'auto' applies
+migrations and seeds default probes at startup as development does.
+--concurrency starts that many processes at once, like a worker pool
+being restarted.
+
+Reports per mode the median and p90 of the import time, create_app()
+time, first request time and whole process time (interpreter start to
+first response), and the SQL statements issued by create_app().
+
+Usage:
+    python -m benchmarks.bench_startup [--targets 10000] [--repeat 10] [--concurrency 1]
+                                       [--path /api/probes]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from benchmarks.common import make_app, seed_targets, percentile
+
+MODES = {
+    'check': 'false',
+    'auto': 'true',
+}
+
+# Runs in the child process and prints its timings as JSON
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+from app.utils.query_counter import count_queries
+with count_queries() as counter:
+    application = app.create_app()
+created = time.perf_counter()
+response = application.test_client().get(sys.argv[1])
+answered = time.perf_counter()
+print(json.dumps({
+    'status': response.status_code,
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (answered - created) * 1000,
+    'startup_queries': counter.count,
+}))
+"""
+
+def start_worker(db_path, auto_migrate, path):
+    """Start one measuring process; returns (Popen, start time)"""
+    env = dict(os.environ, FLASK_CONFIG='production', DATABASE_URL=f'sqlite:///{db_path}',
+               SECRET_KEY='bench', DB_AUTO_MIGRATE=auto_migrate, PYTHONPATH=os.getcwd())
+    process = subprocess.Popen([sys.executable, '-c', CHILD, path], env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    return process, time.perf_counter()
+
+def run_mode(db_path, auto_migrate, args):
+    """
+    Time args.repeat rounds of args.concurrency simultaneous worker starts
+    
+    Returns:
+        List of sample dictionaries
+    """
+    samples = []
+    for _ in range(args.repeat):
+        workers = [start_worker(db_path, auto_migrate, args.path) for _ in range(args.concurrency)]
+        for process, started in workers:
+            output, _ = process.communicate()
+            sample = json.loads(output)
+            sample['process_ms'] = (time.perf_counter() - started) * 1000
+            if sample['status'] != 200:
+                raise RuntimeError(f"{args.path} answered {sample['status']}")
+            samples.append(sample)
+    return samples
+
+def summarize(samples):
+    """Median and p90 of every timing, and the startup query count"""
+    summary = {}
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'process_ms'):
+        values = [sample[key] for sample in samples]
+        summary[key] = {'median': percentile(values, 0.5), 'p90': percentile(values, 0.9)}
+    summary['startup_queries'] = max(sample['startup_queries'] for sample in samples)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=1, help='Processes started at once')
+    parser.add_argument('--path', default='/api/probes', help='URL of the first request')
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+    
+    app, db_path = make_app()
+    seed_targets(app, args.targets)
+    try:
+        results = {mode: summarize(run_mode(db_path, MODES[mode], args))
+                   for mode in args.modes.split(',')}
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+    
+    print(json.dumps({
+        'targets': args.targets,
+        'repeat': args.repeat,
+        'concurrency': args.concurrency,
+        'path': args.path,
+        'modes': results
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
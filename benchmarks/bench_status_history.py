@@ -0,0 +1,146 @@
+"""
+Storage and query cost of the status history store.
+
+Records synthetic checks at a fixed interval with a configurable flap
+rate, reports the database bytes used per million checks (compared with
+one row per check), then compacts 30 days of history into the raw/5m/1h
+tiers and times 30 day history queries.
+
+Usage:
+    python -m benchmarks.bench_status_history [--targets 1000] [--checks 1000] [--flap 0.01]
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app import db
+from app.models.status_history import to_epoch
+from app.services.status_history import StatusHistoryService
+from benchmarks.common import make_app, seed_targets, measure
+
+def database_bytes():
+    """Return the size of the main database in bytes"""
+    page_count = db.session.execute(text('PRAGMA page_count')).scalar()
+    page_size = db.session.execute(text('PRAGMA page_size')).scalar()
+    return page_count * page_size
+
+def record_checks(targets, checks, flap, start, interval=60, chunk=10, seed=7):
+    """
+    Record checks for targets 1..targets through StatusHistoryService
+    
+    Returns:
+        Tuple of (checks recorded, seconds spent)
+    """
+    rng = random.Random(seed)
+    status = {target_id: 'UP' for target_id in range(1, targets + 1)}
+    recorded = 0
+    elapsed = 0.0
+    
+    for offset in range(0, checks, chunk):
+        results = []
+        for step in range(offset, min(offset + chunk, checks)):
+            checked_at = start + timedelta(seconds=step * interval)
+            for target_id in status:
+                if rng.random() < flap:
+                    status[target_id] = 'DOWN' if status[target_id] == 'UP' else 'UP'
+                code = '200' if status[target_id] == 'UP' else '503'
+                results.append((target_id, status[target_id], code, checked_at))
+        
+        begin = time.perf_counter()
+        StatusHistoryService.record(results)
+        db.session.commit()
+        elapsed += time.perf_counter() - begin
+        recorded += len(results)
+    
+    return recorded, elapsed
+
+def storage_scenario(args):
+    """Bytes per million checks, run-length store versus one row per check"""
+    app, db_path = make_app()
+    try:
+        seed_targets(app, args.targets)
+        with app.app_context():
+            before = database_bytes()
+            recorded, elapsed = record_checks(args.targets, args.checks, args.flap, datetime(2024, 1, 1))
+            after = database_bytes()
+            runs = db.session.execute(text('SELECT COUNT(*) FROM status_runs')).scalar()
+            
+            db.session.execute(text(
+                'CREATE TABLE naive_checks (target_id INTEGER, checked_at INTEGER, '
+                'status VARCHAR(20), status_code VARCHAR(20))'
+            ))
+            db.session.execute(text('CREATE INDEX ix_naive ON naive_checks (target_id, checked_at)'))
+            naive_before = database_bytes()
+            rows = [
+                {'t': target_id, 'c': step * 60, 's': 'UP', 'sc': '200'}
+                for step in range(args.checks) for target_id in range(1, args.targets + 1)
+            ]
+            db.session.execute(text('INSERT INTO naive_checks VALUES (:t, :c, :s, :sc)'), rows)
+            db.session.commit()
+            naive_bytes = database_bytes() - naive_before
+        
+        scale = 1_000_000 / recorded
+        return {
+            'checks': recorded,
+            'runs': runs,
+            'record_checks_per_second': round(recorded / elapsed),
+            'bytes_per_million_checks': round((after - before) * scale),
+            'row_per_check_bytes_per_million_checks': round(naive_bytes * scale),
+        }
+    finally:
+        os.unlink(db_path)
+
+def query_scenario(args):
+    """Latency of 30 day history queries after compaction into tiers"""
+    app, db_path = make_app()
+    try:
+        seed_targets(app, args.query_targets)
+        start = datetime(2024, 1, 1)
+        days = 30
+        with app.app_context():
+            record_checks(args.query_targets, days * 1440, args.flap, start)
+            end = to_epoch(start + timedelta(days=days))
+            compacted = StatusHistoryService.compact(now=end)
+            db.session.commit()
+            tiers = dict(db.session.execute(text(
+                "SELECT 'raw', COUNT(*) FROM status_runs UNION ALL "
+                "SELECT CAST(resolution AS TEXT), COUNT(*) FROM status_rollups GROUP BY resolution"
+            )).all())
+        
+        client = app.test_client()
+        rng = random.Random(3)
+        begin = to_epoch(start)
+        
+        def query():
+            target_id = rng.randint(1, args.query_targets)
+            response = client.get(f'/api/targets/{target_id}/history?from={begin}&to={end}')
+            assert response.status_code == 200
+        
+        return {
+            'targets': args.query_targets,
+            'days': days,
+            'compacted': compacted,
+            'rows_per_tier': tiers,
+            'history_30d': measure(query, repeat=50),
+        }
+    finally:
+        os.unlink(db_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=1000)
+    parser.add_argument('--checks', type=int, default=1000, help='checks per target')
+    parser.add_argument('--flap', type=float, default=0.01, help='probability a check changes status')
+    parser.add_argument('--query-targets', type=int, default=50)
+    args = parser.parse_args()
+    
+    print(json.dumps({
+        'storage': storage_scenario(args),
+        'query': query_scenario(args),
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Throughput of POST /api/status/ingest compared with one commit per result.
+
+Usage:
+    python -m benchmarks.bench_status_ingest [--targets 10000] [--results 200000] [--batch 1000]
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from app import db
+from app.models.target import Target
+from benchmarks.common import make_app, seed_targets
+
+def make_results(count, targets, change_rate, seed=11):
+    """Generate check result payloads, with change_rate of them flipping status"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 2)
+    results = []
+    for index in range(count):
+        up = rng.random() >= change_rate
+        results.append({
+            'target_id': rng.randint(1, targets),
+            'status': 'UP' if up else 'DOWN',
+            'status_code': '200' if up else '503',
+            'checked_at': (start + timedelta(milliseconds=index)).isoformat()
+        })
+    return results
+
+def ingest_scenario(args):
+    """Push batches through the ingest endpoint, flushing every flush_every batches"""
+    app, db_path = make_app(STATUS_INGEST_FLUSH_INTERVAL=3600,
+                            STATUS_INGEST_MAX_PENDING=args.batch * args.flush_every)
+    try:
+        seed_targets(app, args.targets)
+        client = app.test_client()
+        results = make_results(args.results, args.targets, args.change_rate)
+        
+        start = time.perf_counter()
+        for offset in range(0, len(results), args.batch):
+            response = client.post('/api/status/ingest', json=results[offset:offset + args.batch])
+            assert response.status_code == 202
+        client.post('/api/status/ingest?flush=true', json=[])
+        elapsed = time.perf_counter() - start
+        
+        return {
+            'results': len(results),
+            'batch': args.batch,
+            'flush_every_batches': args.flush_every,
+            'results_per_second': round(len(results) / elapsed),
+            'totals': app.extensions['status_ingestor'].totals,
+        }
+    finally:
+        os.unlink(db_path)
+
+def per_result_scenario(args):
+    """Baseline: load, update and commit each result individually"""
+    app, db_path = make_app()
+    try:
+        seed_targets(app, args.targets)
+        count = min(args.results, args.baseline_results)
+        results = make_results(count, args.targets, args.change_rate)
+        
+        with app.app_context():
+            start = time.perf_counter()
+            for result in results:
+                target = db.session.get(Target, result['target_id'])
+                target.last_status = result['status']
+                target.last_status_code = result['status_code']
+                target.last_check = datetime.fromisoformat(result['checked_at'])
+                db.session.commit()
+            elapsed = time.perf_counter() - start
+        
+        return {'results': count, 'results_per_second': round(count / elapsed)}
+    finally:
+        os.unlink(db_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--targets', type=int, default=10000)
+    parser.add_argument('--results', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--flush-every', type=int, default=10)
+    parser.add_argument('--change-rate', type=float, default=0.05)
+    parser.add_argument('--baseline-results', type=int, default=5000)
+    args = parser.parse_args()
+    
+    print(json.dumps({
+        'ingest': ingest_scenario(args),
+        'per_result_commit': per_result_scenario(args),
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
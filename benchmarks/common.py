@@ -0,0 +1,193 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+import contextlib
+import io
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app import create_app, db
+
+# Value pools with relative weights: a few large regions and teams own most
+# targets, as in a real inventory
+REGIONS = ['US-East', 'US-West', 'EU-West', 'EU-Central', 'AP-Southeast', 'AP-Northeast']
+REGION_WEIGHTS = [30, 15, 20, 15, 12, 8]
+ZONES = ['zone-a', 'zone-b', 'zone-c', 'zone-d']
+ZONE_WEIGHTS = [40, 30, 20, 10]
+PROBE_TYPES = ['HTTP', 'HTTPS', 'ICMP', 'TCP']
+PROBE_TYPE_WEIGHTS = [30, 35, 20, 15]
+STATUSES = ['UP', 'UP', 'UP', 'UP', 'DOWN', 'UNKNOWN', None]
+TEAMS = ['team-network', 'team-web', 'team-db', 'team-infra', 'team-security',
+         'team-network-legacy', 'team-payments', 'team-search']
+TEAM_WEIGHTS = [20, 25, 12, 15, 8, 4, 10, 6]
+
+def make_app(db_path=None, **config):
+    """
+    Create an application bound to a scratch SQLite database
+    
+    Args:
+        db_path: Database file path, a temporary file when omitted
+        **config: Extra configuration values
+        
+    Returns:
+        Tuple of (app, db_path)
+    """
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='bench_', suffix='.db')
+        os.close(fd)
+        os.unlink(db_path)
+    
+    test_config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'}
+    test_config.update(config)
+    return create_app('testing', test_config=test_config), db_path
+
+def _pick_teams(rng):
+    """Pick one to three distinct teams, weighted towards the large ones"""
+    wanted = rng.choice([1, 1, 1, 2, 3])
+    teams = []
+    while len(teams) < wanted:
+        team = rng.choices(TEAMS, TEAM_WEIGHTS)[0]
+        if team not in teams:
+            teams.append(team)
+    return teams
+
+def iter_target_rows(count, seed=42, start_id=1):
+    """
+    Generate deterministic target rows one at a time
+    
+    Args:
+        count: Number of rows to generate
+        seed: Random seed, the same seed always yields the same rows
+        start_id: ID of the first row
+        
+    Yields:
+        Row dictionaries for the targets table
+    """
+    rng = random.Random(seed)
+    now = datetime(2024, 1, 1)
+    
+    for target_id in range(start_id, start_id + count):
+        probe_type = rng.choices(PROBE_TYPES, PROBE_TYPE_WEIGHTS)[0]
+        status = rng.choice(STATUSES)
+        teams = _pick_teams(rng)
+        yield {
+            'id': target_id,
+            'hostname': f'host-{target_id:07d}.example.com',
+            'address': f'10.{(target_id >> 16) & 255}.{(target_id >> 8) & 255}.{target_id & 255}',
+            'region': rng.choices(REGIONS, REGION_WEIGHTS)[0],
+            'zone': rng.choices(ZONES, ZONE_WEIGHTS)[0],
+            'probe_type': probe_type,
+            'assignees': ','.join(teams),
+            'enabled': rng.random() < 0.9,
+            'port': 443 if probe_type == 'HTTPS' else (rng.choice([22, 80, 5432]) if probe_type == 'TCP' else None),
+            'protocol': probe_type.lower() if probe_type.startswith('HTTP') else None,
+            'path': '/' if probe_type.startswith('HTTP') else None,
+            'expect_status_code': '200' if probe_type.startswith('HTTP') else None,
+            'timeout': 10,
+            'last_status': status,
+            'last_status_code': {'UP': '200', 'DOWN': '503'}.get(status),
+            'last_check': now - timedelta(seconds=rng.randint(0, 3600)) if status else None,
+            'last_updated': now,
+        }
+
+def target_rows(count, seed=42, start_id=1):
+    """
+    Generate deterministic target rows
+    
+    Args:
+        count: Number of rows to generate
+        seed: Random seed, the same seed always yields the same rows
+        start_id: ID of the first row
+        
+    Returns:
+        List of row dictionaries for the targets table
+    """
+    return list(iter_target_rows(count, seed, start_id))
+
+def seed_targets(app, count, seed=42, batch_size=5000):
+    """
+    Bulk insert deterministic targets, their assignees and probe assignments
+    
+    Rows are generated batch by batch, so a million targets do not have
+    to fit in memory at once.
+    
+    Args:
+        app: The Flask application
+        count: Number of targets to insert
+        seed: Random seed for the generated rows
+        batch_size: Rows per executemany batch
+    """
+    from app.models.probe import Probe
+    from app.models.target import Target, target_assignees, target_probes
+    from app.services.target_statistics import StatisticsService
+    
+    rng = random.Random(seed + 1)
+    
+    with app.app_context():
+        probe_ids = [probe.id for probe in Probe.query.all()]
+        rows = iter_target_rows(count, seed)
+        
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            db.session.execute(insert(Target.__table__), batch)
+            db.session.execute(insert(target_assignees), [
+                {'target_id': row['id'], 'assignee': assignee}
+                for row in batch
+                for assignee in row['assignees'].split(',')
+            ])
+            db.session.execute(insert(target_probes), [
+                {'target_id': row['id'], 'probe_id': probe_id}
+                for row in batch
+                for probe_id in rng.sample(probe_ids, rng.randint(1, len(probe_ids)))
+            ])
+        
+        # Raw inserts bypass the services that maintain the statistics counters
+        StatisticsService.rebuild_counters()
+        db.session.commit()
+
+@contextlib.contextmanager
+def quiet():
+    """Silence stdout while running noisy endpoints"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def measure(fn, repeat=5, warmup=1):
+    """
+    Time a callable
+    
+    Args:
+        fn: Callable to time
+        repeat: Number of timed runs
+        warmup: Number of untimed runs before measuring
+        
+    Returns:
+        Dictionary with median, min and max wall time in milliseconds
+    """
+    for _ in range(warmup):
+        fn()
+    
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'min_ms': round(min(samples), 3),
+        'max_ms': round(max(samples), 3)
+    }
+
+def percentile(samples, fraction):
+    """Return the value at a fraction of the sorted samples"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
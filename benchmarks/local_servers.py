@@ -0,0 +1,240 @@
+"""
+Local stand-in servers for checker benchmarks.
+
+Run in a separate process so the server does not compete with the
+checker's event loop.
+"""
+import asyncio
+import gzip
+import json
+import multiprocessing
+import re
+import socket
+import time
+from urllib.parse import parse_qs, urlsplit
+from app.services.prometheus_sync import TIMESTAMP_LABEL
+
+async def _handle_http(reader, writer):
+    """Answer keep-alive HTTP requests; paths starting with /fail get a 503"""
+    try:
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            path = head.split(b' ', 2)[1]
+            if path.startswith(b'/fail'):
+                writer.write(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 4\r\n\r\nfail')
+            else:
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+def _serve_http(port, ready):
+    """Process entry point for the HTTP server"""
+    async def main():
+        server = await asyncio.start_server(_handle_http, '0.0.0.0', port, backlog=4096,
+                                            reuse_port=True)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+    asyncio.run(main())
+
+def exporter_metrics(target, module):
+    """
+    Metrics the fake exporter reports for a probe
+    
+    Targets containing 'down' fail; http_* modules also report an HTTP
+    status code, like blackbox_exporter does.
+    """
+    success = 'down' not in target
+    lines = [
+        '# HELP probe_success Displays whether or not the probe was a success',
+        '# TYPE probe_success gauge',
+        f'probe_success {1 if success else 0}',
+        'probe_duration_seconds 0.001',
+    ]
+    if module.startswith('http'):
+        lines.append(f'probe_http_status_code {200 if success else 503}')
+    return '\n'.join(lines) + '\n'
+
+def _exporter_handler(delay):
+    """Build a keep-alive handler answering /probe like blackbox_exporter"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                parts = urlsplit(head.split(b' ', 2)[1].decode())
+                if parts.path != '/probe':
+                    writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n')
+                else:
+                    params = parse_qs(parts.query)
+                    if delay:
+                        await asyncio.sleep(delay)
+                    body = exporter_metrics(params.get('target', [''])[0],
+                                            params.get('module', [''])[0]).encode()
+                    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                                 b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+def _serve_exporter(port, ready, delay):
+    """Process entry point for the fake exporter"""
+    async def main():
+        server = await asyncio.start_server(_exporter_handler(delay), '127.0.0.1', port, backlog=4096)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+    asyncio.run(main())
+
+def start_fake_exporter(port=None, delay=0.0):
+    """
+    Start a fake blackbox_exporter in a child process
+    
+    Args:
+        port: Port to listen on, a free port when omitted
+        delay: Seconds each probe takes
+    
+    Returns:
+        Tuple of (process, port); terminate the process when done
+    """
+    port = port or free_port()
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=_serve_exporter, args=(port, ready, delay), daemon=True)
+    process.start()
+    ready.wait(10)
+    time.sleep(0.1)
+    return process, port
+
+def prometheus_response(series, timestamp):
+    """
+    Build /api/v1/query responses per job for the fake Prometheus
+    
+    Args:
+        series: Iterable of (target_id, job, success, http_status_code or None)
+        timestamp: Sample time in seconds since the epoch
+    
+    Returns:
+        Dictionary of job to JSON body bytes
+    """
+    evaluated_at = time.time()
+    results = {}
+    for target_id, job, success, http_code in series:
+        labels = {'id': str(target_id), 'job': job, 'instance': f'target-{target_id}'}
+        entries = results.setdefault(job, [])
+        entries.append({'metric': dict(labels, __name__='probe_success'),
+                        'value': [evaluated_at, '1' if success else '0']})
+        if http_code is not None:
+            entries.append({'metric': dict(labels, __name__='probe_http_status_code'),
+                            'value': [evaluated_at, str(http_code)]})
+        # The timestamp() series of job_query()
+        entries.append({'metric': dict(labels, **{TIMESTAMP_LABEL: 'timestamp'}),
+                        'value': [evaluated_at, repr(float(timestamp))]})
+    return {
+        job: json.dumps({'status': 'success', 'data': {'resultType': 'vector', 'result': entries}}).encode()
+        for job, entries in results.items()
+    }
+
+def _prometheus_handler(bodies):
+    """Build a handler answering instant queries selecting one job"""
+    empty = json.dumps({'status': 'success', 'data': {'resultType': 'vector', 'result': []}}).encode()
+    compressed = {job: gzip.compress(body, 1) for job, body in bodies.items()}
+    
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                parts = urlsplit(head.split(b' ', 2)[1].decode())
+                query = parse_qs(parts.query).get('query', [''])[0]
+                match = re.search(r'job="([^"]+)"', query)
+                job = match.group(1) if match else None
+                use_gzip = b'gzip' in head.lower()
+                body = (compressed if use_gzip else bodies).get(job)
+                if body is None:
+                    body, use_gzip = empty, False
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                             + (b'Content-Encoding: gzip\r\n' if use_gzip else b'')
+                             + b'Content-Length: %d\r\n\r\n' % len(body) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    return handle
+
+def _serve_prometheus(port, ready, series, timestamp):
+    """Process entry point for the fake Prometheus"""
+    async def main():
+        handler = _prometheus_handler(prometheus_response(series, timestamp))
+        server = await asyncio.start_server(handler, '127.0.0.1', port)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+    asyncio.run(main())
+
+def start_fake_prometheus(series, timestamp=None, port=None):
+    """
+    Start a fake Prometheus query API in a child process
+    
+    Args:
+        series: Iterable of (target_id, job, success, http_status_code or None)
+        timestamp: Sample time, defaults to now
+        port: Port to listen on, a free port when omitted
+    
+    Returns:
+        Tuple of (process, port); terminate the process when done
+    """
+    port = port or free_port()
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(
+        target=_serve_prometheus, args=(port, ready, list(series), timestamp or time.time()),
+        daemon=True
+    )
+    process.start()
+    ready.wait(60)
+    time.sleep(0.1)
+    return process, port
+
+def free_port():
+    """Pick a free local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class ServerProcesses:
+    """Server child processes sharing one port"""
+    
+    def __init__(self, processes):
+        self.processes = processes
+    
+    def terminate(self):
+        """Stop all server processes"""
+        for process in self.processes:
+            process.terminate()
+
+def start_http_server(port=None, processes=1):
+    """
+    Start the stand-in HTTP server in child processes
+    
+    Args:
+        port: Port to listen on, a free port when omitted
+        processes: Server processes accepting on the port (SO_REUSEPORT),
+            so the server keeps up with multi-process checkers
+            
+    Returns:
+        Tuple of (ServerProcesses, port); terminate them when done
+    """
+    port = port or free_port()
+    started = []
+    for _ in range(processes):
+        ready = multiprocessing.Event()
+        process = multiprocessing.Process(target=_serve_http, args=(port, ready), daemon=True)
+        process.start()
+        ready.wait(10)
+        started.append(process)
+    time.sleep(0.1)
+    return ServerProcesses(started), port
@@ -0,0 +1,254 @@
+"""
+Soak test: a fleet of Prometheus servers polling SD while the UI writes.
+
+Simulates --pollers Prometheus servers, each fetching /api/sd/icmp, /http
+and /tcp every --refresh seconds. With --jitter 0 all of them fire at the
+same instant, like servers restarted together with the same config;
+otherwise each gets a fixed random phase within --jitter seconds. Next to
+them, --writers clients issue --write-rate operations per second through
+the target APIs with the --write-mix weights (update, create, batch,
+ingest).
+
+The app is started locally on a seeded SQLite database with the
+production profile (Gunicorn with --server gunicorn, otherwise the
+threaded development server), or --url points at a running instance.
+Reports per endpoint the request count, throughput, p50/p99/p999 latency
+and errors, plus the "database is locked" errors found in the server log.
+
+Usage:
+    python -m benchmarks.soak [--server dev|gunicorn] [--workers 4] [--targets 10000]
+                              [--pollers 20] [--refresh 15] [--jitter 0] [--duration 60]
+                              [--writers 2] [--write-rate 5] [--write-mix update=5,create=1,batch=1,ingest=3]
+    python -m benchmarks.soak --url http://127.0.0.1:5000 --targets 10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from app.services.http_client import HttpClient
+from benchmarks.common import make_app, seed_targets, percentile
+from benchmarks.local_servers import free_port
+from benchmarks.suite import new_target
+
+SD_PROTOCOLS = ['icmp', 'http', 'tcp']
+LOCKED = b'database is locked'
+
+def parse_mix(value):
+    """Parse 'operation=weight,...' into a dictionary"""
+    mix = {}
+    for pair in value.split(','):
+        name, weight = pair.split('=', 1)
+        mix[name.strip()] = float(weight)
+    return mix
+
+def start_server(db_path, server, workers, port, log_file):
+    """
+    Start the app against a database file in a subprocess
+    
+    Returns:
+        The subprocess.Popen
+    """
+    env = dict(os.environ, FLASK_CONFIG='production', DATABASE_URL=f'sqlite:///{db_path}',
+               SECRET_KEY='soak', PYTHONPATH=os.getcwd())
+    if server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                   '--timeout', '120', 'app:create_app()']
+    else:
+        command = [sys.executable, '-c',
+                   'from app import create_app; '
+                   f"create_app().run(host='127.0.0.1', port={port}, threaded=True)"]
+    return subprocess.Popen(command, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+async def wait_ready(client, base_url, process, timeout=60):
+    """Wait until the server answers, failing early if it exited"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'Server exited with status {process.returncode}')
+        try:
+            response = await client.get(f'{base_url}/api/statistics', timeout=5)
+            if response.status == 200:
+                return
+        except (OSError, asyncio.TimeoutError):
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError('Server did not become ready')
+
+class Recorder:
+    """Latencies and errors per endpoint"""
+    
+    def __init__(self):
+        self.requests = Counter()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(Counter)
+    
+    async def call(self, name, request):
+        """Time one request coroutine and classify its outcome"""
+        self.requests[name] += 1
+        started = time.perf_counter()
+        try:
+            response = await request
+        except asyncio.TimeoutError:
+            self.errors[name]['timeout'] += 1
+            return
+        except Exception as e:
+            self.errors[name][type(e).__name__] += 1
+            return
+        self.latencies[name].append((time.perf_counter() - started) * 1000)
+        if response.status >= 400:
+            kind = 'database_is_locked' if LOCKED in response.body else f'http_{response.status}'
+            self.errors[name][kind] += 1
+    
+    def report(self, duration):
+        """Summarize every endpoint"""
+        report = {}
+        for name in sorted(self.requests):
+            latencies = self.latencies[name]
+            failed = sum(self.errors[name].values())
+            total = self.requests[name]
+            report[name] = {
+                'requests': total,
+                'throughput_rps': round(total / duration, 2),
+                'p50_ms': percentile(latencies, 0.50),
+                'p99_ms': percentile(latencies, 0.99),
+                'p999_ms': percentile(latencies, 0.999),
+                'max_ms': round(max(latencies), 3) if latencies else None,
+                'error_rate': round(failed / total, 4) if total else 0.0,
+                'errors': dict(self.errors[name]),
+            }
+        return report
+
+async def poller(client, recorder, base_url, phase, refresh, started, until, timeout):
+    """One Prometheus server refreshing every SD endpoint each refresh seconds"""
+    cycle = 0
+    while True:
+        at = started + phase + cycle * refresh
+        if at >= until:
+            return
+        await asyncio.sleep(max(0, at - time.monotonic()))
+        await asyncio.gather(*(
+            recorder.call(f'sd_{protocol}', client.get(f'{base_url}/api/sd/{protocol}', timeout=timeout))
+            for protocol in SD_PROTOCOLS
+        ))
+        cycle += 1
+
+async def writer(client, recorder, base_url, rng, mix, rate, targets, until, timeout):
+    """One UI client issuing write operations at a fixed rate"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    headers = {'Content-Type': 'application/json'}
+    interval = 1 / rate
+    next_at = time.monotonic()
+    serial = rng.randint(1, 10 ** 9)
+    
+    while next_at < until:
+        await asyncio.sleep(max(0, next_at - time.monotonic()))
+        next_at += interval
+        operation = rng.choices(names, weights)[0]
+        if operation == 'update':
+            method, path = 'PUT', f'/api/targets/{rng.randint(1, targets)}'
+            body = {'zone': rng.choice(['zone-a', 'zone-b', 'zone-c', 'zone-d'])}
+        elif operation == 'create':
+            serial += 1
+            method, path, body = 'POST', '/api/targets', new_target(serial)
+        elif operation == 'batch':
+            method, path = 'POST', '/api/targets/batch'
+            body = {'operation': rng.choice(['enable', 'disable']),
+                    'target_ids': rng.sample(range(1, targets + 1), min(100, targets))}
+        elif operation == 'ingest':
+            method, path = 'POST', '/api/status/ingest'
+            body = [{'target_id': rng.randint(1, targets), 'status': rng.choice(['UP', 'UP', 'DOWN'])}
+                    for _ in range(100)]
+        else:
+            raise ValueError(f'Unknown write operation: {operation}')
+        await recorder.call(operation, client.request(
+            method, base_url + path, json.dumps(body).encode(), timeout=timeout, headers=headers
+        ))
+
+async def soak(args, base_url, process=None):
+    """Run pollers and writers against base_url for args.duration seconds"""
+    client = HttpClient(max_idle_per_host=args.pollers * len(SD_PROTOCOLS) + args.writers,
+                        user_agent='blackbox-httpsd-soak', max_body=1024 * 1024 * 1024)
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    try:
+        await wait_ready(client, base_url, process)
+        started = time.monotonic() + 0.5
+        until = started + args.duration
+        tasks = [
+            poller(client, recorder, base_url, rng.uniform(0, args.jitter), args.refresh,
+                   started, until, args.timeout)
+            for _ in range(args.pollers)
+        ]
+        if args.write_rate > 0:
+            tasks.extend(
+                writer(client, recorder, base_url, random.Random(args.seed + index + 1),
+                       parse_mix(args.write_mix), args.write_rate, args.targets, until, args.timeout)
+                for index in range(args.writers)
+            )
+        await asyncio.gather(*tasks)
+        return recorder.report(time.monotonic() - started)
+    finally:
+        await client.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='Base URL of a running instance (skips seeding and starting one)')
+    parser.add_argument('--server', choices=['dev', 'gunicorn'], default='dev')
+    parser.add_argument('--workers', type=int, default=4, help='Gunicorn worker processes')
+    parser.add_argument('--targets', type=int, default=10000)
+    parser.add_argument('--pollers', type=int, default=20)
+    parser.add_argument('--refresh', type=float, default=15)
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Spread of the pollers\' phases in seconds (0: all at the same instant)')
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--write-rate', type=float, default=5, help='Operations per second per writer')
+    parser.add_argument('--write-mix', default='update=5,create=1,batch=1,ingest=3')
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    if args.url:
+        print(json.dumps({'endpoints': asyncio.run(soak(args, args.url.rstrip('/')))}, indent=2))
+        return
+    
+    app, db_path = make_app()
+    seed_targets(app, args.targets, seed=args.seed)
+    port = free_port()
+    log = tempfile.NamedTemporaryFile(prefix='soak_server_', suffix='.log', delete=False)
+    process = start_server(db_path, args.server, args.workers, port, log)
+    try:
+        endpoints = asyncio.run(soak(args, f'http://127.0.0.1:{port}', process))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        log.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+    
+    with open(log.name, 'rb') as f:
+        server_log = f.read()
+    os.unlink(log.name)
+    print(json.dumps({
+        'server': args.server,
+        'workers': args.workers if args.server == 'gunicorn' else None,
+        'targets': args.targets,
+        'pollers': args.pollers,
+        'writers': args.writers,
+        'endpoints': endpoints,
+        'server_log': {
+            'database_is_locked': server_log.count(LOCKED),
+            'tracebacks': server_log.count(b'Traceback (most recent call last)'),
+        }
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
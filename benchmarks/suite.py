@@ -0,0 +1,222 @@
+"""
+Benchmark suite over deterministic inventories of several sizes.
+
+For every size the same seeded inventory is generated (weighted regions,
+zones, probe types, teams and probe assignments, see common.py) and each
+scenario is timed twice: through the Flask test client, which includes
+routing and JSON serialization, and as a direct TargetService call.
+Results are written as JSON; --compare flags scenarios whose median got
+slower than a baseline run by more than --threshold.
+
+Usage:
+    python -m benchmarks.suite [--sizes 10000,100000] [--output results.json]
+    python -m benchmarks.suite --sizes 1000000 --scenarios sd_http,statistics
+    python -m benchmarks.suite --compare baseline.json [--threshold 0.2]
+    python -m benchmarks.suite --input new.json --compare baseline.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime
+from app import db
+from app.services.target_service import TargetService
+from benchmarks.common import make_app, seed_targets, measure, quiet
+
+SEARCH_FIELDS = 'region=EU-West zone=zone-b'
+SEARCH_ASSIGNEE = 'assignee=team-db'
+SEARCH_FREE_TEXT = 'host-00012'
+BATCH_SIZE = 1000
+
+def new_target(serial):
+    """Payload of a target created by the create scenarios"""
+    return {
+        'hostname': f'bench-new-{serial}.example.com', 'address': f'192.0.2.{serial % 250 + 1}',
+        'region': 'EU-West', 'zone': 'zone-a', 'probe_type': 'HTTPS', 'assignees': 'team-web',
+        'port': 443, 'protocol': 'https', 'path': '/', 'enabled': True
+    }
+
+def batch_ids(size):
+    """IDs of the targets toggled by the batch scenarios, spread over the table"""
+    return list(range(1, size + 1, max(1, size // BATCH_SIZE)))[:BATCH_SIZE]
+
+def client_scenarios(client, size):
+    """
+    Scenarios run through the Flask test client
+    
+    Returns:
+        Dictionary of scenario name to callable
+    """
+    def get(url):
+        def call():
+            with quiet():
+                response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+        return call
+    
+    ids = batch_ids(size)
+    toggle = itertools.cycle(['disable', 'enable'])
+    serial = itertools.count(1)
+    
+    def batch():
+        response = client.post('/api/targets/batch', json={'operation': next(toggle), 'target_ids': ids})
+        assert response.status_code == 200, response.status_code
+    
+    def create():
+        response = client.post('/api/targets', json=new_target(next(serial)))
+        assert response.status_code == 201, response.status_code
+    
+    return {
+        'sd_http': get('/api/sd/http'),
+        'sd_icmp': get('/api/sd/icmp'),
+        'sd_tcp_assignee': get('/api/sd/tcp?assignee=team-web'),
+        'targets_all': get('/api/targets'),
+        'targets_search_fields': get(f'/api/targets?q={SEARCH_FIELDS}'),
+        'targets_search_assignee': get(f'/api/targets?q={SEARCH_ASSIGNEE}'),
+        'targets_search_free_text': get(f'/api/targets?q={SEARCH_FREE_TEXT}'),
+        'batch_toggle': batch,
+        'create_target': create,
+        'statistics': get('/api/statistics'),
+    }
+
+def service_scenarios(size):
+    """
+    Scenarios calling TargetService directly (inside an app context)
+    
+    Returns:
+        Dictionary of scenario name to callable
+    """
+    ids = batch_ids(size)
+    toggle = itertools.cycle(['disable', 'enable'])
+    serial = itertools.count(1000000)
+    
+    def batch():
+        _, status = TargetService.batch_operation(next(toggle), ids)
+        assert status == 200, status
+    
+    return {
+        'service_search_all': lambda: TargetService.search_targets(''),
+        'service_search_fields': lambda: TargetService.search_targets(SEARCH_FIELDS),
+        'service_search_assignee': lambda: TargetService.search_targets(SEARCH_ASSIGNEE),
+        'service_batch_toggle': batch,
+        'service_create_target': lambda: TargetService.create_target(new_target(next(serial))),
+        'service_statistics': TargetService.get_statistics,
+    }
+
+def run_size(size, seed, repeat, selected):
+    """
+    Generate one inventory and time the selected scenarios on it
+    
+    Returns:
+        Dictionary of scenario name to measure() results
+    """
+    app, db_path = make_app(QUERY_BUDGET_ENFORCE=False, QUERY_STATS_HEADERS=False)
+    results = {}
+    try:
+        seed_targets(app, size, seed=seed)
+        client = app.test_client()
+        for name, call in client_scenarios(client, size).items():
+            if selected is None or name in selected:
+                results[name] = measure(call, repeat=repeat)
+        
+        for name, call in service_scenarios(size).items():
+            if selected is not None and name not in selected:
+                continue
+            
+            def in_context(call=call):
+                with app.app_context():
+                    call()
+                    db.session.remove()
+            results[name] = measure(in_context, repeat=repeat)
+    finally:
+        os.unlink(db_path)
+    return results
+
+def environment():
+    """Describe the machine and code version the results were taken on"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'started_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+    }
+
+def compare(baseline, current, threshold, noise_ms=1.0):
+    """
+    Compare the medians of two result files
+    
+    A scenario regressed when its median grew by more than threshold
+    (a fraction) and by more than noise_ms milliseconds.
+    
+    Returns:
+        List of (size, scenario, baseline ms, current ms, ratio, regressed)
+    """
+    rows = []
+    for size, scenarios in current['results'].items():
+        for name, timing in scenarios.items():
+            before = baseline['results'].get(size, {}).get(name)
+            if before is None:
+                continue
+            old, new = before['median_ms'], timing['median_ms']
+            ratio = new / old if old else float('inf')
+            regressed = ratio > 1 + threshold and new - old > noise_ms
+            rows.append((size, name, old, new, ratio, regressed))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000',
+                        help='Comma-separated inventory sizes, e.g. 10000,100000,1000000')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--scenarios', help='Comma-separated scenario names (default: all)')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--input', help='Compare an existing results file instead of running')
+    parser.add_argument('--compare', help='Baseline results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed slowdown of a median before it is flagged (fraction)')
+    args = parser.parse_args()
+    
+    if args.input:
+        with open(args.input) as f:
+            current = json.load(f)
+    else:
+        selected = set(args.scenarios.split(',')) if args.scenarios else None
+        current = {
+            'environment': environment(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'results': {}
+        }
+        for size in (int(value) for value in args.sizes.split(',')):
+            current['results'][str(size)] = run_size(size, args.seed, args.repeat, selected)
+            print(f'{size} targets: done', file=sys.stderr)
+        
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+        print(json.dumps(current, indent=2))
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        for size, name, old, new, ratio, regressed in rows:
+            flag = 'REGRESSION' if regressed else ''
+            print(f'{size:>8} {name:<28} {old:>10.2f} ms -> {new:>10.2f} ms  x{ratio:.2f} {flag}')
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Shared fixtures: an application on a scratch SQLite file and a few targets.
+"""
+import pytest
+from app import create_app
+
+TARGETS = [
+    {'hostname': 'web-1.example.com', 'address': '10.0.0.1', 'region': 'US-East', 'zone': 'zone-a',
+     'probe_type': 'HTTP', 'assignees': 'team-web', 'timeout': 10},
+    {'hostname': 'db-1.example.com', 'address': '10.0.0.2', 'region': 'EU-West', 'zone': 'zone-b',
+     'probe_type': 'TCP', 'assignees': 'team-db,team-infra', 'port': 5432},
+    {'hostname': 'gw-1.example.com', 'address': '10.0.0.3', 'region': 'US-West', 'zone': 'zone-a',
+     'probe_type': 'ICMP', 'assignees': 'team-network'},
+    {'hostname': 'hôte-ü.example.com', 'address': '10.0.0.4', 'region': 'AP-Northeast', 'zone': 'zone-c',
+     'probe_type': 'HTTPS', 'assignees': 'team-web', 'enabled': False},
+]
+
+# Copies of TARGETS under other names, to check that statement counts do
+# not grow with the number of targets
+MORE_TARGETS = [dict(target, hostname=f'extra-{n}-{target["hostname"]}', address=f'10.0.1.{n * 4 + i}')
+                for n in range(5) for i, target in enumerate(TARGETS)]
+
+def make_app(db_path, **config):
+    """Create a testing application on the SQLite file db_path"""
+    test_config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}'}
+    test_config.update(config)
+    return create_app('testing', test_config=test_config)
+
+def add_targets(client, targets=TARGETS):
+    """Create targets through the API and return their IDs"""
+    ids = []
+    for target in targets:
+        response = client.post('/api/targets', json=target)
+        assert response.status_code == 201, response.get_json()
+        ids.append(response.get_json()['id'])
+    return ids
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'test.db')
+
+@pytest.fixture
+def app(db_path):
+    return make_app(db_path)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def targets(client):
+    return add_targets(client)
@@ -0,0 +1,41 @@
+"""
+Native ASGI handlers, called directly with an HTTP scope.
+"""
+import asyncio
+import json
+import pytest
+from app.asgi import create_asgi_app
+
+def call(application, path, query=''):
+    """Send one GET to the ASGI application; returns (status, body)"""
+    messages = []
+    
+    async def receive():
+        await asyncio.sleep(3600)
+    
+    async def send(message):
+        messages.append(message)
+    
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(),
+             'headers': [], 'http_version': '1.1', 'scheme': 'http', 'root_path': '',
+             'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)}
+    asyncio.run(application(scope, receive, send))
+    status = next(message['status'] for message in messages if message['type'] == 'http.response.start')
+    body = b''.join(message.get('body', b'') for message in messages if message['type'] == 'http.response.body')
+    return status, body
+
+@pytest.fixture
+def application(app, targets):
+    return create_asgi_app(app)
+
+@pytest.mark.parametrize('wait', ['nan', 'inf', '-inf', '-1', 'soon'])
+def test_long_poll_rejects_bad_wait(application, wait):
+    status, body = call(application, '/api/sd/http', f'index=0&wait={wait}')
+    assert status == 400
+    assert json.loads(body) == {'error': 'wait must be a number of seconds'}
+
+def test_long_poll_returns_on_other_version(application):
+    # index differs from the current version: answered at once
+    status, body = call(application, '/api/sd/http', 'index=-1&wait=0')
+    assert status == 200
+    assert [group['labels']['hostname'] for group in json.loads(body)] == ['web-1.example.com']
@@ -0,0 +1,111 @@
+"""
+Two applications on one database, as two workers: a write through one
+reaches the caches of the other within DATA_VERSION_CHECK_INTERVAL.
+"""
+import time
+import pytest
+from sqlalchemy import bindparam, update
+from app import db
+from app.models.probe import Probe
+from app.models.target import Target
+from app.services.data_version import status_write
+from tests.conftest import TARGETS, make_app, add_targets
+
+INTERVAL = 0.5
+
+@pytest.fixture
+def workers(db_path):
+    first = make_app(db_path, DATA_VERSION_CHECK_INTERVAL=INTERVAL, PROBE_REGISTRY_TTL=3600)
+    second = make_app(db_path, DATA_VERSION_CHECK_INTERVAL=INTERVAL, PROBE_REGISTRY_TTL=3600)
+    return first, second
+
+def probe_names(client):
+    return [probe['name'] for probe in client.get('/api/probes').get_json()]
+
+def test_probe_write_reaches_other_worker(workers):
+    first, second = workers
+    reader = first.test_client()
+    before = probe_names(reader)
+    
+    with second.app_context():
+        db.session.add(Probe(name='Test Probe', location='Test', provider='Test', ip_address='192.0.2.1'))
+        db.session.commit()
+    # The writing worker sees its own write at once
+    assert probe_names(second.test_client()) == before + ['Test Probe']
+    # The other one keeps its snapshot until its next check
+    assert probe_names(reader) == before
+    
+    time.sleep(INTERVAL * 1.2)
+    assert probe_names(reader) == before + ['Test Probe']
+    assert first.extensions['data_versions'].current('probes') == \
+        second.extensions['data_versions'].current('probes')
+
+def test_target_write_moves_sd_version_of_other_worker(workers):
+    first, second = workers
+    reader = first.test_client()
+    version = reader.get('/api/sd/http').headers['X-Data-Version']
+    
+    add_targets(second.test_client(), TARGETS[:1])
+    assert reader.get('/api/sd/http').headers['X-Data-Version'] == version
+    
+    time.sleep(INTERVAL * 1.2)
+    response = reader.get('/api/sd/http')
+    assert int(response.headers['X-Data-Version']) > int(version)
+    assert [group['labels']['hostname'] for group in response.get_json()] == [TARGETS[0]['hostname']]
+
+def ingest(client, target_ids, status='DOWN'):
+    results = [{'target_id': target_id, 'status': status, 'status_code': '503'} for target_id in target_ids]
+    assert client.post('/api/status/ingest?flush=true', json={'results': results}).status_code == 202
+
+def test_status_write_moves_target_status_only(client, targets):
+    versions = client.application.extensions['data_versions']
+    # The request re-reads the versions after the targets were added
+    sd = client.get('/api/sd/http')
+    before = versions.current('targets'), versions.current('target_status')
+    
+    ingest(client, targets)
+    client.get('/api/probes')
+    assert versions.current('targets') == before[0]
+    assert versions.current('target_status') > before[1]
+    # SD responses hold configuration only: same version, same body
+    response = client.get('/api/sd/http')
+    assert response.headers['X-Data-Version'] == sd.headers['X-Data-Version']
+    assert response.data == sd.data
+    
+    # A configuration change still moves the targets version
+    assert client.put(f'/api/targets/{targets[0]}', json={'zone': 'zone-d'}).status_code == 200
+    assert int(client.get('/api/sd/http').headers['X-Data-Version']) > before[0]
+
+def test_status_write_reaches_statistics_of_other_worker(workers):
+    first, second = workers
+    reader = first.test_client()
+    target_ids = add_targets(second.test_client(), TARGETS[:1])
+    time.sleep(INTERVAL * 1.2)
+    version = reader.get('/api/sd/http').headers['X-Data-Version']
+    before = reader.get('/api/statistics').get_json()
+    
+    ingest(second.test_client(), target_ids)
+    time.sleep(INTERVAL * 1.2)
+    assert reader.get('/api/sd/http').headers['X-Data-Version'] == version
+    assert reader.get('/api/statistics').get_json() != before
+
+@pytest.mark.parametrize('mark, values, moved', [
+    (True, {'last_status': bindparam('new_status')}, 'target_status'),
+    # Unmarked statements are configuration writes, whatever they set
+    (False, {'last_status': bindparam('new_status')}, 'targets'),
+    (False, {'zone': bindparam('new_status')}, 'targets'),
+])
+def test_bulk_update_statement_versions(app, targets, mark, values, moved):
+    table = Target.__table__
+    statement = update(table).where(table.c.id == bindparam('target_id')).values(**values)
+    if mark:
+        statement = status_write(statement)
+    with app.app_context():
+        versions = app.extensions['data_versions']
+        versions.refresh(db.engine)
+        before = {name: versions.current(name) for name in ('targets', 'target_status')}
+        db.session.execute(statement, [{'target_id': target_id, 'new_status': 'DOWN'} for target_id in targets])
+        db.session.commit()
+        versions.refresh(db.engine)
+        after = {name: versions.current(name) for name in ('targets', 'target_status')}
+    assert {name for name in after if after[name] != before[name]} == {moved}
@@ -0,0 +1,71 @@
+"""
+Read-only views read from the replica bind; writes stay on the primary.
+"""
+import shutil
+import pytest
+from flask import g
+from sqlalchemy import event
+from app import db
+from app.models.target import Target
+from app.utils.db_routing import read_only
+from tests.conftest import TARGETS, make_app, add_targets
+
+@pytest.fixture
+def replicated(tmp_path, db_path):
+    """Application whose replica is a copy of the primary taken after one target was added"""
+    replica_path = str(tmp_path / 'replica.db')
+    app = make_app(db_path, SQLALCHEMY_BINDS={'replica': f'sqlite:///{replica_path}'})
+    client = app.test_client()
+    add_targets(client, TARGETS[:1])
+    with app.app_context():
+        db.engine.dispose()
+    shutil.copy(db_path, replica_path)
+    # Only on the primary from here on
+    add_targets(client, TARGETS[1:2])
+    return app
+
+def hostnames(response):
+    """Hostnames of a target list response"""
+    return [target['hostname'] for target in response.get_json()]
+
+def test_read_only_views_use_replica(replicated):
+    client = replicated.test_client()
+    # GET /api/targets is read-only, GET /api/targets/<id> is not
+    assert hostnames(client.get('/api/targets')) == [TARGETS[0]['hostname']]
+    assert client.get('/api/targets/2').get_json()['hostname'] == TARGETS[1]['hostname']
+    assert client.get('/api/statistics').get_json()['total'] == 1
+
+def test_writes_in_read_only_request_go_to_primary(replicated):
+    executed = []
+    
+    @read_only
+    def view():
+        assert g.db_read_only
+        listed = db.session.scalars(db.select(Target.hostname).order_by(Target.id)).all()
+        # Pending changes reach the primary even inside a read-only request,
+        # and later reads of the transaction see them
+        db.session.add(Target(**dict(TARGETS[2], hostname='late-1.example.com')))
+        db.session.flush()
+        relisted = db.session.scalars(db.select(Target.hostname).order_by(Target.id)).all()
+        db.session.commit()
+        return listed, relisted
+    
+    with replicated.app_context():
+        engines = {'primary': db.engine, 'replica': db.engines['replica']}
+        for name, engine in engines.items():
+            event.listen(engine, 'before_cursor_execute',
+                         lambda *args, name=name: executed.append((name, args[2].split()[0])))
+    
+    with replicated.test_request_context('/api/targets'):
+        listed, relisted = view()
+        assert listed == [TARGETS[0]['hostname']]
+        assert relisted == [TARGETS[0]['hostname'], TARGETS[1]['hostname'], 'late-1.example.com']
+        assert not g.db_read_only
+    assert ('replica', 'SELECT') in executed
+    assert ('primary', 'INSERT') in executed
+    assert all(name == 'primary' for name, verb in executed if verb != 'SELECT')
+    
+    client = replicated.test_client()
+    assert client.post('/api/targets', json=TARGETS[2]).status_code == 201
+    assert hostnames(client.get('/api/targets')) == [TARGETS[0]['hostname']]
+    assert client.get('/api/targets/4').get_json()['hostname'] == TARGETS[2]['hostname']
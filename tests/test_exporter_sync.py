@@ -0,0 +1,77 @@
+"""
+Result sync from a local fake blackbox_exporter.
+"""
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+from app.services.exporter_sync import run_sync
+from tests.conftest import TARGETS, make_app, add_targets
+
+MULTI = {'hostname': 'multi-1.example.com', 'address': '10.0.0.9', 'region': 'US-East', 'zone': 'zone-a',
+         'probe_type': 'HTTP+TCP', 'assignees': 'team-web', 'port': 9999}
+
+def exporter(probes):
+    """Handler answering /probe; targets on port 9999 fail"""
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                params = parse_qs(urlsplit(head.split(b' ', 2)[1].decode()).query)
+                target, module = params['target'][0], params['module'][0]
+                probes.append((target, module))
+                success = not target.endswith(':9999')
+                body = f'probe_success {1 if success else 0}\nprobe_duration_seconds 0.001\n'
+                if module.startswith('http'):
+                    body += 'probe_http_status_code 200\n'
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                             b'Content-Length: %d\r\n\r\n%s' % (len(body), body.encode()))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # Cancelled when the server closes with the connection still open
+            pass
+        finally:
+            writer.close()
+    return handle
+
+def sync_once(app):
+    async def main():
+        probes = []
+        server = await asyncio.start_server(exporter(probes), '127.0.0.1', 0)
+        app.config['BLACKBOX_EXPORTER_URL'] = f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}'
+        async with server:
+            stats = await run_sync(app, once=True, log=lambda line: None)
+        return stats, probes
+    return asyncio.run(main())
+
+def sd_modules(client, protocols=('http', 'tcp', 'icmp')):
+    """(target, module) pairs the SD endpoints publish"""
+    return {(group['targets'][0], group['labels']['module'])
+            for protocol in protocols
+            for group in client.get(f'/api/sd/{protocol}').get_json()}
+
+def test_sync_probes_with_sd_modules(db_path):
+    app = make_app(db_path)
+    client = app.test_client()
+    ids = add_targets(client, TARGETS + [MULTI])
+    stats, probes = sync_once(app)
+    
+    # Every protocol of every enabled target, with the module SD publishes
+    assert stats['checks'] == 4
+    assert sorted(probes) == sorted(sd_modules(client))
+    assert sorted(probes) == [('10.0.0.1', 'http_2xx'), ('10.0.0.2:5432', 'tcp_connect'), ('10.0.0.3', 'icmp'),
+                              ('10.0.0.9', 'http_2xx'), ('10.0.0.9:9999', 'tcp_connect')]
+    
+    statuses = {target['id']: (target['last_status'], target['last_status_code'])
+                for target in client.get('/api/targets').get_json()}
+    assert [statuses[target_id] for target_id in ids] == [
+        ('UP', '200'), ('UP', 'SUCCESS'), ('UP', 'SUCCESS'), (None, None),
+        # UP over HTTP but not over TCP
+        ('DOWN', 'FAILED'),
+    ]
+
+def test_module_overrides_reach_sd_and_sync(db_path):
+    app = make_app(db_path, BLACKBOX_EXPORTER_MODULES={'http': 'http_post_2xx'})
+    client = app.test_client()
+    add_targets(client, TARGETS[:1])
+    _, probes = sync_once(app)
+    assert probes == [('10.0.0.1', 'http_post_2xx')]
+    assert sd_modules(client, ['http']) == {('10.0.0.1', 'http_post_2xx')}
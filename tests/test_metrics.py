@@ -0,0 +1,74 @@
+"""
+/metrics serves the Prometheus text exposition format, and requests
+update what it reports.
+"""
+import re
+from tests.conftest import make_app, add_targets
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?:[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*",?)*\})? (\S+)$')
+
+def scrape(client):
+    """
+    Fetch /metrics and parse it, checking the format on the way
+    
+    Returns:
+        Dictionary of sample line (name and labels) to value, and
+        dictionary of metric family name to its TYPE
+    """
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert text.endswith('\n')
+    
+    samples, types, helped = {}, {}, set()
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            helped.add(line.split()[2])
+        elif line.startswith('# TYPE '):
+            _, _, name, kind = line.split()
+            assert name in helped and name not in types
+            assert kind in ('counter', 'gauge', 'histogram', 'untyped')
+            types[name] = kind
+        else:
+            match = SAMPLE.match(line)
+            assert match, line
+            name, labels, value = match.groups()
+            family = name if name in types else re.sub(r'_(bucket|sum|count)$', '', name)
+            assert family in types, line
+            samples[name + (labels or '')] = float(value)
+    return samples, types
+
+def test_exposition_format(client, targets):
+    client.get('/api/targets')
+    samples, types = scrape(client)
+    assert types['http_request_duration_seconds'] == 'histogram'
+    
+    labels = '{route="/api/targets",method="GET",status="200"'
+    buckets = [value for key, value in samples.items()
+               if key.startswith('http_request_duration_seconds_bucket' + labels)]
+    assert buckets == sorted(buckets)
+    assert samples[f'http_request_duration_seconds_bucket{labels},le="+Inf"}}'] == 1
+    assert samples[f'http_request_duration_seconds_count{labels}}}'] == 1
+
+def test_request_increments_counter(client, targets):
+    key = 'target_batch_targets_total{operation="disable"}'
+    client.post('/api/targets/batch', json={'operation': 'disable', 'target_ids': targets[:1]})
+    before = scrape(client)[0]
+    assert before[key] == 1
+    
+    client.post('/api/targets/batch', json={'operation': 'disable', 'target_ids': targets[1:3]})
+    after = scrape(client)[0]
+    assert after[key] == 3
+    assert after['target_batch_operations_total{operation="disable"}'] == 2
+    
+    count = 'http_request_duration_seconds_count{route="/metrics",method="GET",status="200"}'
+    assert after[count] == before.get(count, 0) + 1
+
+def test_request_metrics_can_be_disabled(db_path):
+    client = make_app(db_path, METRICS_ENABLED=False).test_client()
+    add_targets(client)
+    samples, types = scrape(client)
+    assert 'http_request_duration_seconds' not in types
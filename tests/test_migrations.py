@@ -0,0 +1,50 @@
+"""
+Versioned schema migrations.
+"""
+from sqlalchemy import create_engine, inspect, text
+from app import db
+from app.migrations import current_version, latest_version, run_migrations
+from app.migrations.versions import FILTER_INDEXES, create_base_tables
+from tests.conftest import make_app
+
+def test_new_database_is_migrated(app):
+    with app.app_context():
+        assert current_version() == latest_version()
+        indexes = {index['name'] for table in ('targets', 'target_probes')
+                   for index in inspect(db.engine).get_indexes(table)}
+        assert {name for name, _, _ in FILTER_INDEXES} <= indexes
+        # Everything is applied already
+        assert run_migrations() == []
+
+def test_unversioned_database_is_upgraded_in_place(db_path):
+    # A database created by db.create_all() before migrations existed
+    engine = create_engine(f'sqlite:///{db_path}')
+    with engine.begin() as connection:
+        create_base_tables(connection)
+        connection.execute(text(
+            "INSERT INTO targets (hostname, address, region, zone, probe_type, assignees, enabled) "
+            "VALUES ('old-1.example.com', '10.0.9.1', 'EU-West', 'zone-a', 'HTTP', 'team-old', 1)"
+        ))
+    engine.dispose()
+    
+    client = make_app(db_path).test_client()
+    with client.application.app_context():
+        assert current_version() == latest_version()
+    targets = client.get('/api/targets?q=hostname=old-1.example.com').get_json()
+    assert [target['address'] for target in targets] == ['10.0.9.1']
+
+def test_requests_wait_for_upgrade_without_auto_migrate(db_path):
+    app = make_app(db_path, DB_AUTO_MIGRATE=False)
+    client = app.test_client()
+    response = client.get('/api/targets')
+    assert response.status_code == 503
+    assert response.get_json()['error'] == (
+        f'Database schema version 0 is behind {latest_version()}, run `flask db upgrade`'
+    )
+    
+    result = app.test_cli_runner().invoke(args=['db', 'upgrade'])
+    assert result.exit_code == 0, result.output
+    assert 'Applied migrations' in result.output
+    # The same application recovers without a restart
+    assert client.get('/api/targets').status_code == 200
+    assert client.get('/api/probes').get_json()
@@ -0,0 +1,64 @@
+"""
+Probe lookups are served from the in-memory registry, and probe writes
+replace its snapshot when they commit.
+"""
+import pytest
+from app import db
+from app.models.probe import Probe
+from app.services.probe_registry import ProbeRegistry, get_probe_registry
+
+def probe_names(client):
+    """Probe names listed by GET /api/probes"""
+    return [probe['name'] for probe in client.get('/api/probes').get_json()]
+
+def test_repeated_lookups_run_no_queries(client):
+    first = client.get('/api/probes')
+    assert int(first.headers['X-Query-Count']) == 1
+    second = client.get('/api/probes')
+    assert int(second.headers['X-Query-Count']) == 0
+    assert second.get_json() == first.get_json()
+    
+    registry = client.application.extensions['probe_registry']
+    assert (registry.misses, registry.hits) == (1, 1)
+
+def test_writes_replace_snapshot(app, client):
+    before = probe_names(client)
+    
+    with app.app_context():
+        db.session.add(Probe(name='Test Probe', location='Hanoi', provider='VNPT', ip_address='192.168.1.200'))
+        db.session.commit()
+        probe_id = get_probe_registry().find_by_name('Test Probe')['id']
+    assert probe_names(client) == before + ['Test Probe']
+    
+    with app.app_context():
+        db.session.get(Probe, probe_id).name = 'Renamed Probe'
+        db.session.commit()
+        assert get_probe_registry().get(probe_id)['name'] == 'Renamed Probe'
+    assert probe_names(client) == before + ['Renamed Probe']
+    
+    with app.app_context():
+        db.session.delete(db.session.get(Probe, probe_id))
+        db.session.commit()
+        registry = get_probe_registry()
+        assert registry.get(probe_id) is None
+        assert registry.valid_ids([probe_id, '1', 'x', 1]) == [1]
+    assert probe_names(client) == before
+
+def test_rolled_back_write_keeps_snapshot(app, client):
+    before = probe_names(client)
+    with app.app_context():
+        db.session.add(Probe(name='Test Probe', location='Hanoi', provider='VNPT', ip_address='192.168.1.200'))
+        db.session.flush()
+        db.session.rollback()
+    registry = app.extensions['probe_registry']
+    misses = registry.misses
+    assert probe_names(client) == before
+    assert registry.misses == misses
+
+@pytest.mark.parametrize('ttl, misses', [(60, 1), (0, 3)])
+def test_snapshot_expires_after_ttl(app, ttl, misses):
+    registry = ProbeRegistry(ttl)
+    with app.app_context():
+        for _ in range(3):
+            assert len(registry.all()) == 3
+    assert registry.misses == misses
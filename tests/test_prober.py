@@ -0,0 +1,97 @@
+"""
+The built-in prober against local HTTP and TCP servers, and its DNS cache.
+"""
+import asyncio
+import socket
+from app.services.prober import CheckSpec, Prober, run_rounds
+from tests.conftest import add_targets
+
+async def handle_http(reader, writer):
+    """Answer keep-alive GETs; paths starting with /fail get a 503"""
+    try:
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            if head.split(b' ', 2)[1].startswith(b'/fail'):
+                writer.write(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 4\r\n\r\nfail')
+            else:
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+def closed_port():
+    """A local port nothing listens on"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def local_target(name, probe_type, port, **fields):
+    return dict({'hostname': f'{name}.local', 'address': '127.0.0.1', 'region': 'local', 'zone': 'local',
+                 'probe_type': probe_type, 'assignees': 'team-local', 'port': port, 'timeout': 5}, **fields)
+
+def test_run_rounds_against_local_servers(app, client):
+    async def main():
+        server = await asyncio.start_server(handle_http, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        refused = closed_port()
+        ids = add_targets(client, [
+            local_target('http-up', 'HTTP', port, protocol='http', path='/'),
+            local_target('http-fail', 'HTTP', port, protocol='http', path='/fail'),
+            local_target('tcp-up', 'TCP', port),
+            local_target('tcp-refused', 'TCP', refused),
+            local_target('icmp-rst', 'ICMP', refused),
+        ])
+        async with server:
+            stats = await run_rounds(app, once=True, log=lambda line: None)
+        return ids, stats
+    
+    ids, stats = asyncio.run(main())
+    assert stats['checks'] == 5
+    results = {target['id']: (target['last_status'], target['last_status_code'])
+               for target in client.get('/api/targets').get_json()}
+    assert [results[target_id] for target_id in ids] == [
+        ('UP', '200'), ('DOWN', '503'), ('UP', 'CONNECTED'), ('DOWN', 'CONNREFUSED'), ('UP', 'TCP_RST'),
+    ]
+
+def test_failed_lookup_is_retried():
+    prober = Prober(dns_ttl=300)
+    spec = CheckSpec(1, 'tcp', 'flaky.example', None, None, 5, None)
+    
+    async def main():
+        loop = asyncio.get_running_loop()
+        lookups = []
+        
+        async def getaddrinfo(host, port, **kwargs):
+            lookups.append(host)
+            if len(lookups) == 1:
+                raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 0))]
+        loop.getaddrinfo = getaddrinfo
+        
+        first = await prober.check(spec)
+        address = await prober._resolve('flaky.example')
+        # Successful lookups are kept for dns_ttl seconds
+        await prober._resolve('flaky.example')
+        return first, address, lookups
+    
+    first, address, lookups = asyncio.run(main())
+    assert first[1:3] == ('DOWN', 'DNS')
+    assert address == '127.0.0.1'
+    assert lookups == ['flaky.example'] * 2
+
+def test_lookup_expires_after_ttl():
+    prober = Prober(dns_ttl=0)
+    
+    async def main():
+        lookups = []
+        
+        async def getaddrinfo(host, port, **kwargs):
+            lookups.append(host)
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (f'127.0.0.{len(lookups)}', 0))]
+        asyncio.get_running_loop().getaddrinfo = getaddrinfo
+        return [await prober._resolve('moved.example') for _ in range(2)]
+    
+    # A changed DNS answer is picked up once the entry expired
+    assert asyncio.run(main()) == ['127.0.0.1', '127.0.0.2']
@@ -0,0 +1,87 @@
+"""
+Status import from a stand-in Prometheus query API.
+"""
+import asyncio
+import json
+import time
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+import pytest
+from app.services.prometheus_sync import (PrometheusQueryError, TIMESTAMP_LABEL, parse_query_result,
+                                          run_sync)
+from tests.conftest import make_app, add_targets
+
+def vector(*series):
+    return {'status': 'success', 'data': {'resultType': 'vector', 'result': list(series)}}
+
+def sample(target_id, name, value, evaluated_at, **labels):
+    metric = dict({'id': str(target_id), 'job': 'blackbox_http', 'instance': f'target-{target_id}'}, **labels)
+    if name == 'timestamp':
+        metric[TIMESTAMP_LABEL] = 'timestamp'
+    else:
+        metric['__name__'] = name
+    return {'metric': metric, 'value': [evaluated_at, str(value)]}
+
+def serve(bodies, queries):
+    """Handler answering /api/v1/query with the body of the job the query selects"""
+    async def handle(reader, writer):
+        head = await reader.readuntil(b'\r\n\r\n')
+        query = parse_qs(urlsplit(head.split(b' ', 2)[1].decode()).query)['query'][0]
+        queries.append(query)
+        job = next((job for job in bodies if f'job="{job}"' in query), None)
+        body = json.dumps(bodies.get(job, vector())).encode()
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                     b'Content-Length: %d\r\nConnection: close\r\n\r\n%s' % (len(body), body))
+        await writer.drain()
+        writer.close()
+    return handle
+
+def test_sync_uses_sample_time(db_path):
+    scraped_at = time.time() - 3600
+    now = time.time()
+    
+    async def main(targets):
+        queries = []
+        bodies = {'blackbox_http': vector(
+            sample(targets[0], 'probe_success', 1, now),
+            sample(targets[0], 'probe_http_status_code', 200, now),
+            sample(targets[0], 'timestamp', scraped_at, now),
+            sample(targets[2], 'probe_success', 0, now),
+            sample(targets[2], 'timestamp', scraped_at, now),
+        )}
+        server = await asyncio.start_server(serve(bodies, queries), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        app.config['PROMETHEUS_URL'] = f'http://127.0.0.1:{port}'
+        async with server:
+            stats = await run_sync(app, once=True, log=lambda line: None)
+        return stats, queries
+    
+    app = make_app(db_path, PROMETHEUS_SYNC_JOBS=['blackbox_http'])
+    client = app.test_client()
+    targets = add_targets(client)
+    stats, queries = asyncio.run(main(targets))
+    
+    assert stats == {'targets': 2, 'queries': 1, 'by_status': {'UP': 1, 'DOWN': 1}}
+    assert 'timestamp(probe_success{job="blackbox_http"})' in queries[0]
+    stamp = datetime.utcfromtimestamp(scraped_at).isoformat()[:19]
+    for target_id, expected in ((targets[0], ('UP', '200')), (targets[2], ('DOWN', 'FAILED'))):
+        target = client.get(f'/api/targets/{target_id}').get_json()
+        assert (target['last_status'], target['last_status_code']) == expected
+        assert target['last_check'].startswith(stamp)
+
+def test_newest_replica_sample_wins():
+    now = time.time()
+    results = parse_query_result(vector(
+        sample(1, 'probe_success', 0, now, replica='a'),
+        sample(1, 'timestamp', now - 60, now, replica='a'),
+        sample(1, 'probe_success', 1, now, replica='b'),
+        sample(1, 'timestamp', now - 10, now, replica='b'),
+        # No sample time: left out rather than stamped with the query time
+        sample(2, 'probe_success', 1, now),
+    ))
+    assert results == [(1, 'UP', 'SUCCESS', datetime.utcfromtimestamp(now - 10))]
+
+@pytest.mark.parametrize('payload', [[], 'error', None, {'status': 'error', 'error': 'bad query'}])
+def test_unusable_payload_raises(payload):
+    with pytest.raises(PrometheusQueryError):
+        parse_query_result(payload)
@@ -0,0 +1,74 @@
+"""
+Every route stays within its query budget.
+
+TestingConfig sets QUERY_BUDGET_ENFORCE, so a request over its budget
+raises QueryBudgetExceeded out of the test client instead of logging.
+"""
+import logging
+import pytest
+from app.utils.query_counter import QueryBudgetExceeded, request_budget
+from tests.conftest import MORE_TARGETS, make_app, add_targets
+
+@pytest.fixture
+def many_targets(client, targets):
+    return targets + add_targets(client, MORE_TARGETS)
+
+@pytest.mark.parametrize('url', [
+    '/api/targets',
+    '/api/targets?q=team-web',
+    '/api/probes',
+    '/api/assignees',
+    '/api/statistics',
+    '/api/sd/http',
+    '/api/sd/tcp',
+    '/api/sd/icmp',
+    '/api/sd/test',
+    '/metrics',
+])
+def test_read_routes_within_budget(client, many_targets, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    max_queries, _ = request_budget(client.application, client.application.url_map.bind('')
+                                    .match(url.split('?')[0])[0])
+    assert int(response.headers['X-Query-Count']) <= max_queries
+
+def test_target_routes_within_budget(client, many_targets):
+    target_id = many_targets[0]
+    assert client.get(f'/api/targets/{target_id}').status_code == 200
+    assert client.get(f'/api/targets/{target_id}/history').status_code == 200
+    assert client.put(f'/api/targets/{target_id}', json={'zone': 'zone-d'}).status_code == 200
+    assert client.delete(f'/api/targets/{target_id}').status_code == 200
+
+@pytest.mark.parametrize('operation, fields', [
+    ('disable', None),
+    ('enable', None),
+    ('update', {'zone': 'zone-d'}),
+    ('delete', None),
+])
+def test_batch_operations_within_budget(client, many_targets, operation, fields):
+    response = client.post('/api/targets/batch',
+                           json={'operation': operation, 'target_ids': many_targets, 'fields': fields})
+    assert response.status_code == 200
+    assert response.get_json()['affected_count'] == len(many_targets)
+
+def test_status_ingest_within_budget(client, many_targets):
+    results = [{'target_id': target_id, 'status': 'UP', 'status_code': '200'} for target_id in many_targets]
+    response = client.post('/api/status/ingest?flush=true', json={'results': results})
+    assert response.status_code == 202
+    assert response.get_json()['accepted'] == len(many_targets)
+
+def test_over_budget_raises(db_path):
+    client = make_app(db_path, QUERY_BUDGET_COUNT=0).test_client()
+    with pytest.raises(QueryBudgetExceeded, match='api.get_probes exceeded its query budget'):
+        client.get('/api/probes')
+
+def test_view_budget_overrides_config(db_path):
+    # /api/sd/<protocol> allows 2 statements whatever QUERY_BUDGET_COUNT says
+    client = make_app(db_path, QUERY_BUDGET_COUNT=0, FRAGMENT_CACHE_MAX_BYTES=0).test_client()
+    assert client.get('/api/sd/http').status_code == 200
+
+def test_over_budget_logs_without_enforcement(db_path, caplog):
+    client = make_app(db_path, QUERY_BUDGET_COUNT=0, QUERY_BUDGET_ENFORCE=False).test_client()
+    with caplog.at_level(logging.WARNING):
+        assert client.get('/api/probes').status_code == 200
+    assert 'exceeded its query budget' in caplog.text
@@ -0,0 +1,59 @@
+"""
+Statement counts of the listing, SD and statistics endpoints.
+
+The counts must not depend on the number of targets: each test adds more
+targets and checks the count again, so an N+1 regression fails here.
+"""
+import warnings
+import pytest
+from sqlalchemy.exc import LegacyAPIWarning
+from app.utils.query_counter import count_queries
+from tests.conftest import MORE_TARGETS, make_app, add_targets
+
+def query_count(client, url):
+    """Statement count of one GET, as reported by the X-Query-Count header"""
+    response = client.get(url)
+    assert response.status_code == 200
+    return int(response.headers['X-Query-Count'])
+
+@pytest.mark.parametrize('url, cold, warm', [
+    ('/api/targets', 2, 1),
+    ('/api/targets?q=web', 2, 1),
+    ('/api/sd/http', 2, 1),
+    ('/api/sd/icmp', 2, 1),
+    ('/api/statistics', 1, 1),
+])
+def test_query_count_with_fragment_cache(client, targets, url, cold, warm):
+    assert query_count(client, url) == cold
+    assert query_count(client, url) == warm
+    add_targets(client, MORE_TARGETS)
+    assert query_count(client, url) == cold
+    assert query_count(client, url) == warm
+
+@pytest.mark.parametrize('url, count', [
+    ('/api/targets', 1),
+    ('/api/targets?q=web', 1),
+    ('/api/sd/http', 1),
+    ('/api/sd/icmp', 1),
+    ('/api/statistics', 1),
+])
+def test_query_count_without_fragment_cache(db_path, url, count):
+    client = make_app(db_path, FRAGMENT_CACHE_MAX_BYTES=0).test_client()
+    add_targets(client)
+    assert query_count(client, url) == count
+    add_targets(client, MORE_TARGETS)
+    assert query_count(client, url) == count
+
+def test_count_queries_sees_request_statements(client, targets):
+    with count_queries() as counter:
+        client.get('/api/sd/http')
+    assert counter.count == 2
+    assert not counter.repeated(2)
+
+@pytest.mark.parametrize('query, count', [('', 1), ('?include_probes=true', 2)])
+def test_get_target_query_count(client, targets, query, count):
+    # Session.get() with loader options, not the legacy Query.get()
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', LegacyAPIWarning)
+        assert query_count(client, f'/api/targets/{targets[0]}{query}') == count
+    assert 'probes' in client.get(f'/api/targets/{targets[0]}?include_probes=true').get_json()
@@ -0,0 +1,87 @@
+"""
+Check phases, shard assignment and the timing wheel of CheckScheduler.
+"""
+from collections import Counter
+import pytest
+from app.services.scheduler import CheckScheduler, shard_of, stable_fraction
+
+NOW = 1_700_000_000.0
+
+def test_stable_fraction_spreads_consecutive_ids():
+    fractions = sorted(stable_fraction(target_id) for target_id in range(1, 1001))
+    assert 0 <= fractions[0] and fractions[-1] < 1
+    assert stable_fraction(42) == stable_fraction(42)
+    # Three-distance theorem: no gap is far above the average 1/1000
+    gaps = [b - a for a, b in zip(fractions, fractions[1:])]
+    assert max(gaps) < 3 / 1000
+
+@pytest.mark.parametrize('shards', [1, 3, 8])
+def test_shards_share_ids_and_phases_evenly(shards):
+    target_ids = range(1, 8001)
+    per_shard = Counter(shard_of(target_id, shards) for target_id in target_ids)
+    assert set(per_shard) == set(range(shards))
+    expected = len(target_ids) / shards
+    assert all(abs(count - expected) < 0.1 * expected for count in per_shard.values())
+    
+    # Every shard gets its share of the first half of the interval
+    early = Counter(shard_of(target_id, shards) for target_id in target_ids if stable_fraction(target_id) < 0.5)
+    assert all(abs(early[shard] - count / 2) < 0.1 * count for shard, count in per_shard.items())
+
+def test_target_is_due_at_its_phase():
+    scheduler = CheckScheduler(tick=1.0, slots=64)
+    scheduler.add(7, interval=200, now=NOW)
+    due = scheduler.next_due(7, 200, NOW)
+    assert NOW < due <= NOW + 200
+    assert due % 200 == pytest.approx(stable_fraction(7) * 200)
+    
+    # The interval is longer than the wheel: passing its slot early does nothing
+    assert scheduler.due(NOW) == []
+    assert scheduler.due(due - 64) == []
+    assert scheduler.due(due - 1) == []
+    assert scheduler.due(due) == [7]
+    # In flight until complete()
+    assert scheduler.due(due + 300) == []
+    
+    scheduler.complete(7, 'UP', now=due + 300.5)
+    assert scheduler.due(due + 400) == [7]
+
+def test_interval_change_reschedules():
+    scheduler = CheckScheduler(tick=1.0, slots=64)
+    scheduler.add(7, interval=60, now=NOW)
+    old_due = scheduler.next_due(7, 60, NOW)
+    scheduler.due(NOW)
+    
+    scheduler.add(7, interval=10, now=NOW)
+    new_due = scheduler.next_due(7, 10, NOW)
+    assert new_due < old_due
+    assert scheduler.due(new_due) == [7]
+    
+    # Changed while in flight: the next check uses the new interval
+    scheduler.add(7, interval=30, now=new_due)
+    scheduler.complete(7, 'UP', now=new_due)
+    assert scheduler.due(scheduler.next_due(7, 30, new_due)) == [7]
+    assert scheduler.due(old_due + 60) == []
+
+def test_down_backs_off_until_up():
+    scheduler = CheckScheduler(default_interval=60, max_backoff=200)
+    scheduler.add(7, now=NOW)
+    due, intervals = scheduler.next_due(7, 60, NOW), []
+    for status in ('DOWN', 'DOWN', 'DOWN', 'UP'):
+        assert scheduler.due(due) == [7]
+        scheduler.complete(7, status, now=due)
+        intervals.append(scheduler.effective_interval(7))
+        # Still at the target's phase, in the backed off interval
+        next_due = scheduler.next_due(7, intervals[-1], due)
+        assert due < next_due <= due + intervals[-1]
+        assert scheduler.due(next_due - 1) == []
+        due = next_due
+    assert intervals == [120, 200, 200, 60]
+
+def test_removed_target_is_not_due():
+    scheduler = CheckScheduler(tick=1.0, slots=64)
+    for target_id in range(1, 101):
+        scheduler.add(target_id, interval=30, now=NOW)
+    assert scheduler.remove(5) and not scheduler.remove(5)
+    due = scheduler.due(NOW + 30)
+    assert sorted(due) == [target_id for target_id in range(1, 101) if target_id != 5]
+    assert len(scheduler) == 99 and 5 not in scheduler
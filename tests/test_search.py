@@ -0,0 +1,67 @@
+"""
+Target search: the explain endpoint and the search filters.
+"""
+import pytest
+from tests.conftest import TARGETS, make_app, add_targets
+
+@pytest.fixture
+def explain(db_path):
+    client = make_app(db_path, SEARCH_EXPLAIN_ENABLED=True).test_client()
+    add_targets(client)
+    return client
+
+def test_explain_is_disabled_by_default(client, targets):
+    assert client.get('/api/targets/explain?q=web').status_code == 404
+
+def test_explain_field_search(explain):
+    report = explain.get('/api/targets/explain?q=hostname=web-1.example.com').get_json()
+    assert report['mode'] == 'fields'
+    assert report['parsed'] == {'hostname': 'web-1.example.com'}
+    assert report['params'] == ['web-1.example.com']
+    assert 'WHERE targets.hostname = ?' in report['sql']
+    # Served from ix_targets_hostname, not a scan of the table
+    assert any('ix_targets_hostname' in step['detail'] for step in report['plan'])
+    assert report['rows'] == {'examined': 1, 'returned': 1, 'table_total': 4, 'full_scan': False}
+    assert set(report['timings_ms']) == {'parse', 'sql', 'hydrate', 'serialize'}
+
+def test_explain_free_text_search(explain):
+    report = explain.get('/api/targets/explain?q=web').get_json()
+    assert report['mode'] == 'free_text'
+    assert report['rows']['full_scan'] is True
+    assert report['rows']['examined'] == report['rows']['table_total'] == 4
+    # The explained search returns what the search itself does
+    assert report['rows']['returned'] == len(explain.get('/api/targets?q=web').get_json())
+    assert report['response_bytes'] > 0
+
+@pytest.fixture
+def teams(client):
+    return add_targets(client, [
+        dict(TARGETS[2], hostname='gw-2.example.com', address='10.0.0.5', assignees='team-network-legacy'),
+        dict(TARGETS[2], hostname='gw-3.example.com', address='10.0.0.6', assignees=['team-web', 'team-network']),
+    ])
+
+def hostnames(client, url):
+    return sorted(target['hostname'] if 'hostname' in target else target['labels']['hostname']
+                  for target in client.get(url).get_json())
+
+def test_assignee_search_matches_whole_names(client, targets, teams):
+    # team-network-legacy is another team, not a match for team-network
+    assert hostnames(client, '/api/targets?q=assignees=team-network') == ['gw-1.example.com', 'gw-3.example.com']
+    assert hostnames(client, '/api/targets?q=assignee=team-network-legacy') == ['gw-2.example.com']
+    assert hostnames(client, '/api/sd/icmp?assignee=team-network') == ['gw-1.example.com', 'gw-3.example.com']
+
+def test_assignee_search_wildcard(client, targets, teams):
+    assert hostnames(client, '/api/targets?q=assignees=team-network*') == [
+        'gw-1.example.com', 'gw-2.example.com', 'gw-3.example.com'
+    ]
+    assert hostnames(client, '/api/targets?q=assignees=*-legacy') == ['gw-2.example.com']
+    assert hostnames(client, '/api/sd/icmp?assignee=team-net*') == [
+        'gw-1.example.com', 'gw-2.example.com', 'gw-3.example.com'
+    ]
+
+def test_assignee_facets(client, targets, teams):
+    counts = {facet['assignee']: facet['count'] for facet in client.get('/api/assignees').get_json()}
+    assert counts == {'team-db': 1, 'team-infra': 1, 'team-network': 2, 'team-network-legacy': 1, 'team-web': 3}
+    # Renaming a team moves the target between facets
+    assert client.put(f'/api/targets/{teams[0]}', json={'assignees': 'team-network'}).status_code == 200
+    assert hostnames(client, '/api/targets?q=assignees=team-network-legacy') == []
@@ -0,0 +1,100 @@
+"""
+Target listings built from rows must match jsonify() of Target.to_dict().
+"""
+from datetime import datetime
+import pytest
+from flask.json.provider import DefaultJSONProvider
+from app.models.target import DICT_FIELDS
+from app.utils.fragment_cache import join_fragments
+from app.utils.json_provider import OrjsonProvider, orjson
+from app.utils.row_serializer import RowSerializer
+from app.services.target_service import TargetService
+from tests.conftest import TARGETS, make_app, add_targets
+
+PROVIDERS = ['stdlib'] + (['orjson'] if orjson is not None else [])
+
+def stdlib_provider(app):
+    """The json module's provider, with the current provider's settings"""
+    provider = DefaultJSONProvider(app)
+    provider.ensure_ascii = app.json.ensure_ascii
+    provider.sort_keys = app.json.sort_keys
+    return provider
+
+def expected_listing(app, search_query=''):
+    """Stdlib jsonify() of to_dict() of the matching targets, in ID order"""
+    with app.test_request_context():
+        targets = sorted(TargetService.search_targets(search_query), key=lambda target: target['id'])
+        return stdlib_provider(app).response(targets).get_data()
+
+@pytest.mark.parametrize('provider', PROVIDERS)
+@pytest.mark.parametrize('cache_bytes', [0, 1024 * 1024])
+def test_float_in_integer_column_is_served_back(db_path, provider, cache_bytes):
+    app = make_app(db_path, JSON_PROVIDER=provider, FRAGMENT_CACHE_MAX_BYTES=cache_bytes)
+    client = app.test_client()
+    target_id, = add_targets(client, [{'hostname': 'slow.example.com', 'address': '10.0.0.9', 'region': 'US-East',
+                                       'zone': 'zone-a', 'probe_type': 'HTTP', 'assignees': 'team-web',
+                                       'timeout': 2.5}])
+    response = client.get('/api/targets')
+    assert response.status_code == 200
+    assert response.get_json()[0]['timeout'] == 2.5
+    assert response.data == expected_listing(app)
+
+@pytest.mark.parametrize('provider', PROVIDERS)
+@pytest.mark.parametrize('debug', [False, True])
+@pytest.mark.parametrize('cache_bytes', [0, 1024 * 1024])
+@pytest.mark.parametrize('search_query', ['', 'team-web', 'enabled:false'])
+def test_listing_matches_jsonify(db_path, provider, debug, cache_bytes, search_query):
+    app = make_app(db_path, JSON_PROVIDER=provider, DEBUG=debug, FRAGMENT_CACHE_MAX_BYTES=cache_bytes)
+    client = app.test_client()
+    ids = add_targets(client, TARGETS + [dict(TARGETS[0], hostname='web-2.example.com', timeout=0.5)])
+    client.post('/api/status/ingest?flush=true',
+                json={'results': [{'target_id': ids[0], 'status': 'DOWN', 'status_code': 'Zeitüberschreitung'}]})
+    
+    expected = expected_listing(app, search_query)
+    url = f'/api/targets?q={search_query}'
+    # Cold, then from cached fragments
+    assert client.get(url).data == expected
+    assert client.get(url).data == expected
+
+ROWS = [
+    # Values in DICT_FIELDS order, with what SQLite lets typed columns hold:
+    # None, floats and bools in Integer columns, None in Boolean ones
+    (1, 'web-1.example.com', '10.0.0.1', 'US-East', 'zone-a', 'HTTP', 'team-web', True, 80, 'http', '/',
+     '200', 10, 60, 'UP', '200', datetime(2024, 5, 1, 12, 0, 0), datetime(2024, 5, 1, 12, 0, 0, 123456)),
+    (2, 'hôte-ü.example.com', '10.0.0.2', 'AP-Northeast', 'zone-c', 'HTTPS', 'équipe "web"\\ops', False,
+     None, None, None, None, 2.5, True, None, None, None, datetime(2024, 5, 2)),
+    (3, '例え.jp', '10.0.0.3', 'AP-Northeast', 'zone-c', 'ICMP', 'team-\u2028-network', None,
+     False, 'icmp', None, '200-299', 2 ** 40, 1.0, 'DOWN', 'timeout\n', None, None),
+]
+
+FIELD_NAMES = [key for key, _ in DICT_FIELDS]
+
+def to_dict(row):
+    """The dictionary Target.to_dict() builds from a row's values"""
+    return {key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in zip(FIELD_NAMES, row)}
+
+@pytest.mark.parametrize('provider', PROVIDERS)
+@pytest.mark.parametrize('debug', [False, True])
+def test_row_serializer_matches_jsonify(db_path, provider, debug):
+    app = make_app(db_path, JSON_PROVIDER=provider, DEBUG=debug)
+    serializer = RowSerializer(DICT_FIELDS, ensure_ascii=app.json.ensure_ascii, sort_keys=app.json.sort_keys,
+                               pretty=debug, use_orjson=provider == 'orjson')
+    # Rows are selected with the serializer's columns, in its order
+    rows = [tuple(dict(zip(FIELD_NAMES, row))[key] for key in serializer.keys) for row in ROWS]
+    with app.test_request_context():
+        expected = stdlib_provider(app).response([to_dict(row) for row in ROWS]).get_data()
+        assert serializer.dumps_rows(rows) + b'\n' == expected
+        assert join_fragments(serializer.dumps_fragments(rows), pretty=debug) + b'\n' == expected
+        assert serializer.dumps_rows([]) == join_fragments(serializer.dumps_fragments([]), pretty=debug) == b'[]'
+
+@pytest.mark.skipif(orjson is None, reason='orjson is not installed')
+@pytest.mark.parametrize('debug', [False, True])
+def test_orjson_provider_matches_stdlib(db_path, debug):
+    app = make_app(db_path, JSON_PROVIDER='orjson', DEBUG=debug)
+    assert isinstance(app.json, OrjsonProvider)
+    data = {'targets': [to_dict(row) for row in ROWS], 'checked': datetime(2024, 5, 1, 12, 0, 0),
+            'ratio': 0.1, 'total': 3, 'none': None, 'empty': [], 'nested': {'b': True, 'a': False}}
+    with app.test_request_context():
+        assert app.json.response(data).get_data() == stdlib_provider(app).response(data).get_data()
+        assert app.json.dumps(data) == stdlib_provider(app).dumps(data)
@@ -0,0 +1,126 @@
+"""
+Concurrent callers of SingleFlight.do() with one key share one call.
+"""
+import asyncio
+import threading
+import time
+from app.utils.single_flight import SingleFlight
+
+THREADS = 50
+
+def wait_for(condition, timeout=5.0):
+    """Poll until condition() holds"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+def run_concurrently(flight, function):
+    """Call flight.do() from THREADS threads; returns their results and errors"""
+    results, errors = [None] * THREADS, [None] * THREADS
+    
+    def caller(index):
+        try:
+            results[index] = flight.do('key', function)
+        except Exception as e:
+            errors[index] = e
+    
+    threads = [threading.Thread(target=caller, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results, errors
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    
+    def build():
+        calls.append(threading.get_ident())
+        # Finish only once every other caller waits for this call
+        wait_for(lambda: flight.hits == THREADS - 1)
+        return object()
+    
+    results, errors = run_concurrently(flight, build)
+    assert len(calls) == 1
+    assert errors == [None] * THREADS
+    assert all(result is results[0] for result in results)
+    assert (flight.misses, flight.hits, flight.in_flight()) == (1, THREADS - 1, 0)
+    
+    # Nothing is kept once the call finished
+    assert flight.do('key', object) is not results[0]
+
+def test_error_reaches_every_caller():
+    flight = SingleFlight()
+    calls = []
+    failure = RuntimeError('build failed')
+    
+    def build():
+        calls.append(threading.get_ident())
+        wait_for(lambda: flight.hits == THREADS - 1)
+        raise failure
+    
+    results, errors = run_concurrently(flight, build)
+    assert len(calls) == 1
+    assert results == [None] * THREADS
+    assert all(error is failure for error in errors)
+    assert flight.in_flight() == 0
+    
+    # The failure is not remembered either
+    assert flight.do('key', lambda: 'rebuilt') == 'rebuilt'
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'slow'
+    
+    thread = threading.Thread(target=flight.do, args=('slow', slow))
+    thread.start()
+    started.wait(5)
+    assert flight.do('fast', lambda: 'fast') == 'fast'
+    release.set()
+    thread.join(5)
+
+def test_disabled_calls_every_time():
+    flight = SingleFlight(enabled=False)
+    calls = []
+    for _ in range(3):
+        flight.do('key', lambda: calls.append(1))
+    assert len(calls) == 3
+
+def test_do_async_shares_one_call():
+    flight = SingleFlight()
+    calls = []
+    
+    async def build():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return object()
+    
+    async def main():
+        return await asyncio.gather(*(flight.do_async('key', build) for _ in range(THREADS)))
+    
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+def test_do_async_error_reaches_every_caller():
+    flight = SingleFlight()
+    
+    async def build():
+        await asyncio.sleep(0.01)
+        raise RuntimeError('build failed')
+    
+    async def main():
+        return await asyncio.gather(*(flight.do_async('key', build) for _ in range(THREADS)),
+                                    return_exceptions=True)
+    
+    errors = asyncio.run(main())
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert flight.in_flight() == 0
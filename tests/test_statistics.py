@@ -0,0 +1,68 @@
+"""
+target_counters stay equal to the statistics computed from the targets
+themselves through every kind of target write.
+"""
+import pytest
+from app.services.target_statistics import StatisticsService
+from tests.conftest import TARGETS, MORE_TARGETS, make_app, add_targets
+
+def assert_counters_match(app):
+    """Counters agree with a single pass over the targets"""
+    with app.app_context():
+        assert StatisticsService.from_counters() == StatisticsService.single_pass()
+
+def batch(client, operation, target_ids, fields=None):
+    """Run a batch operation through the API"""
+    response = client.post('/api/targets/batch',
+                           json={'operation': operation, 'target_ids': target_ids, 'fields': fields})
+    assert response.status_code == 200, response.get_json()
+
+def ingest(client, target_ids, status):
+    """Ingest one result per target and flush it"""
+    results = [{'target_id': target_id, 'status': status} for target_id in target_ids]
+    assert client.post('/api/status/ingest?flush=true', json={'results': results}).status_code == 202
+
+def test_counters_follow_writes(app, client):
+    assert_counters_match(app)
+    
+    target_ids = add_targets(client, TARGETS + MORE_TARGETS[:8])
+    assert client.put(f'/api/targets/{target_ids[0]}', json={'probe_ids': [1, 2]}).status_code == 200
+    assert_counters_match(app)
+    with app.app_context():
+        assert len(StatisticsService.from_counters()['by_probe']) == 2
+    
+    assert client.put(f'/api/targets/{target_ids[1]}', json={
+        'region': 'EU-North', 'probe_type': 'HTTP', 'assignees': 'team-web,team-new', 'probe_ids': [2],
+    }).status_code == 200
+    assert_counters_match(app)
+    
+    ingest(client, target_ids[:6], 'UP')
+    ingest(client, target_ids[3:9], 'DOWN')
+    assert_counters_match(app)
+    
+    assert client.put(f'/api/targets/{target_ids[2]}', json={'enabled': False}).status_code == 200
+    batch(client, 'disable', target_ids[4:7])
+    batch(client, 'enable', target_ids[5:6])
+    assert_counters_match(app)
+    
+    batch(client, 'update', target_ids[6:10], {'zone': 'zone-d', 'region': 'US-West', 'assignees': 'team-ops'})
+    assert_counters_match(app)
+    
+    assert client.delete(f'/api/targets/{target_ids[0]}').status_code == 200
+    batch(client, 'delete', target_ids[1:4])
+    assert_counters_match(app)
+    
+    batch(client, 'delete', target_ids[4:])
+    assert_counters_match(app)
+
+@pytest.mark.parametrize('counters', [False, True])
+def test_statistics_endpoint(db_path, counters):
+    app = make_app(db_path, STATISTICS_COUNTERS=counters)
+    client = app.test_client()
+    target_ids = add_targets(client)
+    ingest(client, target_ids[:2], 'UP')
+    
+    statistics = client.get('/api/statistics').get_json()
+    assert (statistics['total'], statistics['enabled'], statistics['disabled']) == (4, 3, 1)
+    assert statistics['by_status'] == {'UP': 2}
+    assert statistics['by_assignee'] == {'team-web': 2, 'team-db': 1, 'team-infra': 1, 'team-network': 1}
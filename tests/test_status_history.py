@@ -0,0 +1,43 @@
+"""
+Time range parameters of GET /api/targets/<id>/history, and which writes
+record history.
+"""
+import pytest
+from tests.conftest import make_app, add_targets
+
+@pytest.mark.parametrize('query', [
+    'from=inf', 'to=inf', 'from=-inf', 'to=1e400', 'from=nan', 'from=yesterday',
+    'from=0001-01-01T00:00:00%2B01:00', 'to=9999-12-31T23:59:59-01:00',
+])
+def test_bad_time_is_rejected(client, targets, query):
+    response = client.get(f'/api/targets/{targets[0]}/history?{query}')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+@pytest.mark.parametrize('query, expected_from, expected_to', [
+    ('from=-1e12&to=1e20', '1970-01-01T00:00:00', '9999-12-31T23:59:59'),
+    ('from=0&to=99999999999999999999', '1970-01-01T00:00:00', '9999-12-31T23:59:59'),
+    ('from=1900-01-01&to=2000-01-01T00:00:00Z', '1970-01-01T00:00:00', '2000-01-01T00:00:00'),
+    ('from=86400.9&to=172800', '1970-01-02T00:00:00', '1970-01-03T00:00:00'),
+])
+def test_time_range_is_clamped(client, targets, query, expected_from, expected_to):
+    response = client.get(f'/api/targets/{targets[0]}/history?{query}')
+    assert response.status_code == 200
+    history = response.get_json()
+    assert (history['from'], history['to']) == (expected_from, expected_to)
+
+def test_history_of_recent_results(client, targets):
+    client.post('/api/status/ingest?flush=true', json={'results': [{'target_id': targets[0], 'status': 'UP'}]})
+    history = client.get(f'/api/targets/{targets[0]}/history').get_json()
+    assert [run['status'] for run in history['runs']] == ['UP']
+
+@pytest.mark.parametrize('enabled, runs', [(True, ['DOWN']), (False, [])])
+def test_batch_status_update_follows_history_setting(db_path, enabled, runs):
+    client = make_app(db_path, STATUS_HISTORY_ENABLED=enabled).test_client()
+    targets = add_targets(client)
+    response = client.post('/api/targets/batch', json={
+        'operation': 'update', 'target_ids': targets, 'fields': {'last_status': 'DOWN'}
+    })
+    assert response.status_code == 200
+    history = client.get(f'/api/targets/{targets[0]}/history').get_json()
+    assert [run['status'] for run in history['runs']] == runs
@@ -0,0 +1,97 @@
+"""
+Buffered status ingestion keeps results across failed flushes, and late
+results never overwrite newer ones.
+"""
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.exc import OperationalError
+from app.services.status_ingest import StatusIngestService
+from tests.conftest import make_app, add_targets
+
+def results(target_ids, status='DOWN'):
+    checked_at = datetime.utcnow()
+    return [(target_id, status, '500', checked_at) for target_id in target_ids]
+
+def fail_once(monkeypatch):
+    """Make the next StatusIngestService.apply() fail like a lost database"""
+    apply = StatusIngestService.apply
+    calls = []
+    
+    def failing(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OperationalError('UPDATE targets', {}, Exception('database is locked'))
+        return apply(*args, **kwargs)
+    monkeypatch.setattr(StatusIngestService, 'apply', staticmethod(failing))
+
+def statuses(client):
+    return {target['id']: target['last_status'] for target in client.get('/api/targets').get_json()}
+
+def test_failed_flush_keeps_results(app, client, targets, monkeypatch):
+    ingestor = app.extensions['status_ingestor']
+    fail_once(monkeypatch)
+    ingestor.submit(results(targets[:2]))
+    assert ingestor.flush() is None
+    assert ingestor.pending() == 2
+    assert ingestor.totals['failed_flushes'] == 1
+    
+    ingestor.submit(results(targets[2:]))
+    stats = ingestor.flush()
+    assert stats['received'] == len(targets)
+    assert stats['changed'] == len(targets)
+    assert ingestor._pending == []
+    assert set(statuses(client).values()) == {'DOWN'}
+
+def test_requeued_results_stay_bounded(db_path, monkeypatch):
+    app = make_app(db_path, STATUS_INGEST_MAX_PENDING=3)
+    targets = add_targets(app.test_client())
+    ingestor = app.extensions['status_ingestor']
+    ingestor.submit(results(targets[:2]))
+    
+    def failing(*args, **kwargs):
+        # Results pushed while the flush runs are kept after the requeued ones
+        ingestor._pending.extend(results(targets[2:], status='UP'))
+        raise OperationalError('UPDATE targets', {}, Exception('database is locked'))
+    monkeypatch.setattr(StatusIngestService, 'apply', staticmethod(failing))
+    assert ingestor.flush() is None
+    
+    # The oldest result is dropped to stay within STATUS_INGEST_MAX_PENDING
+    assert [result[0] for result in ingestor._pending] == targets[1:]
+    assert ingestor.totals['dropped'] == 1
+
+def test_failed_flush_is_accepted(client, targets, monkeypatch):
+    # The results are buffered again, so a retry by the client would
+    # write them twice: the request still succeeds
+    fail_once(monkeypatch)
+    response = client.post('/api/status/ingest?flush=true', json={'results': [
+        {'target_id': target_id, 'status': 'DOWN'} for target_id in targets
+    ]})
+    assert response.status_code == 202
+    assert response.get_json() == {'accepted': len(targets), 'flushed': None, 'pending': len(targets)}
+    
+    response = client.post('/api/status/ingest?flush=true', json={'results': []})
+    assert response.get_json()['flushed']['changed'] == len(targets)
+    assert response.get_json()['pending'] == 0
+
+def test_late_result_does_not_overwrite_newer_state(app, client, targets):
+    ingestor = app.extensions['status_ingestor']
+    newer = datetime(2024, 1, 1, 12, 0)
+    ingestor.submit([(targets[0], 'UP', '200', newer)])
+    ingestor.flush()
+    
+    ingestor.submit([(targets[0], 'DOWN', '503', newer - timedelta(minutes=5))])
+    stats = ingestor.flush()
+    assert (stats['stale'], stats['changed'], stats['touched']) == (1, 0, 0)
+    target = client.get(f'/api/targets/{targets[0]}').get_json()
+    assert (target['last_status'], target['last_status_code']) == ('UP', '200')
+    assert target['last_check'].startswith('2024-01-01T12:00:00')
+    history = client.get(f'/api/targets/{targets[0]}/history?from=0').get_json()
+    assert [run['status'] for run in history['runs']] == ['UP']
+
+@pytest.mark.parametrize('checked_at', [1e18, 1e20, 1e400, '+inf', 'nan'])
+def test_out_of_range_checked_at_is_rejected(client, targets, checked_at):
+    response = client.post('/api/status/ingest', json={'results': [
+        {'target_id': targets[0], 'status': 'UP', 'checked_at': checked_at}
+    ]})
+    assert response.status_code == 400
+    assert 'checked_at' in response.get_json()['error']
@@ -0,0 +1,80 @@
+"""
+The scheduler's incremental sync follows configuration changes only, and
+check intervals it cannot schedule are rejected.
+"""
+import pytest
+from sqlalchemy import select
+from app import db
+from app.models.target import Target
+from app.services.prober import TargetSync
+from tests.conftest import TARGETS, make_app, add_targets
+
+def revisions(app):
+    with app.app_context():
+        return dict(db.session.execute(select(Target.id, Target.config_revision)).all())
+
+def synced_ids(sync):
+    upserts, removes = sync.poll()
+    return sorted(spec.target_id for spec, _ in upserts), sorted(removes)
+
+def test_status_writes_keep_config_revision(app, client, targets):
+    before = revisions(app)
+    assert None not in before.values()
+    client.post('/api/status/ingest?flush=true',
+                json={'results': [{'target_id': target_id, 'status': 'DOWN'} for target_id in targets]})
+    client.post('/api/targets/batch', json={'operation': 'update', 'target_ids': targets[:1],
+                                           'fields': {'last_status': 'UP', 'last_status_code': '200'}})
+    assert revisions(app) == before
+
+def test_config_writes_move_config_revision(app, client, targets):
+    before = revisions(app)
+    client.put(f'/api/targets/{targets[0]}', json={'timeout': 5})
+    after = revisions(app)
+    assert after[targets[0]] > max(before.values())
+    assert {target_id: after[target_id] for target_id in targets[1:]} == \
+        {target_id: before[target_id] for target_id in targets[1:]}
+    
+    new_id, = add_targets(client, [{'hostname': 'new.example.com', 'address': '10.0.0.9', 'region': 'US-East',
+                                    'zone': 'zone-a', 'probe_type': 'HTTP', 'assignees': 'team-web'}])
+    assert revisions(app)[new_id] > after[targets[0]]
+
+def test_sync_picks_up_config_changes_only(app, client, targets):
+    sync = TargetSync(app)
+    enabled = [target['id'] for target in client.get('/api/targets').get_json() if target['enabled']]
+    assert synced_ids(sync) == (sorted(enabled), [])
+    assert synced_ids(sync) == ([], [])
+    
+    client.post('/api/status/ingest?flush=true',
+                json={'results': [{'target_id': target_id, 'status': 'DOWN'} for target_id in targets]})
+    assert synced_ids(sync) == ([], [])
+    
+    client.put(f'/api/targets/{targets[0]}', json={'check_interval': 30})
+    client.post('/api/targets/batch', json={'operation': 'disable', 'target_ids': targets[1:2]})
+    assert synced_ids(sync) == ([targets[0]], [targets[1]])
+    
+    client.delete(f'/api/targets/{targets[2]}')
+    assert synced_ids(sync) == ([], [targets[2]])
+    assert synced_ids(sync) == ([], [])
+
+@pytest.mark.parametrize('interval', [0, -30, 0.5, 'often', True])
+def test_invalid_check_interval_is_rejected(client, targets, interval):
+    target = {'hostname': 'new.example.com', 'address': '10.0.0.9', 'region': 'US-East', 'zone': 'zone-a',
+              'probe_type': 'HTTP', 'assignees': 'team-web', 'check_interval': interval}
+    response = client.post('/api/targets', json=target)
+    assert response.status_code == 400
+    assert 'check_interval' in response.get_json()['error']
+    
+    response = client.put(f'/api/targets/{targets[0]}', json={'check_interval': interval})
+    assert response.status_code == 400
+    response = client.post('/api/targets/batch', json={'operation': 'update', 'target_ids': targets,
+                                                       'fields': {'check_interval': interval}})
+    assert response.status_code == 400
+    assert len(client.get('/api/targets').get_json()) == len(targets)
+    assert {target['check_interval'] for target in client.get('/api/targets').get_json()} == {None}
+
+def test_check_interval_minimum(db_path):
+    client = make_app(db_path, PROBER_MIN_CHECK_INTERVAL=30).test_client()
+    target_id, = add_targets(client, TARGETS[:1])
+    assert client.put(f'/api/targets/{target_id}', json={'check_interval': 10}).status_code == 400
+    assert client.put(f'/api/targets/{target_id}', json={'check_interval': 30}).status_code == 200
+    assert client.put(f'/api/targets/{target_id}', json={'check_interval': None}).status_code == 200